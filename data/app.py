@@ -1,10 +1,16 @@
-from flask import Flask, jsonify, request, render_template, send_from_directory
+from flask import Flask, Response, jsonify, request, render_template, send_from_directory
 from flask_socketio import SocketIO
-from classify import start_detection, stop_detection, is_running
+from classify import (
+    start_detection, stop_detection, is_running, get_capture_status, get_pipeline_status, apply_detection_settings,
+    get_stage_status, get_engine_metrics, webhook_results
+)
+from latency_trace import get_tracer
+from metrics import CONTENT_TYPE, render_metrics
+from sampling_profiler import ProfilerBusyError, collapsed_stacks, get_profiler
 import sounddevice as sd
 import json
 import requests
-from vban_manager import init_vban_detector as init_vban, cleanup_vban_detector, get_vban_detector
+from vban_manager import init_vban_detector as init_vban, cleanup_vban_detector, get_vban_detector, start_vban_capture, stop_vban_capture
 import threading
 import time
 import os
@@ -12,11 +18,15 @@ from datetime import datetime
 from events import socketio  # Importation de l'instance Socket.IO
 import socket
 import uuid
+import hmac
 from threading import Lock
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import logging
 import psutil
+from ffmpeg_reader import INGEST_PROFILES, RTSP_TRANSPORTS
+from rtsp_supervisor import DECODE_BACKENDS
+from url_validator import is_valid_url
 
 # Configuration du logging
 logging.basicConfig(
@@ -49,6 +59,9 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SETTINGS_FILE = os.path.join(BASE_DIR, 'settings.json')
 SETTINGS_BACKUP = os.path.join(BASE_DIR, 'settings.json.backup')
 SETTINGS_TEMP = os.path.join(BASE_DIR, 'settings.json.tmp')
+CAPTURES_DIR = os.path.join(BASE_DIR, 'captures')
+# Dernier rapport du benchmark de capacité (benchmarks/bench_capacity.py)
+CAPACITY_REPORT = os.path.join(BASE_DIR, 'capacity_report.json')
 
 # Initialiser le détecteur VBAN
 init_vban()
@@ -118,7 +131,8 @@ def save_settings(new_settings):
                 "device_index": "0",
                 "audio_source": "default",
                 "webhook_url": "",
-                "enabled": False
+                "enabled": False,
+                "devices": []
             },
             "rtsp_sources": [],
             "saved_vban_sources": [],  # Ajout de la liste des sources VBAN sauvegardées
@@ -155,6 +169,12 @@ def save_settings(new_settings):
         # Renommer le fichier temporaire
         os.replace(SETTINGS_TEMP, SETTINGS_FILE)
 
+        # Appliquer les sources modifiées à la détection en cours (les autres continuent sans interruption)
+        try:
+            apply_detection_settings(current_settings)
+        except Exception as e:
+            logging.error(f"Erreur lors de la mise à jour à chaud des sources: {str(e)}")
+
         return True, "Paramètres sauvegardés avec succès"
 
     except Exception as e:
@@ -180,7 +200,8 @@ def load_settings():
             "device_index": "0",
             "audio_source": "default",
             "webhook_url": "",
-            "enabled": False
+            "enabled": False,
+            "devices": []  # Micros analysés simultanément, device_index seul si vide
         },
         "rtsp_sources": [],
         "saved_vban_sources": [],
@@ -189,7 +210,8 @@ def load_settings():
             "ip": "0.0.0.0",
             "port": 6980,
             "webhook_url": "",
-            "enabled": False
+            "enabled": False,
+            "service_hosts": []  # Hôtes interrogés par PING0, diffusion si vide
         }
     }
     
@@ -306,16 +328,6 @@ def start_detection_route():
                 'device_index': '0'
             }
             
-        # Vérifier si le microphone est activé
-        microphone_enabled = detection_settings.get('microphone', {})
-        if isinstance(microphone_enabled, dict):
-            microphone_enabled = microphone_enabled.get('enabled', False)
-        else:
-            microphone_enabled = False
-            
-        if not microphone_enabled:
-            print("Microphone désactivé - aucune capture audio ne sera effectuée")
-            
         # Préparer les paramètres pour start_detection avec gestion des valeurs null
         try:
             global_settings = detection_settings.get('global', {})
@@ -326,43 +338,22 @@ def start_detection_route():
             if not isinstance(microphone_settings, dict):
                 microphone_settings = {}
                 
+            # Toutes les sources activées (micros, RTSP, VBAN) sont analysées ensemble :
+            # le pipeline les instancie depuis settings.json
             detection_params = {
                 'model': "yamnet.tflite",
                 'max_results': 5,
                 'score_threshold': float(global_settings.get('threshold', '0.2')),
                 'overlapping_factor': 0.8,
                 'socketio': socketio,
-                'webhook_url': microphone_settings.get('webhook_url') if microphone_enabled else None,
+                'webhook_url': None,  # Chaque source utilise son propre webhook
                 'delay': float(global_settings.get('delay', '1.0')),
-                'audio_source': microphone_settings.get('audio_source') if microphone_enabled else None,
-                'rtsp_url': None
+                'audio_source': microphone_settings.get('audio_source'),
+                'rtsp_sources': [
+                    source for source in detection_settings.get('rtsp_sources') or []
+                    if source.get('enabled', False) and source.get('url')
+                ]
             }
-
-            # Check for RTSP sources first
-            rtsp_sources = detection_settings.get('rtsp_sources', [])
-            for source in rtsp_sources:
-                if source.get('enabled', False):
-                    detection_params['audio_source'] = f"rtsp://{source['url']}"
-                    detection_params['rtsp_url'] = source['url']
-                    logging.info(f"Utilisation de la source RTSP: {source.get('name', 'Unknown')} ({source['url']})")
-                    break
-
-            # If no RTSP source is enabled, check for VBAN sources
-            if not detection_params['audio_source'] and not microphone_enabled:
-                # Vérifier d'abord saved_vban_sources
-                saved_vban_sources = detection_settings.get('saved_vban_sources', [])
-                if saved_vban_sources:
-                    # Utiliser la première source VBAN active
-                    for source in saved_vban_sources:
-                        if source.get('enabled', True):
-                            detection_params['audio_source'] = f"vban://{source['ip']}"
-                            logging.info(f"Utilisation de la source VBAN: {source['name']} ({source['ip']})")
-                            break
-                    else:
-                        if not any(source.get('enabled', True) for source in saved_vban_sources):
-                            logging.info("Aucune source VBAN active n'est activée")
-                else:
-                    logging.info("Aucune source VBAN configurée")
         except (ValueError, TypeError) as e:
             return jsonify({'error': f'Erreur dans les paramètres : {str(e)}'}), 400
         
@@ -429,7 +420,10 @@ def refresh_vban():
         print("Récupération des sources VBAN...")  # Debug log
         
         # Utiliser l'instance globale
-        sources = init_vban().get_active_sources()
+        detector = get_vban_detector()
+        if not detector:
+            return jsonify({'error': 'Impossible d\'initialiser la découverte VBAN'}), 500
+        sources = detector.discovery.get_active_sources()
         print(f"Sources trouvées: {sources}")  # Debug log
         
         # Formater les sources pour l'interface
@@ -459,39 +453,60 @@ def clap_detected():
 def status():
     try:
         running = is_running()
-        return jsonify({'running': running})
+        # État de chaque source du pipeline ; débordements et pertes d'échantillons par microphone
+        return jsonify({
+            'running': running,
+            'sources': get_pipeline_status(),
+            'microphones': get_capture_status(),
+            'stages': get_stage_status()
+        })
     except Exception as e:
         return jsonify({'running': False, 'error': str(e)})
 
 @app.route('/refresh_vban_sources')
 def refresh_vban_sources():
-    # Make sure the detector is running
-    if not init_vban().running:
-        # Start listening in a separate thread
-        thread = threading.Thread(target=init_vban().start_listening)
-        thread.daemon = True
-        thread.start()
-        
-        # Give it a moment to detect sources
-        time.sleep(2)
-    
-    active_sources = init_vban().get_active_sources()
-    
+    detector = get_vban_detector()
+    if not detector:
+        return jsonify({'error': 'Impossible d\'initialiser la découverte VBAN'}), 500
+
+    # Interroger activement les équipements (un aller-retour) au lieu d'attendre
+    # que des flux soient reçus passivement
+    service_hosts = load_settings().get('vban', {}).get('service_hosts') or None
+    devices = {info.ip: info for info in detector.ping_sources(service_hosts)}
+
     vban_sources = []
-    for ip, info in active_sources.items():
+    for ip, info in detector.get_active_sources().items():
         source_name = info.get('name', '').strip()
         if source_name:  # Only add sources with valid names
             vban_sources.append({
                 "name": f"VBAN: {source_name} ({ip})",
                 "url": f"vban://{ip}"
             })
-    
-    # Stop the detector if we started it just for the refresh
-    if not init_vban().running:
-        init_vban().stop_listening()
-    
+    for ip, device in devices.items():
+        if not any(source['url'] == f"vban://{ip}" for source in vban_sources):
+            vban_sources.append({
+                "name": f"VBAN: {device.display_name} ({ip})",
+                "url": f"vban://{ip}"
+            })
+
     return jsonify({"sources": vban_sources})
 
+@app.route('/api/vban/ping', methods=['POST'])
+def ping_vban_devices():
+    """Découverte active des équipements VBAN par le protocole de service (PING0)"""
+    try:
+        detector = get_vban_detector()
+        if not detector:
+            return jsonify({'error': 'Impossible d\'initialiser la découverte VBAN'}), 500
+        data = request.get_json(silent=True) or {}
+        hosts = data.get('hosts') or load_settings().get('vban', {}).get('service_hosts') or None
+        timeout = float(data.get('timeout', 0.3))
+        devices = detector.ping_sources(hosts, timeout=timeout)
+        return jsonify({'devices': [device.to_dict() for device in devices]})
+    except Exception as e:
+        logging.error(f"Erreur lors du PING VBAN: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 def test_settings_validation():
     """Test de la validation des paramètres"""
     print("\n1. Test de validation des paramètres basiques")
@@ -808,6 +823,35 @@ def update_vban_source():
             'error': str(e)
         }), 500
 
+@app.route('/api/vban/capture/start', methods=['POST'])
+def start_vban_capture_route():
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = os.path.basename(data.get('filename') or f"vban_{datetime.now().strftime('%Y%m%d_%H%M%S')}.vbcap")
+        os.makedirs(CAPTURES_DIR, exist_ok=True)
+        path = os.path.join(CAPTURES_DIR, filename)
+        recorder = start_vban_capture(path)
+        if recorder is None:
+            return jsonify({'error': 'Impossible d\'initialiser la réception VBAN'}), 500
+        return jsonify({'success': True, 'file': filename})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/vban/capture/stop', methods=['POST'])
+def stop_vban_capture_route():
+    try:
+        recorder = stop_vban_capture()
+        if recorder is None:
+            return jsonify({'error': 'Aucune capture en cours'}), 404
+        return jsonify({
+            'success': True,
+            'file': os.path.basename(recorder.path),
+            'packets': recorder.packets,
+            'bytes': recorder.bytes
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/static/js/modules/<path:filename>')
 def serve_js_module(filename):
     return send_from_directory('static/js/modules', filename, mimetype='application/javascript')
@@ -829,6 +873,16 @@ def get_audio_sources():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def validate_ingest_options(stream):
+    """Vérifie le profil d'ingestion, le transport RTSP et le backend d'une source, renvoie un message d'erreur ou None"""
+    if stream.get('profile') and stream['profile'] not in INGEST_PROFILES:
+        return f"Profil d'ingestion inconnu: {stream['profile']}"
+    if stream.get('transport') and stream['transport'] not in RTSP_TRANSPORTS:
+        return f"Transport RTSP inconnu: {stream['transport']}"
+    if stream.get('backend') and stream['backend'] not in DECODE_BACKENDS:
+        return f"Backend de décodage inconnu: {stream['backend']}"
+    return None
+
 @app.route('/api/rtsp/streams', methods=['GET'])
 def get_rtsp_streams():
     try:
@@ -863,6 +917,13 @@ def add_rtsp_stream():
             'webhook_url': webhook_url,
             'enabled': enabled
         }
+        # Profil d'ingestion ffmpeg et transport RTSP optionnels
+        for field in ('profile', 'transport', 'backend'):
+            if data.get(field):
+                new_stream[field] = data[field]
+        error = validate_ingest_options(new_stream)
+        if error:
+            return jsonify({'error': error}), 400
         
         settings['rtsp_sources'].append(new_stream)
         save_settings(settings)
@@ -888,6 +949,12 @@ def update_rtsp_stream(stream_id):
                     stream['webhook_url'] = data['webhook_url']
                 if 'enabled' in data:
                     stream['enabled'] = data['enabled']
+                for field in ('profile', 'transport', 'backend'):
+                    if field in data:
+                        stream[field] = data[field]
+                error = validate_ingest_options(stream)
+                if error:
+                    return jsonify({'error': error}), 400
                 
                 save_settings(settings)
                 return jsonify({'success': True, 'stream': stream})
@@ -985,6 +1052,149 @@ def update_microphone_enabled():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/microphone/devices', methods=['GET'])
+def get_microphone_devices():
+    try:
+        settings = load_settings()
+        return jsonify({'devices': settings['microphone'].get('devices', [])})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/microphone/devices', methods=['PUT'])
+def update_microphone_devices():
+    """Remplace la liste des micros analysés simultanément ({device_index, webhook_url, enabled, name})"""
+    try:
+        data = request.get_json() or {}
+        devices = data.get('devices')
+        if not isinstance(devices, list):
+            return jsonify({'error': 'Liste de périphériques requise'}), 400
+
+        seen = set()
+        for device in devices:
+            try:
+                device_index = int(device.get('device_index'))
+            except (AttributeError, TypeError, ValueError):
+                return jsonify({'error': f'Index de périphérique invalide: {device}'}), 400
+            if device_index in seen:
+                return jsonify({'error': f'Périphérique {device_index} configuré plusieurs fois'}), 400
+            seen.add(device_index)
+            if device.get('webhook_url') and not is_valid_url(device['webhook_url']):
+                return jsonify({'error': f"URL de webhook invalide: {device['webhook_url']}"}), 400
+
+        settings = load_settings()
+        settings['microphone']['devices'] = devices
+        save_settings(settings)
+
+        return jsonify({'success': True, 'devices': devices})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Métriques du moteur de détection au format Prometheus"""
+    try:
+        body = render_metrics(
+            is_running(), get_engine_metrics(), get_pipeline_status(), dict(webhook_results), get_tracer()
+        )
+        return Response(body, content_type=CONTENT_TYPE)
+    except Exception as e:
+        logging.error(f"Erreur lors de la collecte des métriques: {str(e)}")
+        return Response(f"# erreur: {e}\n", status=500, content_type=CONTENT_TYPE)
+
+def _profiler_token():
+    """
+    Jeton d'accès au profileur : variable d'environnement CLAPTRAP_PROFILER_TOKEN uniquement
+    (les paramètres sont servis à l'interface sans authentification)
+    """
+    return os.environ.get('CLAPTRAP_PROFILER_TOKEN') or None
+
+def _check_profiler_token():
+    """Réponse d'erreur si le profileur est désactivé ou le jeton invalide, None sinon"""
+    token = _profiler_token()
+    if not token:
+        return jsonify({'error': 'Profileur désactivé : aucun jeton configuré'}), 403
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+        return jsonify({'error': 'Jeton invalide'}), 401
+    return None
+
+@app.route('/api/profile', methods=['POST'])
+def profile():
+    """
+    Lance un profil par échantillonnage de tous les threads du processus pendant `seconds` secondes,
+    sur un thread dédié ; le résultat est lu ensuite par `GET /api/profile`.
+
+    Authentification : en-tête `Authorization: Bearer <jeton>`. Sans jeton configuré, le profileur est désactivé.
+    """
+    error = _check_profiler_token()
+    if error:
+        return error
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.01))
+        if seconds <= 0 or not 0.001 <= interval <= 1.0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'Paramètres invalides (seconds > 0, 0.001 <= interval <= 1)'}), 400
+    try:
+        duration = get_profiler().start(seconds, interval, lines=request.args.get('lines') == '1')
+    except ProfilerBusyError as e:
+        return jsonify({'error': str(e)}), 409
+    logging.info(f"Profil lancé pour {duration}s")
+    return jsonify({'running': True, 'duration': duration}), 202
+
+@app.route('/api/profile', methods=['GET'])
+def get_profile():
+    """
+    Résultat du dernier profil : 202 tant qu'il est en cours, 404 si aucun profil n'a été lancé.
+    Réponse : piles repliées (`format=collapsed`, par défaut, pour flamegraph.pl ou speedscope) ou JSON (`format=json`).
+    """
+    error = _check_profiler_token()
+    if error:
+        return error
+    output_format = request.args.get('format', 'collapsed')
+    if output_format not in ('collapsed', 'json'):
+        return jsonify({'error': f'Format inconnu: {output_format}'}), 400
+    profiler = get_profiler()
+    status = profiler.status()
+    if status['running']:
+        return jsonify(status), 202
+    result = profiler.last_result
+    if result is None:
+        return jsonify({'error': 'Aucun profil disponible'}), 404
+    logging.info(f"Profil de {result['duration']}s : {result['samples']} échantillons, {len(result['threads'])} threads")
+    if output_format == 'json':
+        return jsonify(result)
+    return Response(
+        collapsed_stacks(result), content_type='text/plain; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="claptrap-{int(time.time())}.folded"'}
+    )
+
+@app.route('/api/latency', methods=['GET'])
+def get_latency():
+    """Histogrammes de latence par source et par étape (capture, file d'attente, inférence, webhook...)"""
+    try:
+        tracer = get_tracer()
+        return jsonify({'sources': tracer.status(), 'trace_file': tracer.trace_file})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/latency', methods=['DELETE'])
+def reset_latency():
+    get_tracer().reset()
+    return jsonify({'success': True})
+
+@app.route('/api/capacity', methods=['GET'])
+def get_capacity():
+    """Dernier rapport de capacité : flux tenus, CPU et mémoire par flux, courbe de latence p99"""
+    if not os.path.exists(CAPACITY_REPORT):
+        return jsonify({'error': 'Aucun rapport de capacité (lancer benchmarks/bench_capacity.py)'}), 404
+    try:
+        with open(CAPACITY_REPORT, 'r') as f:
+            return jsonify(json.load(f))
+    except (OSError, json.JSONDecodeError) as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/rtsp/webhook', methods=['PUT'])
 def update_rtsp_webhook():
     try:
@@ -0,0 +1,96 @@
+import threading
+import logging
+
+class AudioBus:
+    """
+    Bus de diffusion de l'audio décodé vers un nombre quelconque d'abonnés.
+
+    Chaque bloc publié est marqué en lecture seule puis transmis tel quel à tous
+    les abonnés du flux (détecteur, processeur, enregistreur, vumètre...) :
+    aucune copie n'est faite par abonné. Un abonné qui a besoin de modifier les
+    données doit en faire sa propre copie.
+    """
+
+    ALL_STREAMS = None
+
+    def __init__(self):
+        # flux -> tuple de (callback, pass_stream) ; remplacé à chaque modification
+        # pour que publish() puisse itérer sans verrou
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, stream=ALL_STREAMS, pass_stream=False):
+        """
+        Abonne un callback à un flux.
+
+        Args:
+            callback (callable): Appelé avec (audio_data, timestamp), plus `stream=` si pass_stream
+            stream (hashable, optional): Clé du flux, None pour tous les flux
+            pass_stream (bool): Transmettre la clé du flux en argument nommé
+
+        Returns:
+            callable: Le callback, pour faciliter le désabonnement
+        """
+        with self._lock:
+            current = self._subscribers.get(stream, ())
+            if not any(cb is callback for cb, _ in current):
+                self._subscribers[stream] = current + ((callback, pass_stream),)
+        return callback
+
+    def unsubscribe(self, callback, stream=ALL_STREAMS):
+        """
+        Désabonne un callback d'un flux.
+
+        Returns:
+            bool: True si le callback était abonné
+        """
+        with self._lock:
+            current = self._subscribers.get(stream, ())
+            remaining = tuple(entry for entry in current if entry[0] is not callback)
+            if remaining:
+                self._subscribers[stream] = remaining
+            else:
+                self._subscribers.pop(stream, None)
+            return len(remaining) != len(current)
+
+    def has_subscribers(self, stream=ALL_STREAMS):
+        """Indique si au moins un abonné recevrait les blocs de ce flux"""
+        subscribers = self._subscribers
+        return bool(subscribers.get(stream) or subscribers.get(self.ALL_STREAMS))
+
+    def subscriber_count(self, stream=ALL_STREAMS):
+        subscribers = self._subscribers
+        count = len(subscribers.get(self.ALL_STREAMS, ()))
+        if stream is not self.ALL_STREAMS:
+            count += len(subscribers.get(stream, ()))
+        return count
+
+    def publish(self, stream, audio_data, timestamp):
+        """
+        Diffuse un bloc audio à tous les abonnés du flux.
+
+        Args:
+            stream (hashable): Clé du flux
+            audio_data (numpy.ndarray): Bloc audio ; le bus en prend possession
+            timestamp (float): Horodatage du bloc
+
+        Returns:
+            int: Nombre d'abonnés notifiés
+        """
+        subscribers = self._subscribers
+        targets = subscribers.get(stream, ()) + subscribers.get(self.ALL_STREAMS, ())
+        if not targets:
+            return 0
+
+        view = audio_data.view()
+        view.flags.writeable = False
+
+        for callback, pass_stream in targets:
+            try:
+                if pass_stream:
+                    callback(view, timestamp, stream=stream)
+                else:
+                    callback(view, timestamp)
+            except Exception as e:
+                logging.error(f"Erreur dans un abonné du bus audio ({stream}): {e}")
+        return len(targets)
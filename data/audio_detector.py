@@ -1,19 +1,58 @@
 import numpy as np
-import collections
 import threading
-from mediapipe.tasks import python
-from mediapipe.tasks.python import audio
-from mediapipe.tasks.python.components import containers
-from mediapipe.tasks.python.audio import audio_classifier
-import mediapipe as mp
+import queue
 import time
 import logging
 
+from classifiers import create_classifier
+from latency_trace import get_tracer, new_trace
+
+# Poids des labels dans le score de clap : labels de clap, moins les labels proches qui n'en sont pas
+CLAP_WEIGHTS = {"Hands": 1.0, "Clapping": 1.0, "Cap gun": 1.0, "Finger snapping": -1.0}
+
+def clap_score(categories, weights=None):
+    """
+    Score de clap d'une classification : somme pondérée des scores des labels.
+
+    Args:
+        categories: Paires (label, score)
+        weights (dict): Poids par label (CLAP_WEIGHTS par défaut)
+    """
+    weights = CLAP_WEIGHTS if weights is None else weights
+    return sum(weights.get(name, 0.0) * score for name, score in categories)
+
+def top_labels(categories, count=3, min_score=0.5):
+    """Labels les plus probables, pour l'affichage"""
+    best = sorted(categories, key=lambda category: category[1], reverse=True)[:count]
+    return [{"label": name, "score": float(score)} for name, score in best if score > min_score]
+
 class AudioDetector:
-    def __init__(self, model_path, sample_rate=16000, buffer_duration=1.0):
+    """
+    Moteur d'inférence partagé entre toutes les sources audio.
+
+    Chaque source accumule ses propres échantillons ; dès qu'une fenêtre YAMNet
+    complète est disponible (tous les `hop_duration`), elle est placée dans une
+    file bornée. Un unique thread d'inférence classe les fenêtres une par une
+    (mode AUDIO_CLIPS), si bien que l'audio de deux sources n'est jamais mélangé
+    dans une même fenêtre et que le classificateur n'est jamais appelé en parallèle.
+    Le classificateur est choisi par `classifier_backend` ('mediapipe' ou 'stub',
+    voir `classifiers`). Les règles de détection sont celles de l'étape `rules`
+    du graphe : score pondéré par `weights` au-dessus de `threshold`, au plus
+    une détection par `delay` secondes et par source.
+    """
+
+    WINDOW_DURATION = 0.975  # Durée d'entrée de YAMNet en secondes
+
+    def __init__(self, model_path, sample_rate=16000, buffer_duration=1.0, hop_duration=0.5, queue_size=64,
+                 tracer=None, classifier_backend='mediapipe', classifier_options=None,
+                 threshold=0.3, delay=1.0, weights=None):
         self.model_path = model_path
+        self.classifier_backend = classifier_backend
+        self.classifier_options = classifier_options or {}
         self.sample_rate = sample_rate
         self.buffer_size = int(buffer_duration * sample_rate)
+        self.window_size = int(self.WINDOW_DURATION * sample_rate)
+        self.hop_size = max(1, int(hop_duration * sample_rate))
         self.sources = {}  # Dict pour stocker les buffers et callbacks par source
         self.source_ids = {}  # Dict pour mapper les noms de source aux IDs numériques
         self.next_source_id = 1  # Commencer à 1 pour éviter les problèmes avec 0
@@ -24,23 +63,31 @@ class AudioDetector:
         self.last_timestamp_ms = {}  # Dict pour stocker le dernier timestamp par source
         self.start_time_ms = None
         self.current_source_id = None  # Pour suivre la source actuelle dans le callback
+        # File des fenêtres à classer : (source_id, fenêtre, timestamp en ms, trace de latence)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.tracer = tracer or get_tracer()
+        self.dropped_windows = 0
+        self._worker = None
+        self._max_results = 5
+        self._score_threshold = 0.3
+        self.set_rules(threshold, delay, weights)
+
+    def set_rules(self, threshold=0.3, delay=1.0, weights=None):
+        """Règles de détection (seuil, délai entre deux détections, poids des labels), modifiables à chaud"""
+        self.threshold = float(threshold)
+        self.delay = float(delay)
+        self.weights = {label: float(weight) for label, weight in weights.items()} if weights else None
 
     def initialize(self, max_results=5, score_threshold=0.3):
         """Initialise le classificateur audio"""
         try:
-            base_options = python.BaseOptions(model_asset_path=self.model_path)
-            
-            # Créer un seul classificateur en mode stream
-            options = audio.AudioClassifierOptions(
-                base_options=base_options,
-                running_mode=audio.RunningMode.AUDIO_STREAM,
-                max_results=max_results,
-                score_threshold=score_threshold,
-                result_callback=self._handle_result
+            self._max_results = max_results
+            self._score_threshold = score_threshold
+            # Un seul classificateur, partagé par toutes les sources
+            self.classifier = create_classifier(
+                self.classifier_backend, self.model_path, max_results, score_threshold, **self.classifier_options
             )
-            self.classifier = audio.AudioClassifier.create_from_options(options)
-            self.running = True
-            logging.info(f"Classificateur audio initialisé avec succès (sample_rate: {self.sample_rate}Hz)")
+            logging.info(f"Classificateur audio {self.classifier_backend} initialisé avec succès (sample_rate: {self.sample_rate}Hz)")
             logging.info(f"Options du classificateur: max_results={max_results}, score_threshold={score_threshold}")
         except Exception as e:
             logging.error(f"Erreur lors de l'initialisation du classificateur: {str(e)}")
@@ -57,10 +104,19 @@ class AudioDetector:
             self.source_ids[source_id] = numeric_id
             
             self.sources[source_id] = {
-                'buffer': collections.deque(maxlen=self.buffer_size),
+                'buffer': np.zeros(self.window_size, dtype=np.float32),
+                'filled': 0,  # Échantillons valides dans le buffer
+                'since_last_window': 0,  # Échantillons reçus depuis la dernière fenêtre
                 'detection_callback': detection_callback,
                 'labels_callback': labels_callback,
-                'numeric_id': numeric_id
+                'numeric_id': numeric_id,
+                # Compteurs (un seul écrivain chacun : thread de la source ou thread d'inférence)
+                'blocks': 0,
+                'samples': 0,
+                'windows': 0,
+                'inferences': 0,
+                'detections': 0,
+                'dropped': 0
             }
             self.last_detection_time[source_id] = 0
             self.last_timestamp_ms[source_id] = 0
@@ -77,48 +133,29 @@ class AudioDetector:
                 del self.last_timestamp_ms[source_id]
                 logging.info(f"Source audio supprimée: {source_id} (ID interne: {numeric_id})")
 
-    def _handle_result(self, result, timestamp):
-        """Gère les résultats de classification"""
+    def _handle_result(self, categories, timestamp, source_id=None, trace=None):
+        """Gère les résultats de classification : paires (label, score) d'une fenêtre"""
         try:
-            if not result or not result.classifications or not self.current_source_id:
+            if source_id is None:
+                source_id = self.current_source_id
+            if source_id not in self.sources:
                 return
-                
-            classification = result.classifications[0]
-            source_id = self.current_source_id
             
             # Log pour déboguer les résultats bruts
             logging.debug(f"Résultats bruts pour source {source_id}:")
-            for category in classification.categories:
-                if category.score > 0.1:  # Abaisser le seuil pour voir plus de résultats
-                    logging.debug(f"  - {category.category_name}: {category.score}")
+            for name, score in categories:
+                if score > 0.1:  # Abaisser le seuil pour voir plus de résultats
+                    logging.debug(f"  - {name}: {score}")
             
             # Calculer le score pour la détection de clap
-            score_sum = sum(
-                category.score
-                for category in classification.categories
-                if category.category_name in ["Hands", "Clapping", "Cap gun"]
-            )
-            score_sum -= sum(
-                category.score
-                for category in classification.categories
-                if category.category_name == "Finger snapping"
-            )
+            score_sum = clap_score(categories, self.weights)
             
             # Log du score calculé
             if score_sum > 0.1:  # Abaisser le seuil pour le debug
                 logging.debug(f"Score de clap calculé pour source {source_id}: {score_sum}")
             
             # Préparer les labels pour le callback
-            top3_labels = sorted(
-                classification.categories,
-                key=lambda x: x.score,
-                reverse=True
-            )[:3]
-            labels_data = [
-                {"label": label.category_name, "score": float(label.score)}
-                for label in top3_labels
-                if label.score > 0.5
-            ]
+            labels_data = top_labels(categories)
             
             # Log pour déboguer les labels
             logging.debug(f"Labels détectés pour source {source_id}: {labels_data}")
@@ -132,27 +169,47 @@ class AudioDetector:
             
             # Vérifier si on a détecté un clap
             current_time = time.time()
-            if score_sum > 0.3 and (current_time - self.last_detection_time.get(source_id, 0)) > 1.0:
+            if trace is not None:
+                trace['scored'] = current_time
+            if score_sum > self.threshold and (current_time - self.last_detection_time.get(source_id, 0)) > self.delay:
+                if trace is not None:
+                    trace.update(detection=True, score=float(score_sum))
+                self.sources[source_id]['detections'] += 1
                 if self.sources[source_id]['detection_callback']:
                     try:
+                        # Le callback complète la trace (émission Socket.IO, webhook)
                         self.sources[source_id]['detection_callback']({
                             'timestamp': current_time,
                             'score': float(score_sum),
-                            'source_id': source_id
+                            'source_id': source_id,
+                            'trace': trace
                         })
                     except Exception as e:
                         logging.error(f"Erreur dans le callback de détection pour source {source_id}: {str(e)}")
                 self.last_detection_time[source_id] = current_time
+            if trace is not None:
+                self.tracer.record(source_id, trace)
                 
         except Exception as e:
             logging.error(f"Erreur dans le traitement du résultat: {str(e)}")
             import traceback
             logging.error(traceback.format_exc())
 
-    def process_audio(self, audio_data, source_id):
-        """Traite les données audio pour une source spécifique"""
+    def process_audio(self, audio_data, source_id, capture_time=None, resample_seconds=None):
+        """
+        Traite les données audio pour une source spécifique.
+
+        `capture_time` : heure de capture du dernier échantillon du bloc, si la source la connaît.
+        `resample_seconds` : durée de la conversion à 16 kHz faite par la source avant la livraison
+        du bloc (capture micro), None si la source livre déjà à 16 kHz.
+        """
         try:
-            if source_id not in self.sources:
+            ingest_time = time.time()
+            if audio_data is None or len(audio_data) == 0:
+                return
+
+            source = self.sources.get(source_id)
+            if source is None:
                 logging.warning(f"Source inconnue: {source_id}")
                 return
 
@@ -164,110 +221,115 @@ class AudioDetector:
                     logging.error("Impossible de démarrer le classificateur")
                     return
 
-            # Rééchantillonnage si nécessaire
+            # Réduction des blocs trop longs (le rééchantillonnage est fait par la source)
             if len(audio_data) > self.buffer_size:
                 resampled_data = audio_data[::3]
                 audio_data = resampled_data
             
-            # S'assurer que les données sont en float32
-            if audio_data.dtype != np.float32:
-                audio_data = audio_data.astype(np.float32)
+            # S'assurer que les données sont en float32 et mono
+            audio_data = np.asarray(audio_data, dtype=np.float32).reshape(-1)
             
-            # Log des statistiques audio
-            if len(audio_data) > 0:
-                logging.debug(f"Audio stats (source {source_id}) - min: {np.min(audio_data):.4f}, max: {np.max(audio_data):.4f}, mean: {np.mean(audio_data):.4f}, std: {np.std(audio_data):.4f}")
+            # Ajouter les nouvelles données à la fenêtre glissante de la source
+            buffer = source['buffer']
+            n = len(audio_data)
+            source['blocks'] += 1
+            source['samples'] += n
+            if n >= self.window_size:
+                buffer[:] = audio_data[-self.window_size:]
+            elif n > 0:
+                buffer[:-n] = buffer[n:]
+                buffer[-n:] = audio_data
+            source['filled'] = min(self.window_size, source['filled'] + n)
+            source['since_last_window'] += n
             
-            # Ajouter les nouvelles données au buffer de la source
-            self.sources[source_id]['buffer'].extend(audio_data)
+            # Soumettre une fenêtre complète à chaque pas
+            if source['filled'] < self.window_size or source['since_last_window'] < self.hop_size:
+                return
+            source['since_last_window'] = 0
             
-            # Traiter avec le classificateur
-            if self.running and self.classifier and self.start_time_ms is not None:
-                block_size = 1600
-                buffer_array = np.array(list(self.sources[source_id]['buffer']))
-                
-                blocks_processed = 0  # Compteur pour le debug
-                while len(buffer_array) >= block_size:
-                    block = buffer_array[:block_size]
-                    buffer_array = buffer_array[block_size:]
-                    blocks_processed += 1
-                    
-                    # Vérifier les statistiques du bloc avant classification
-                    block_max = np.max(np.abs(block))
-                    if block_max > 0.1:  # Seulement log les blocs avec du son significatif
-                        logging.debug(f"Classification d'un bloc audio (source {source_id}) - amplitude max: {block_max:.4f}")
-                    
-                    audio_data_container = containers.AudioData.create_from_array(
-                        block,
-                        self.sample_rate
-                    )
-                    
-                    # Calculer le prochain timestamp
-                    block_duration_ms = int((block_size / self.sample_rate) * 1000)
-                    next_timestamp = max(
-                        self.last_timestamp_ms.get(source_id, 0) + block_duration_ms,
-                        int(time.time() * 1000)
-                    )
-                    self.last_timestamp_ms[source_id] = next_timestamp
-                    
-                    # Définir la source actuelle pour le callback
-                    self.current_source_id = source_id
-                    
-                    # Log avant la classification
-                    if block_max > 0.1:
-                        logging.debug(f"Envoi au classificateur - source: {source_id}, timestamp: {next_timestamp}")
-                    
-                    # Classifier le bloc
-                    try:
-                        self.classifier.classify_async(audio_data_container, next_timestamp)
-                    except Exception as e:
-                        logging.error(f"Erreur lors de la classification: {str(e)}")
-                
-                if blocks_processed > 0:
-                    logging.debug(f"Blocs traités pour {source_id}: {blocks_processed}")
-                
-                # Mettre à jour le buffer avec les données restantes
-                self.sources[source_id]['buffer'].clear()
-                if len(buffer_array) > 0:
-                    self.sources[source_id]['buffer'].extend(buffer_array)
+            timestamp_ms = max(self.last_timestamp_ms.get(source_id, 0) + 1, int(time.time() * 1000))
+            self.last_timestamp_ms[source_id] = timestamp_ms
+            window = buffer.copy()
+            source['windows'] += 1
+            item = (source_id, window, timestamp_ms, new_trace(ingest_time, capture_time, resample_seconds))
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                # Inférence en retard : abandonner la fenêtre la plus ancienne
+                try:
+                    dropped = self.queue.get_nowait()
+                    if dropped[0] in self.sources:
+                        self.sources[dropped[0]]['dropped'] += 1
+                except queue.Empty:
+                    pass
+                self.dropped_windows += 1
+                self.queue.put_nowait(item)
+                if self.dropped_windows % 100 == 1:
+                    logging.warning(f"File d'inférence pleine, {self.dropped_windows} fenêtres abandonnées")
             
         except Exception as e:
             logging.error(f"Erreur dans le traitement audio: {e}")
             import traceback
             logging.error(traceback.format_exc())
 
+    def metrics(self):
+        """Compteurs du moteur, lus sans verrou : profondeur de la file et compteurs par source"""
+        return {
+            'queue_depth': self.queue.qsize(),
+            'dropped_windows': self.dropped_windows,
+            'sources': {
+                source_id: {key: source[key] for key in ('blocks', 'samples', 'windows', 'inferences', 'detections', 'dropped')}
+                for source_id, source in list(self.sources.items())
+            },
+        }
+
+    def _inference_loop(self):
+        """Classe les fenêtres en attente, une à la fois, pour toutes les sources"""
+        while self.running:
+            try:
+                item = self.queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            source_id, window, timestamp_ms, trace = item
+            source = self.sources.get(source_id)
+            if source is None or self.classifier is None:
+                continue
+            trace['dequeued'] = time.time()
+            source['inferences'] += 1
+            try:
+                categories = self.classifier.classify(window, self.sample_rate)
+            except Exception as e:
+                logging.error(f"Erreur lors de la classification: {str(e)}")
+                continue
+            trace['classified'] = time.time()
+            self.current_source_id = source_id
+            self._handle_result(categories, timestamp_ms, source_id, trace)
+
     def start(self):
         """Démarre la détection"""
         if not self.classifier:
-            self.initialize()
+            self.initialize(self._max_results, self._score_threshold)
+        if self.running:
+            return True
         
         # Réinitialiser les timestamps
         self.start_time_ms = int(time.time() * 1000)
         for source_id in self.sources:
             self.last_timestamp_ms[source_id] = self.start_time_ms
         
-        # Démarrer le task runner de MediaPipe
-        if self.classifier:
-            try:
-                # Créer un conteneur audio vide pour démarrer le stream
-                empty_data = np.zeros(1600, dtype=np.float32)
-                audio_data = containers.AudioData.create_from_array(
-                    empty_data,
-                    self.sample_rate
-                )
-                # Démarrer le stream avec le timestamp initial
-                self.classifier.classify_async(audio_data, self.start_time_ms)
-                self.running = True
-                logging.info("Task runner MediaPipe démarré avec succès")
-            except Exception as e:
-                logging.error(f"Erreur lors du démarrage du task runner: {e}")
-                return False
-        
         self.running = True
+        self._worker = threading.Thread(target=self._inference_loop, name='audio-inference')
+        self._worker.daemon = True
+        self._worker.start()
+        logging.info("Thread d'inférence démarré")
         return True
 
     def stop(self):
         """Arrête le classificateur"""
         self.running = False
+        if self._worker and self._worker is not threading.current_thread():
+            self._worker.join(timeout=2.0)
+        self._worker = None
         if self.classifier:
             try:
                 self.classifier.close()
@@ -0,0 +1,174 @@
+"""
+Analyse hors ligne d'enregistrements audio (WAV, FLAC...) avec la même
+chaîne que la détection en direct : fenêtres YAMNet de 0,975 s tous les
+`hop`, score de clap, seuil et délai entre deux détections.
+
+Les fichiers sont répartis sur un pool de processus (un classificateur par
+processus) et décodés par ffmpeg aussi vite que possible. Le résultat est un
+fichier CSV ou JSONL avec une ligne par fenêtre analysée :
+
+    python batch_analysis.py enregistrements/ -o scores.jsonl --workers 4
+"""
+import argparse
+import csv
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+from audio_detector import clap_score
+from ffmpeg_reader import FFmpegAudioReader
+from stage_graph import ClassifyStage, Frame, RulesStage, WindowStage
+
+AUDIO_EXTENSIONS = ('.wav', '.flac')
+CSV_FIELDS = ('file', 'offset', 'score', 'detection', 'categories')
+
+# Classificateur du processus de travail, chargé une seule fois par processus
+_classifier = None
+
+def find_audio_files(paths, extensions=AUDIO_EXTENSIONS):
+    """Fichiers audio désignés par `paths` (fichiers ou répertoires parcourus récursivement), triés"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.lower().endswith(extensions))
+        else:
+            files.append(path)
+    return sorted(files)
+
+def _init_worker(model_path, max_results, score_threshold):
+    global _classifier
+    logging.basicConfig(level=logging.WARNING)
+    _classifier = ClassifyStage('classify', model_path, max_results, score_threshold)
+    _classifier.start()
+
+def analyze_file(path, hop=0.5, threshold=0.3, delay=1.0, sample_rate=16000, classifier=None):
+    """
+    Analyse un fichier audio fenêtre par fenêtre.
+
+    Returns:
+        dict: {'file', 'duration', 'rows', 'error'} ; chaque ligne donne la
+        position de fin de fenêtre (`offset`, en secondes), le score de clap,
+        la détection éventuelle et les scores des labels
+    """
+    classifier = classifier or _classifier
+    window = WindowStage('window', sample_rate, hop=hop)
+    rules = RulesStage('rules', threshold, delay)
+    # Blocs d'un pas : une fenêtre au plus par bloc, à la position exacte du pas
+    reader = FFmpegAudioReader(
+        path, sample_rate=sample_rate, chunk_samples=max(1, int(hop * sample_rate)),
+        profile='default', startup_timeout=30.0, stall_timeout=30.0
+    )
+    rows = []
+    position = 0
+    error = None
+    try:
+        reader.start()
+        for chunk in reader:
+            position += len(chunk)
+            for frame in window.process(Frame(path, chunk, sample_rate, position / sample_rate)):
+                for scores in classifier.process(frame):
+                    detected = any(event['kind'] == 'clap' for event in rules.process(scores))
+                    rows.append({
+                        'file': path,
+                        'offset': round(scores['timestamp'], 3),
+                        'score': round(clap_score(scores['categories'], rules.weights), 4),
+                        'detection': detected,
+                        'categories': {name: round(score, 4) for name, score in scores['categories']},
+                    })
+    except Exception as e:
+        error = reader.last_error or str(e)
+        logging.error(f"Erreur d'analyse de {path}: {error}")
+    finally:
+        reader.close()
+    return {'file': path, 'duration': position / sample_rate, 'rows': rows, 'error': error}
+
+class ResultWriter:
+    """Écrit les lignes de résultat en CSV ou en JSONL (une ligne JSON par fenêtre)"""
+
+    def __init__(self, path, output_format=None):
+        self.format = output_format or ('csv' if path.endswith('.csv') else 'jsonl')
+        self.file = open(path, 'w', newline='') if path != '-' else sys.stdout
+        self._csv = None
+        if self.format == 'csv':
+            self._csv = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self._csv is not None:
+                self._csv.writerow({**row, 'categories': json.dumps(row['categories'])})
+            else:
+                self.file.write(json.dumps(row) + '\n')
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+def run_batch(files, output, model_path, workers=None, output_format=None, hop=0.5, threshold=0.3, delay=1.0,
+              max_results=5, score_threshold=0.3):
+    """
+    Analyse `files` sur un pool de `workers` processus et écrit les résultats
+    au fil de l'eau dans `output`.
+
+    Returns:
+        dict: Résumé (fichiers, durée d'audio, durée de calcul, facteur de vitesse, détections, erreurs)
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files) or 1))
+    analyze = functools.partial(analyze_file, hop=hop, threshold=threshold, delay=delay)
+    writer = ResultWriter(output, output_format)
+    summary = {'files': 0, 'audio_seconds': 0.0, 'windows': 0, 'detections': 0, 'errors': []}
+    started = time.monotonic()
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(workers, initializer=_init_worker, initargs=(model_path, max_results, score_threshold)) as pool:
+            for result in pool.imap_unordered(analyze, files):
+                writer.write(result['rows'])
+                summary['files'] += 1
+                summary['audio_seconds'] += result['duration']
+                summary['windows'] += len(result['rows'])
+                summary['detections'] += sum(row['detection'] for row in result['rows'])
+                if result['error']:
+                    summary['errors'].append({'file': result['file'], 'error': result['error']})
+                logging.info(f"[{summary['files']}/{len(files)}] {result['file']}: {result['duration']:.0f}s analysées")
+    finally:
+        writer.close()
+    summary['wall_seconds'] = round(time.monotonic() - started, 2)
+    summary['speed'] = round(summary['audio_seconds'] / summary['wall_seconds'], 1) if summary['wall_seconds'] else None
+    summary['audio_seconds'] = round(summary['audio_seconds'], 2)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse hors ligne de fichiers audio (scores par fenêtre et détections)")
+    parser.add_argument('paths', nargs='+', help="Fichiers ou répertoires (WAV, FLAC)")
+    parser.add_argument('-o', '--output', default='-', help="Fichier de sortie (.csv ou .jsonl), - pour la sortie standard")
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="Format de sortie (par défaut selon l'extension)")
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yamnet.tflite'))
+    parser.add_argument('--workers', type=int, default=None, help="Processus d'analyse (par défaut : un par cœur)")
+    parser.add_argument('--hop', type=float, default=0.5, help="Pas entre deux fenêtres, en secondes")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Seuil du score de clap")
+    parser.add_argument('--delay', type=float, default=1.0, help="Délai minimum entre deux détections, en secondes")
+    parser.add_argument('--max-results', type=int, default=5, help="Labels conservés par fenêtre")
+    parser.add_argument('--score-threshold', type=float, default=0.3, help="Score minimum d'un label conservé")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+    files = find_audio_files(args.paths)
+    if not files:
+        parser.error("aucun fichier audio trouvé")
+    summary = run_batch(
+        files, args.output, args.model, workers=args.workers, output_format=args.format, hop=args.hop,
+        threshold=args.threshold, delay=args.delay, max_results=args.max_results, score_threshold=args.score_threshold
+    )
+    logging.info(
+        f"{summary['files']} fichier(s), {summary['audio_seconds']:.0f}s d'audio en {summary['wall_seconds']:.1f}s "
+        f"(x{summary['speed']}), {summary['detections']} détection(s), {len(summary['errors'])} erreur(s)"
+    )
+    return 1 if summary['errors'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,400 @@
+"""
+Benchmark de capacité de bout en bout : combien de flux une machine tient-elle ?
+
+Monte en charge le nombre de sources synthétiques branchées sur la chaîne
+complète (`DetectionPipeline` + `AudioDetector` avec YAMNet) jusqu'à ce qu'un
+objectif ne soit plus tenu. Les sources sont réparties entre les types
+demandés :
+- `vban` : flux VBAN émis par `VBANLoadGenerator` (processus séparé) vers un
+  `VBANDetector` local ;
+- `rtsp` : un `FileStreamServer` par flux (fichier WAV diffusé au rythme réel),
+  lu par `RTSPSource` (ffmpeg) ;
+- `mic` : `MicrophoneSource` sur un flux PortAudio virtuel à 48 kHz.
+
+Chaque source émet un clap toutes les `--clap-every` secondes ; la latence de
+détection est mesurée de l'émission du clap au callback de détection.
+
+Pour chaque palier : facteur temps réel (audio livré au moteur / durée) et
+retard maximal d'une source, charge du thread d'inférence, fenêtres
+abandonnées, rappel, p50/p95/p99 de la latence de détection (globale et par
+type), CPU et mémoire par flux (processus et lecteurs ffmpeg ; le générateur
+VBAN et les ffmpeg des serveurs de test sont exclus, pas leurs threads Python
+de relais RTSP). Le rapport est écrit dans `capacity_report.json`
+(servi par `GET /api/capacity`).
+
+Usage (depuis data/) :
+    python benchmarks/bench_capacity.py --kinds vban,rtsp,mic --streams 1,2,4,8,16 --duration 20
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import psutil
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DATA_DIR)
+
+from audio_detector import AudioDetector  # noqa: E402
+from bench_vban_ingest import _generator_worker, match_detections  # noqa: E402
+from latency_trace import LatencyTracer  # noqa: E402
+from mic_capture import MicrophoneCapture  # noqa: E402
+from pipeline import DetectionPipeline, MicrophoneSource, RTSPSource, VBANSource  # noqa: E402
+from stream_test_server import FileStreamServer, write_test_wav  # noqa: E402
+from vban_detector_new import VBANDetector  # noqa: E402
+from vban_loadgen import make_streams, synthetic_clap  # noqa: E402
+
+KINDS = ('vban', 'rtsp', 'mic')
+CAPACITY_REPORT = os.path.join(DATA_DIR, 'capacity_report.json')
+
+class VirtualInputStream:
+    """
+    Flux d'entrée PortAudio simulé (interface de `sounddevice.InputStream`) :
+    un thread appelle le callback au rythme réel avec un signal de bruit faible
+    ponctué de claps. Les heures d'émission des claps sont consignées.
+    """
+
+    def __init__(self, callback, samplerate=48000, clap_every=2.0, block_duration=0.01, **kwargs):
+        self.callback = callback
+        self.samplerate = samplerate
+        self.frames = int(samplerate * block_duration)
+        self.clap_every = clap_every
+        self.clap_times = []
+        self.running = False
+        self._thread = None
+
+    def _signal(self):
+        rng = np.random.default_rng(0)
+        audio = rng.normal(0.0, 0.005, int(loop_duration(self.clap_every) * self.samplerate)).astype(np.float32)
+        clap = synthetic_clap(self.samplerate)
+        offsets = np.arange(1.0, loop_duration(self.clap_every) - 0.5, self.clap_every)
+        for t in offsets:
+            start = int(t * self.samplerate)
+            audio[start:start + len(clap)] += clap
+        return audio, (offsets * self.samplerate).astype(int)
+
+    def _run(self):
+        audio, clap_positions = self._signal()
+        start = time.perf_counter()
+        wall_start = time.time()
+        position = 0
+        while self.running:
+            due = position / self.samplerate
+            delay = due - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            offset = position % len(audio)
+            block = audio[offset:offset + self.frames]
+            for clap in clap_positions[(clap_positions >= offset) & (clap_positions < offset + len(block))]:
+                self.clap_times.append(wall_start + (position + clap - offset) / self.samplerate)
+            self.callback(block.reshape(-1, 1), len(block), None, None)
+            position += len(block)
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name='virtual-mic', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+    def close(self):
+        pass
+
+def loop_duration(clap_every):
+    """Durée du signal bouclé : un multiple de l'intervalle, pour des claps régulièrement espacés d'une boucle à l'autre"""
+    return 3 * clap_every
+
+def split_streams(count, kinds):
+    """Répartit `count` flux entre les types, à tour de rôle"""
+    return {kind: len(range(index, count, len(kinds))) for index, kind in enumerate(kinds)}
+
+class LoadLevel:
+    """Sources synthétiques d'un palier et leurs générateurs"""
+
+    def __init__(self, counts, args, wav):
+        self.counts = counts
+        self.args = args
+        self.wav = wav
+        self.sources = []
+        self.servers = []
+        self.mic_streams = {}
+        self.vban = None
+        self.generator = None
+        self.generator_results = None
+
+    def start(self, pipeline, total_duration):
+        if self.counts['vban']:
+            self.vban = VBANDetector(port=0)
+            # La charge synthétique ne doit pas être filtrée par les sources VBAN de settings.json
+            self.vban._settings_cache = {}
+            self.vban._settings_cache_duration = float('inf')
+            self.vban._last_settings_load = time.time()
+            self.vban.start_listening()
+            clap_times = [t for t in np.arange(1.0, total_duration - 1.0, self.args.clap_every)]
+            specs = make_streams(self.counts['vban'], 48000, samples_per_frame=256, clap_times=clap_times)
+            self.generator_results = multiprocessing.Queue()
+            self.generator = multiprocessing.Process(
+                target=_generator_worker, args=(specs, self.vban.port, total_duration, self.generator_results)
+            )
+            self.generator.start()
+            for spec in specs:
+                self.sources.append(VBANSource('127.0.0.1', spec.name, vban_detector_factory=lambda: self.vban))
+        for index in range(self.counts['rtsp']):
+            server = FileStreamServer(self.wav).start()
+            self.servers.append(server)
+            self.sources.append(RTSPSource(server.url, name=f"rtsp_{index}"))
+        for index in range(self.counts['mic']):
+            self.sources.append(MicrophoneSource(index, capture_factory=self._capture_factory))
+        for source in self.sources:
+            if source.kind == 'vban':
+                # La source n'écoute que les IP déjà découvertes : attendre le premier paquet
+                self._wait_for(lambda: '127.0.0.1' in self.vban.get_active_sources(), 5.0)
+            pipeline.add_source(source)
+
+    def _capture_factory(self, device, deliver, **options):
+        def stream_factory(callback, samplerate, **kwargs):
+            stream = self.mic_streams[f"mic_{device}"] = VirtualInputStream(callback, samplerate, self.args.clap_every)
+            return stream
+        return MicrophoneCapture(device, deliver, stream_factory=stream_factory, device_rate=48000, **options)
+
+    @staticmethod
+    def _wait_for(condition, timeout):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def excluded_pids(self):
+        """Processus de charge (générateur VBAN, ffmpeg des serveurs de test)"""
+        pids = set()
+        if self.generator is not None and self.generator.pid:
+            pids.add(self.generator.pid)
+        for server in self.servers:
+            with server._lock:
+                pids.update(session['process'].pid for session in server._sessions if session['process'] is not None)
+        return pids
+
+    def clap_events(self):
+        """(source_id, heure d'émission) de chaque clap injecté"""
+        events = []
+        if self.generator is not None:
+            result = self.generator_results.get(timeout=30)
+            events += [(f"vban_127.0.0.1_{name}", sent_at) for name, sent_at in result['clap_events']]
+        for source, server in zip([s for s in self.sources if s.kind == 'rtsp'], self.servers):
+            if not server.session_starts:
+                continue
+            session_start = server.session_starts[0]
+            duration = loop_duration(self.args.clap_every)
+            offsets = np.arange(1.0, duration - 0.5, self.args.clap_every)
+            loops = int((time.time() - session_start) // duration) + 1
+            events += [
+                (source.source_id, session_start + loop * duration + offset)
+                for loop in range(loops) for offset in offsets
+            ]
+        for source_id, stream in self.mic_streams.items():
+            events += [(source_id, clap) for clap in stream.clap_times]
+        return events
+
+    def stop(self, pipeline):
+        for source in self.sources:
+            pipeline.remove_source(source.source_id)
+        if self.generator is not None:
+            self.generator.join(timeout=30)
+        for server in self.servers:
+            server.stop()
+        if self.vban is not None:
+            self.vban.stop_listening()
+
+def _usage(process, excluded):
+    """CPU (s) par processus et mémoire résidente totale du processus et de ses lecteurs"""
+    cpu, rss = {}, 0
+    for proc in [process] + process.children(recursive=True):
+        if proc.pid in excluded:
+            continue
+        try:
+            with proc.oneshot():
+                times = proc.cpu_times()
+                cpu[proc.pid] = times.user + times.system
+                rss += proc.memory_info().rss
+        except psutil.Error:
+            continue
+    return cpu, rss
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values)
+    return {f"p{q}": round(float(np.percentile(values, q)), 3) for q in (50, 95, 99)}
+
+def run_level(count, args, wav, baseline_rss):
+    counts = split_streams(count, args.kinds)
+    tracer = LatencyTracer()
+    detector = AudioDetector(os.path.join(DATA_DIR, 'yamnet.tflite'), tracer=tracer)
+    detections = []
+
+    def callbacks(source):
+        return (lambda data: detections.append((data['timestamp'], data['source_id'])), None)
+
+    pipeline = DetectionPipeline(detector, callbacks).start()
+    level = LoadLevel(counts, args, wav)
+    total_duration = args.warmup + args.duration + args.tolerance
+    process = psutil.Process()
+    try:
+        level.start(pipeline, total_duration)
+        time.sleep(args.warmup)
+        excluded = level.excluded_pids()
+        cpu_before, _ = _usage(process, excluded)
+        engine_before = detector.metrics()
+        inference_before = sum(h.sum_ms for h in tracer.histograms('inference').values())
+        measure_start = time.time()
+        time.sleep(args.duration)
+        measure_end = time.time()
+        excluded |= level.excluded_pids()
+        cpu_after, rss = _usage(process, excluded)
+        engine_after = detector.metrics()
+        inference_ms = sum(h.sum_ms for h in tracer.histograms('inference').values()) - inference_before
+        time.sleep(args.tolerance)  # Laisser aboutir les détections des derniers claps
+    finally:
+        level.stop(pipeline)
+        pipeline.stop()
+    wall = measure_end - measure_start
+
+    def delta(key):
+        return sum(
+            values[key] - engine_before['sources'].get(source_id, {}).get(key, 0)
+            for source_id, values in engine_after['sources'].items()
+        )
+
+    claps = [(source_id, t) for source_id, t in level.clap_events() if measure_start <= t <= measure_end]
+    hits, latencies = match_detections(claps, detections, args.tolerance)
+    kinds = {source.source_id: source.kind for source in level.sources}
+    by_kind = {}
+    for kind in {kind for kind in kinds.values()}:
+        kind_claps = [(source_id, t) for source_id, t in claps if kinds[source_id] == kind]
+        kind_hits, kind_latencies = match_detections(
+            kind_claps, [(t, source_id) for t, source_id in detections if kinds.get(source_id) == kind], args.tolerance
+        )
+        by_kind[kind] = {
+            'claps': len(kind_claps),
+            'recall': round(kind_hits / len(kind_claps), 3) if kind_claps else None,
+            'latency_s': _percentiles(kind_latencies),
+        }
+    # Retard de chaque source sur le temps réel (audio non livré), à la granularité des blocs près
+    lag = max(
+        (wall - (values['samples'] - engine_before['sources'].get(source_id, {}).get('samples', 0)) / detector.sample_rate
+         for source_id, values in engine_after['sources'].items()),
+        default=wall
+    )
+    cpu_seconds = sum(value - cpu_before.get(pid, 0.0) for pid, value in cpu_after.items())
+    result = {
+        'streams': count,
+        'kinds': counts,
+        'realtime_factor': round(delta('samples') / detector.sample_rate / wall / count, 3),
+        'max_lag_s': round(lag, 3),
+        # Fraction du temps où le thread d'inférence (unique) est occupé : plafond à 1
+        'inference_load': round(inference_ms / 1000 / wall, 3),
+        'windows': delta('windows'),
+        'dropped_windows': delta('dropped'),
+        'claps': len(claps),
+        'recall': round(hits / len(claps), 3) if claps else None,
+        'latency_s': _percentiles(latencies),
+        'by_kind': by_kind,
+        'cpu_percent': round(100 * cpu_seconds / wall, 1),
+        'cpu_percent_per_stream': round(100 * cpu_seconds / wall / count, 2),
+        'rss_mb': round(rss / 2**20, 1),
+        'rss_mb_per_stream': round((rss - baseline_rss) / 2**20 / count, 2),
+    }
+    p99 = (result['latency_s'] or {}).get('p99')
+    failures = []
+    if lag > args.max_lag:
+        failures.append('realtime')
+    if result['dropped_windows'] > args.max_dropped * max(result['windows'], 1):
+        failures.append('dropped_windows')
+    if p99 is None or p99 > args.max_p99:
+        failures.append('latency')
+    if claps and hits / len(claps) < args.min_recall:
+        failures.append('recall')
+    result['slo_failures'] = failures
+    result['sustained'] = not failures
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capacité de bout en bout : flux tenus en temps réel")
+    parser.add_argument('--kinds', default=','.join(KINDS), help="Types de sources, répartis à tour de rôle")
+    parser.add_argument('--streams', default='1,2,4,8,16,32', help="Paliers de nombre de flux")
+    parser.add_argument('--duration', type=float, default=20.0, help="Durée de mesure de chaque palier (s)")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Mise en route avant la mesure (s)")
+    parser.add_argument('--clap-every', type=float, default=4.0, help="Intervalle entre claps (s), supérieur à --tolerance")
+    parser.add_argument('--tolerance', type=float, default=3.0, help="Délai maximal clap → détection (s)")
+    parser.add_argument('--max-p99', type=float, default=2.5, help="Objectif de latence p99 (s)")
+    parser.add_argument('--max-lag', type=float, default=1.5,
+                        help="Retard maximal d'une source sur le temps réel (s), blocs VBAN d'une seconde compris")
+    parser.add_argument('--max-dropped', type=float, default=0.01, help="Part maximale de fenêtres abandonnées")
+    # Le clap synthétique n'est pas reconnu dans toutes les positions de fenêtre : rappel indicatif par défaut
+    parser.add_argument('--min-recall', type=float, default=0.0, help="Rappel minimal (0 : non vérifié)")
+    parser.add_argument('--all', action='store_true', help="Mesurer tous les paliers, même après un échec")
+    parser.add_argument('--output', default=CAPACITY_REPORT, help="Rapport JSON (lu par GET /api/capacity)")
+    args = parser.parse_args(argv)
+    args.kinds = [kind for kind in args.kinds.split(',') if kind]
+    unknown = set(args.kinds) - set(KINDS)
+    if unknown or not args.kinds:
+        parser.error(f"Types inconnus: {', '.join(sorted(unknown))} (disponibles: {', '.join(KINDS)})")
+    if args.tolerance >= args.clap_every:
+        # Sinon une détection tardive pourrait être attribuée au clap précédent
+        parser.error("--tolerance doit être inférieur à --clap-every")
+
+    wav = write_test_wav(
+        os.path.join(tempfile.mkdtemp(prefix='claptrap-capacity-'), 'stream.wav'),
+        duration=loop_duration(args.clap_every), clap_every=args.clap_every
+    )
+    # Référence mémoire : processus avec un moteur chargé mais sans source
+    detector = AudioDetector(os.path.join(DATA_DIR, 'yamnet.tflite'))
+    detector.start()
+    baseline_rss = psutil.Process().memory_info().rss
+    detector.stop()
+
+    levels = []
+    for count in [int(value) for value in args.streams.split(',')]:
+        level = run_level(count, args, wav, baseline_rss)
+        levels.append(level)
+        print(json.dumps(level), flush=True)
+        if not level['sustained'] and not args.all:
+            break
+
+    sustained = [level for level in levels if level['sustained']]
+    best = max(sustained, key=lambda level: level['streams']) if sustained else None
+    report = {
+        'benchmark': 'capacity',
+        'timestamp': time.time(),
+        'machine': {
+            'cpu_count': psutil.cpu_count(),
+            'cpu_model': platform.processor() or platform.machine(),
+            'memory_mb': round(psutil.virtual_memory().total / 2**20),
+            'python': platform.python_version(),
+        },
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'max_sustainable_streams': best['streams'] if best else 0,
+        'cpu_percent_per_stream': best['cpu_percent_per_stream'] if best else None,
+        'rss_mb_per_stream': best['rss_mb_per_stream'] if best else None,
+        'baseline_rss_mb': round(baseline_rss / 2**20, 1),
+        # Courbe de latence : p99 (s) par nombre de flux
+        'p99_latency_curve': [[level['streams'], (level['latency_s'] or {}).get('p99')] for level in levels],
+        'levels': levels,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    print(f"Flux tenus : {report['max_sustainable_streams']} "
+          f"(CPU {report['cpu_percent_per_stream']} %/flux, {report['rss_mb_per_stream']} Mo/flux)")
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Microbenchmarks des chemins chauds de l'audio : débit et allocations.
+
+Chaque cas appelle une fonction du chemin de traitement sur des données
+synthétiques, sans réseau ni modèle (classificateur `stub`) :
+- `circular_buffer` : `CircularAudioBuffer.write` puis `read` ;
+- `detector_ingest` : `AudioDetector.process_audio` (fenêtrage et mise en file) ;
+- `vban_parse` : `parse_vban_header` puis décodage de la charge utile ;
+- `resample` : `PolyphaseResampler.process` (48 kHz et 44,1 kHz → 16 kHz) ;
+- `signal_analysis` : `VBANSignalProcessor.analyze_signal` sur une fenêtre YAMNet ;
+- `scoring` : score de clap et labels dans `AudioDetector._handle_result`.
+
+Débit : meilleur temps par appel sur plusieurs répétitions (et échantillons
+audio par seconde). Allocations (tracemalloc) : pic de mémoire d'un appel et
+mémoire conservée par appel (fuites).
+
+Usage (depuis data/) :
+    python benchmarks/bench_hotpaths.py --output hotpaths.json
+    python benchmarks/bench_hotpaths.py --compare hotpaths.json   # sortie 1 si régression
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DATA_DIR)
+
+from audio_detector import AudioDetector  # noqa: E402
+from circular_buffer import CircularAudioBuffer  # noqa: E402
+from resampler import PolyphaseResampler  # noqa: E402
+from vban_ingest import (  # noqa: E402
+    VBAN_DATATYPE_FLOAT32, VBAN_DATATYPE_INT16, build_vban_packet, encode_pcm, parse_vban_header
+)
+from vban_signal_processor import VBANSignalProcessor  # noqa: E402
+
+BLOCK = 256  # Échantillons par bloc, taille typique d'un paquet VBAN ou d'un callback micro
+
+def _noise(n, seed=0):
+    return (np.random.default_rng(seed).standard_normal(n) * 0.1).astype(np.float32)
+
+def case_circular_buffer():
+    buffer = CircularAudioBuffer(16000)
+    block = _noise(BLOCK).reshape(-1, 1)
+
+    def run():
+        buffer.write(block)
+        buffer.read(BLOCK)
+    return run, BLOCK
+
+def _detector():
+    detector = AudioDetector(os.path.join(DATA_DIR, 'yamnet.tflite'), queue_size=1 << 20, classifier_backend='stub')
+    detector.initialize()
+    # Pas de thread d'inférence : seule l'ingestion est mesurée, la file est vidée à chaque appel
+    detector.running = True
+    detector.add_source('bench')
+    return detector
+
+def case_detector_ingest():
+    detector = _detector()
+    block = _noise(BLOCK)
+
+    def run():
+        detector.process_audio(block, 'bench')
+        if detector.queue.queue:
+            detector.queue.queue.clear()
+    return run, BLOCK
+
+def case_vban_parse(data_format):
+    def factory():
+        packet = build_vban_packet('Stream1', encode_pcm(_noise(BLOCK), data_format), 48000, 1, data_format)
+
+        def run():
+            frame = parse_vban_header(packet, ('127.0.0.1', 6980), 0.0)
+            frame.mono
+        return run, BLOCK
+    return factory
+
+def case_resample(input_rate):
+    def factory():
+        resampler = PolyphaseResampler(input_rate, 16000)
+        block = _noise(BLOCK)
+
+        def run():
+            resampler.process(block)
+        return run, BLOCK
+    return factory
+
+def case_signal_analysis():
+    processor = VBANSignalProcessor(sample_rate=16000)
+    window = _noise(15600)
+
+    def run():
+        processor.analyze_signal(window)
+    return run, len(window)
+
+def case_scoring():
+    detector = _detector()
+    categories = list(zip(('Speech', 'Clapping', 'Hands', 'Finger snapping', 'Music'), (0.6, 0.2, 0.1, 0.05, 0.02)))
+
+    def run():
+        detector._handle_result(categories, 0, 'bench')
+    return run, None
+
+CASES = {
+    'circular_buffer': case_circular_buffer,
+    'detector_ingest': case_detector_ingest,
+    'vban_parse_int16': case_vban_parse(VBAN_DATATYPE_INT16),
+    'vban_parse_float32': case_vban_parse(VBAN_DATATYPE_FLOAT32),
+    'resample_48000': case_resample(48000),
+    'resample_44100': case_resample(44100),
+    'signal_analysis': case_signal_analysis,
+    'scoring': case_scoring,
+}
+
+def measure(run, samples, min_time=0.5, repeat=5):
+    """
+    Mesure un cas : temps par appel (meilleure et médiane des répétitions) puis allocations.
+
+    Returns:
+        dict: Temps en µs, appels et échantillons par seconde, pic et mémoire conservée en octets
+    """
+    run()  # Échauffement (caches, initialisations paresseuses)
+    # Nombre d'appels par répétition tel qu'une répétition dure au moins min_time / repeat
+    target = min_time / repeat
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target:
+            break
+        number = max(number * 2, int(number * target / max(elapsed, 1e-9) * 1.1))
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter() - started) / number)
+    best = min(timings)
+
+    tracemalloc.start()
+    try:
+        # Pic sur plusieurs appels : certains seulement allouent (fenêtre complète, bloc à cheval)
+        peak = 0
+        for _ in range(min(number, 64)):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            run()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        calls = min(number, 1000)
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(calls):
+            run()
+        retained = (tracemalloc.get_traced_memory()[0] - before) / calls
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'calls': number * repeat,
+        'best_us': round(best * 1e6, 3),
+        'median_us': round(statistics.median(timings) * 1e6, 3),
+        'calls_per_s': round(1 / best, 1),
+        'peak_bytes': peak,
+        'retained_bytes_per_call': round(retained, 1),
+    }
+    if samples:
+        result['samples_per_s'] = round(samples / best)
+    return result
+
+def compare(baseline, current, tolerance=0.15):
+    """
+    Compare deux rapports : un cas régresse si son meilleur temps ou son pic
+    d'allocation dépasse la référence de plus de `tolerance`.
+
+    Returns:
+        tuple: (lignes du tableau, noms des cas en régression)
+    """
+    rows = []
+    regressions = []
+    for name, result in current['results'].items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            rows.append(f"{name:<20} {result['best_us']:>10.2f} µs   (nouveau)")
+            continue
+        time_delta = result['best_us'] / reference['best_us'] - 1
+        peak_delta = (result['peak_bytes'] - reference['peak_bytes']) / max(reference['peak_bytes'], 1)
+        regressed = time_delta > tolerance or peak_delta > tolerance
+        if regressed:
+            regressions.append(name)
+        rows.append(
+            f"{name:<20} {reference['best_us']:>10.2f} → {result['best_us']:>10.2f} µs ({time_delta:+.1%})"
+            f"   pic {reference['peak_bytes']:>8} → {result['peak_bytes']:>8} o ({peak_delta:+.1%})"
+            + ("   RÉGRESSION" if regressed else "")
+        )
+    return rows, regressions
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=DATA_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks des chemins chauds de l'audio")
+    parser.add_argument('--cases', default=','.join(CASES), help="Cas à mesurer, séparés par des virgules")
+    parser.add_argument('--min-time', type=float, default=0.5, help="Durée minimale de mesure par cas (s)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=None, help="Fichier JSON de résultats")
+    parser.add_argument('--compare', default=None, help="Rapport JSON de référence (autre commit)")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Régression tolérée (0.15 = 15 %%)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.cases.split(','):
+        if name not in CASES:
+            parser.error(f"Cas inconnu: {name} (disponibles: {', '.join(CASES)})")
+        run, samples = CASES[name]()
+        results[name] = measure(run, samples, args.min_time, args.repeat)
+        print(json.dumps({name: results[name]}), flush=True)
+
+    report = {
+        'benchmark': 'hotpaths',
+        'timestamp': time.time(),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, report, args.tolerance)
+        print(f"Référence {baseline.get('commit')} → {report['commit']}")
+        print('\n'.join(rows))
+        if regressions:
+            print(f"Régressions: {', '.join(regressions)}")
+            sys.exit(1)
+    return report
+
+if __name__ == "__main__":
+    main()
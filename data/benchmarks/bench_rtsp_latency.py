@@ -0,0 +1,136 @@
+"""
+Benchmark de latence de l'ingestion ffmpeg, par profil d'ingestion.
+
+Pour chaque profil (default, low_latency) :
+- démarrage → premier échantillon : délai entre le lancement d'ffmpeg et le
+  premier bloc audio lu ;
+- "glass-to-detection" (--detect) : délai entre l'émission d'un clap par le
+  serveur de test (début de session + position du clap dans le fichier) et sa
+  détection par `AudioDetector` (YAMNet).
+
+Le flux est servi par `FileStreamServer` (AAC/ADTS via ffmpeg, rythme réel).
+
+Usage (depuis data/) :
+    python benchmarks/bench_rtsp_latency.py --trials 5 --detect --duration 12
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DATA_DIR)
+
+from ffmpeg_reader import FFmpegAudioReader, INGEST_PROFILES  # noqa: E402
+from rtsp_supervisor import RTSPStreamWorker  # noqa: E402
+from stream_test_server import FileStreamServer, write_test_wav  # noqa: E402
+
+WAV_DURATION = 10.0
+CLAP_EVERY = 2.0
+
+def _stats(values):
+    if not values:
+        return None
+    values = np.asarray(values)
+    return {
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+        'max': round(float(values.max()), 3),
+    }
+
+def measure_startup(server, profile, trials):
+    """Délais démarrage → premier échantillon, en secondes"""
+    delays = []
+    for _ in range(trials):
+        reader = FFmpegAudioReader(server.url, profile=profile, startup_timeout=15.0)
+        started = time.monotonic()
+        reader.start()
+        try:
+            if reader.read() is not None:
+                delays.append(reader.first_sample_at - started)
+        finally:
+            reader.close()
+    return delays
+
+def measure_glass_to_detection(server, profile, duration, detector):
+    """Latences clap émis → clap détecté, en secondes"""
+    detections = []
+    detector.add_source(profile, detection_callback=lambda data: detections.append(data['timestamp']))
+    worker = RTSPStreamWorker(profile, server.url, detector.process_audio, profile=profile)
+    sessions = len(server.session_starts)
+    worker.start()
+    try:
+        time.sleep(duration)
+    finally:
+        worker.stop()
+        detector.remove_source(profile)
+
+    session_start = server.session_starts[sessions]
+    offsets = np.arange(1.0, WAV_DURATION - 0.5, CLAP_EVERY)
+    claps = [
+        session_start + loop * WAV_DURATION + offset
+        for loop in range(int(duration // WAV_DURATION) + 1)
+        for offset in offsets
+        if loop * WAV_DURATION + offset < duration - 2.0
+    ]
+    latencies = []
+    for clap in claps:
+        matches = [t - clap for t in detections if 0 <= t - clap < CLAP_EVERY - 0.5]
+        if matches:
+            latencies.append(min(matches))
+    return latencies, len(claps)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latence de l'ingestion ffmpeg par profil")
+    parser.add_argument('--profiles', default=','.join(INGEST_PROFILES))
+    parser.add_argument('--trials', type=int, default=5, help="Mesures de démarrage par profil")
+    parser.add_argument('--detect', action='store_true', help="Mesurer aussi la latence clap → détection (YAMNet)")
+    parser.add_argument('--duration', type=float, default=12.0, help="Durée de la mesure de détection (s)")
+    parser.add_argument('--output', default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args(argv)
+
+    wav = write_test_wav(
+        os.path.join(tempfile.mkdtemp(prefix='claptrap-bench-'), 'stream.wav'),
+        duration=WAV_DURATION, clap_every=CLAP_EVERY
+    )
+
+    detector = None
+    if args.detect:
+        from audio_detector import AudioDetector
+        detector = AudioDetector(os.path.join(DATA_DIR, 'yamnet.tflite'))
+        detector.initialize()
+        detector.start()
+
+    results = {}
+    with FileStreamServer(wav) as server:
+        for profile in args.profiles.split(','):
+            result = {'startup_to_first_sample_s': _stats(measure_startup(server, profile, args.trials))}
+            if detector is not None:
+                latencies, claps = measure_glass_to_detection(server, profile, args.duration, detector)
+                result['claps'] = claps
+                result['detected'] = len(latencies)
+                result['glass_to_detection_s'] = _stats(latencies)
+            results[profile] = result
+            print(json.dumps({profile: result}), flush=True)
+
+    if detector is not None:
+        detector.stop()
+
+    report = {
+        'benchmark': 'rtsp_latency',
+        'timestamp': time.time(),
+        'config': vars(args),
+        'profiles': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    return report
+
+if __name__ == "__main__":
+    main()
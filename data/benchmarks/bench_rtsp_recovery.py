@@ -0,0 +1,101 @@
+"""
+Benchmark de reprise après blocage d'un flux.
+
+Diffuse un fichier WAV via `FileStreamServer` (ffmpeg local), le lit avec un
+`RTSPStreamWorker`, gèle la session en cours et mesure :
+détection du blocage, puis délai jusqu'au retour de l'audio (respawn d'ffmpeg).
+
+Usage (depuis data/) :
+    python benchmarks/bench_rtsp_recovery.py --trials 5 --stall-timeout 2
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DATA_DIR)
+
+from rtsp_supervisor import RTSPStreamWorker  # noqa: E402
+from stream_test_server import FileStreamServer, write_test_wav  # noqa: E402
+
+def _wait(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+def run_trial(server, args):
+    arrivals = []
+    worker = RTSPStreamWorker(
+        'bench', server.url, lambda data, source: arrivals.append(time.monotonic()),
+        initial_backoff=args.backoff, stall_timeout=args.stall_timeout
+    )
+    started = time.monotonic()
+    worker.start()
+    try:
+        if not _wait(lambda: arrivals, args.startup_timeout):
+            return {'error': "aucun échantillon reçu au démarrage"}
+        first_sample = arrivals[0] - started
+        time.sleep(args.warmup)
+
+        server.stall()
+        stalled_at = time.monotonic()
+        _wait(lambda: worker.stalls > 0, args.stall_timeout + 10)
+        detected_at = time.monotonic()
+        count = len(arrivals)
+        # Le retour de l'audio se mesure sur le premier bloc de la nouvelle session
+        recovered = _wait(lambda: worker.restarts > 0 and len(arrivals) > count, args.recover_timeout)
+        return {
+            'startup_to_first_sample_s': round(first_sample, 3),
+            'stall_detection_s': round(detected_at - stalled_at, 3),
+            'time_to_recover_s': round(arrivals[count] - stalled_at, 3) if recovered else None,
+            'restarts': worker.restarts,
+        }
+    finally:
+        worker.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de reprise après blocage d'un flux ffmpeg")
+    parser.add_argument('--wav', default=None, help="Fichier diffusé (WAV synthétique par défaut)")
+    parser.add_argument('--trials', type=int, default=3)
+    parser.add_argument('--stall-timeout', type=float, default=3.0)
+    parser.add_argument('--backoff', type=float, default=1.0, help="Délai initial avant relance (s)")
+    parser.add_argument('--startup-timeout', type=float, default=15.0)
+    parser.add_argument('--recover-timeout', type=float, default=30.0)
+    parser.add_argument('--warmup', type=float, default=1.0, help="Lecture normale avant le blocage (s)")
+    parser.add_argument('--output', default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args(argv)
+
+    wav = args.wav or write_test_wav(os.path.join(tempfile.mkdtemp(prefix='claptrap-bench-'), 'stream.wav'))
+    trials = []
+    with FileStreamServer(wav) as server:
+        for _ in range(args.trials):
+            trial = run_trial(server, args)
+            trials.append(trial)
+            print(json.dumps(trial), flush=True)
+
+    recover = [t['time_to_recover_s'] for t in trials if t.get('time_to_recover_s') is not None]
+    report = {
+        'benchmark': 'rtsp_recovery',
+        'timestamp': time.time(),
+        'config': vars(args),
+        'recovered': len(recover),
+        'mean_time_to_recover_s': round(float(np.mean(recover)), 3) if recover else None,
+        'max_time_to_recover_s': round(float(np.max(recover)), 3) if recover else None,
+        'trials': trials,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    print(json.dumps({k: report[k] for k in ('recovered', 'mean_time_to_recover_s', 'max_time_to_recover_s')}))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark de débit de l'ingestion VBAN.
+
+Monte en charge le nombre de flux VBAN synthétiques envoyés à un `VBANDetector`
+(et optionnellement à un `AudioDetector` partagé) et mesure, pour chaque palier :
+perte de paquets, CPU par flux, blocs audio livrés et rappel de détection des
+claps injectés.
+
+Usage (depuis data/) :
+    python benchmarks/bench_vban_ingest.py --streams 1,2,4,8 --duration 10 --detect
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import psutil
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DATA_DIR)
+
+from vban_detector_new import VBANDetector  # noqa: E402
+from vban_loadgen import VBANLoadGenerator, make_streams  # noqa: E402
+
+def _generator_worker(specs, port, duration, results):
+    generator = VBANLoadGenerator(specs, port=port)
+    result = generator.run(duration)
+    result['clap_events'] = generator.clap_events
+    results.put(result)
+
+def match_detections(clap_events, detections, tolerance):
+    """
+    Associe chaque clap injecté à la première détection de son flux dans la fenêtre de tolérance.
+
+    Returns:
+        tuple: (claps détectés, latences en secondes)
+    """
+    remaining = sorted(detections)
+    latencies = []
+    for stream, sent_at in sorted(clap_events, key=lambda event: event[1]):
+        for index, (detected_at, source) in enumerate(remaining):
+            if source == stream and sent_at <= detected_at <= sent_at + tolerance:
+                latencies.append(detected_at - sent_at)
+                del remaining[index]
+                break
+    return len(latencies), latencies
+
+def run_level(n_streams, args, audio_detector=None):
+    clap_times = [t for t in _frange(1.0, args.duration - 1.5, args.clap_every)] if args.clap_every else []
+    specs = make_streams(
+        n_streams, args.sample_rate, args.channels, args.format,
+        args.samples_per_frame, clap_times, args.clap_wav
+    )
+
+    detector = VBANDetector(port=0)
+    chunks = {spec.name: 0 for spec in specs}
+    detections = []
+
+    def make_counter(name):
+        def on_chunk(audio_data, timestamp):
+            chunks[name] += 1
+            if audio_detector is not None:
+                audio_detector.process_audio(audio_data, name)
+        return on_chunk
+
+    for spec in specs:
+        detector.add_callback(make_counter(spec.name), stream=('127.0.0.1', spec.name))
+        if audio_detector is not None:
+            audio_detector.add_source(
+                spec.name,
+                detection_callback=lambda data: detections.append((time.time(), data['source_id']))
+            )
+    detector.start_listening()
+
+    process = psutil.Process()
+    cpu_before = sum(process.cpu_times()[:2])
+    results = multiprocessing.Queue()
+    worker = multiprocessing.Process(
+        target=_generator_worker, args=(specs, detector.port, args.duration, results)
+    )
+    worker.start()
+    generated = results.get(timeout=args.duration + 30)
+    worker.join()
+    time.sleep(args.drain)
+    cpu_seconds = sum(process.cpu_times()[:2]) - cpu_before
+
+    stats = detector.stream_stats.snapshot()
+    detector.stop_listening()
+    if audio_detector is not None:
+        for spec in specs:
+            audio_detector.remove_source(spec.name)
+
+    sent = sum(generated['sent_packets'].values())
+    received = sum(stats.get(('127.0.0.1', spec.name), {}).get('packets', 0) for spec in specs)
+    loss = 1.0 - received / sent if sent else 0.0
+    expected_chunks = int(args.duration) * n_streams
+    level = {
+        'streams': n_streams,
+        'sent_packets': sent,
+        'received_packets': received,
+        'packet_loss': round(loss, 5),
+        'cpu_percent_total': round(100.0 * cpu_seconds / args.duration, 2),
+        'cpu_percent_per_stream': round(100.0 * cpu_seconds / args.duration / n_streams, 3),
+        'chunks_delivered': sum(chunks.values()),
+        'chunks_expected': expected_chunks,
+        'generator_max_lag_ms': round(generated['max_send_lag'] * 1000, 2),
+    }
+    if audio_detector is not None and generated['clap_events']:
+        hits, latencies = match_detections(generated['clap_events'], detections, args.tolerance)
+        level['claps_injected'] = len(generated['clap_events'])
+        level['claps_detected'] = hits
+        level['recall'] = round(hits / len(generated['clap_events']), 3)
+        level['false_positives'] = len(detections) - hits
+        level['mean_detection_latency_ms'] = round(1000 * sum(latencies) / len(latencies), 1) if latencies else None
+    level['sustained'] = (
+        loss <= args.max_loss
+        and level['chunks_delivered'] >= expected_chunks - n_streams
+        and generated['max_send_lag'] < 0.1
+    )
+    return level
+
+def _frange(start, stop, step):
+    value = start
+    while value < stop:
+        yield round(value, 3)
+        value += step
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de débit de l'ingestion VBAN")
+    parser.add_argument('--streams', default='1,2,4,8,16', help="Paliers de nombre de flux")
+    parser.add_argument('--duration', type=float, default=10.0, help="Durée de chaque palier en secondes")
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--format', type=int, default=1, help="Format VBAN (1 = INT16, 4 = FLOAT32...)")
+    parser.add_argument('--samples-per-frame', type=int, default=256)
+    parser.add_argument('--clap-every', type=float, default=2.0)
+    parser.add_argument('--clap-wav', default=None)
+    parser.add_argument('--detect', action='store_true', help="Faire passer l'audio par AudioDetector (YAMNet)")
+    parser.add_argument('--tolerance', type=float, default=2.5, help="Fenêtre d'appariement clap/détection (s)")
+    parser.add_argument('--max-loss', type=float, default=0.01)
+    parser.add_argument('--drain', type=float, default=1.5, help="Attente après émission (s)")
+    parser.add_argument('--output', default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    if args.clap_wav:
+        args.clap_wav = os.path.abspath(args.clap_wav)
+
+    audio_detector = None
+    if args.detect:
+        from audio_detector import AudioDetector
+        audio_detector = AudioDetector(os.path.join(DATA_DIR, 'yamnet.tflite'))
+        audio_detector.initialize()
+        audio_detector.start()
+
+    # Travailler hors de data/ : sans settings.json, tous les flux sont acceptés
+    os.chdir(tempfile.mkdtemp(prefix='claptrap-bench-'))
+
+    levels = []
+    for n_streams in [int(n) for n in args.streams.split(',')]:
+        level = run_level(n_streams, args, audio_detector)
+        levels.append(level)
+        print(json.dumps(level), flush=True)
+        if not level['sustained']:
+            break
+
+    if audio_detector is not None:
+        audio_detector.stop()
+
+    sustained = [level['streams'] for level in levels if level['sustained']]
+    report = {
+        'benchmark': 'vban_ingest',
+        'timestamp': time.time(),
+        'cpu_count': os.cpu_count(),
+        'config': vars(args),
+        'max_sustained_streams': max(sustained) if sustained else 0,
+        'levels': levels,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    print(json.dumps({'max_sustained_streams': report['max_sustained_streams']}))
+    return report
+
+if __name__ == "__main__":
+    main()
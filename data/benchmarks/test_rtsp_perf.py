@@ -0,0 +1,210 @@
+"""
+Benchmarks pytest de la chaîne RTSP, sans caméra : les fichiers WAV de test
+sont servis en RTSP par MediaMTX (configuration fournie) si son binaire est
+disponible, sinon par le serveur de substitution `RTSPTestServer`.
+
+Mesures et budgets (échec du test en cas de régression) :
+- latence clap émis → clap détecté (YAMNet) ;
+- délai de reconnexion après coupure du flux ;
+- CPU par flux, par backend de décodage.
+
+Désactivés par défaut (durée, sensibilité à la charge de la machine) :
+    CLAPTRAP_BENCH=1 python -m pytest -q benchmarks/
+Résultats JSON dans le fichier $CLAPTRAP_BENCH_OUTPUT s'il est défini.
+"""
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import psutil
+import pytest
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DATA_DIR)
+
+from pyav_reader import pyav_available  # noqa: E402
+from rtsp_supervisor import RTSPStreamWorker  # noqa: E402
+from stream_test_server import rtsp_test_server, write_test_wav  # noqa: E402
+
+pytestmark = [
+    pytest.mark.skipif(not os.environ.get('CLAPTRAP_BENCH'), reason="CLAPTRAP_BENCH non défini"),
+    pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg non installé"),
+]
+
+WAV_DURATION = 10.0
+CLAP_EVERY = 2.0
+
+# Budgets : large marge au-dessus des mesures de référence (1 cœur : ~0,25 s, ~0,5 s, <1 %)
+LATENCY_P95_BUDGET_S = 1.5
+RECONNECT_BUDGET_S = 3.0
+CPU_PER_STREAM_BUDGET = 10.0  # % d'un cœur
+
+RESULTS = {}
+
+@pytest.fixture(scope='module', autouse=True)
+def report():
+    yield RESULTS
+    if os.environ.get('CLAPTRAP_BENCH_OUTPUT'):
+        with open(os.environ['CLAPTRAP_BENCH_OUTPUT'], 'w') as f:
+            json.dump({'benchmark': 'rtsp_perf', 'timestamp': time.time(), 'results': RESULTS}, f, indent=4)
+
+@pytest.fixture(scope='module')
+def wav_file(tmp_path_factory):
+    return write_test_wav(
+        str(tmp_path_factory.mktemp('audio') / 'stream.wav'), duration=WAV_DURATION, clap_every=CLAP_EVERY
+    )
+
+@pytest.fixture
+def server(wav_file):
+    with rtsp_test_server(wav_file) as server:
+        yield server
+
+def _wait(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+def test_rtsp_detection_latency(server):
+    pytest.importorskip('mediapipe')
+    from audio_detector import AudioDetector
+
+    detector = AudioDetector(os.path.join(DATA_DIR, 'yamnet.tflite'))
+    detector.initialize()
+    detector.start()
+    detections = []
+    arrivals = []
+    detector.add_source('cam', detection_callback=lambda data: detections.append(data['timestamp']))
+
+    def on_audio(data, source_id):
+        if not arrivals:
+            arrivals.append(time.time())
+        detector.process_audio(data, source_id)
+
+    worker = RTSPStreamWorker('cam', server.url, on_audio)
+    worker.start()
+    try:
+        time.sleep(16.0)
+    finally:
+        worker.stop()
+        detector.stop()
+    assert arrivals, "aucun échantillon reçu"
+
+    # Claps émis (position dans le fichier depuis le début de la diffusion) après l'arrivée du premier bloc
+    origin, end = server.session_starts[-1], time.time()
+    offsets = np.arange(1.0, WAV_DURATION - 0.5, CLAP_EVERY)
+    claps = [
+        origin + loop * WAV_DURATION + offset
+        for loop in range(int((end - origin) // WAV_DURATION) + 1)
+        for offset in offsets
+        if arrivals[0] <= origin + loop * WAV_DURATION + offset < end - 2.0
+    ]
+    latencies = []
+    for clap in claps:
+        matches = [t - clap for t in detections if 0 <= t - clap < CLAP_EVERY - 0.5]
+        if matches:
+            latencies.append(min(matches))
+    RESULTS['detection_latency'] = {
+        'claps': len(claps),
+        'detected': len(latencies),
+        'p50_s': round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        'p95_s': round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+    }
+    assert len(latencies) >= 0.8 * len(claps)
+    assert RESULTS['detection_latency']['p95_s'] < LATENCY_P95_BUDGET_S
+
+def test_rtsp_reconnect_time(server):
+    arrivals = []
+    worker = RTSPStreamWorker(
+        'cam', server.url, lambda data, source_id: arrivals.append(time.monotonic()), initial_backoff=0.1
+    )
+    worker.start()
+    delays = []
+    try:
+        assert _wait(lambda: arrivals, 10.0), "aucun échantillon reçu"
+        for trial in range(3):
+            time.sleep(1.0)
+            dropped_at = time.monotonic()
+            server.drop()
+            assert _wait(lambda: worker.restarts > trial, 10.0)
+            count = len(arrivals)
+            assert _wait(lambda: len(arrivals) > count, 10.0)
+            delays.append(arrivals[count] - dropped_at)
+    finally:
+        worker.stop()
+    RESULTS['reconnect'] = {'delays_s': [round(d, 3) for d in delays], 'max_s': round(max(delays), 3)}
+    assert max(delays) < RECONNECT_BUDGET_S
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def _port_open(port):
+    try:
+        socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+        return True
+    except OSError:
+        return False
+
+@pytest.mark.parametrize('backend', ['ffmpeg', 'pyav'])
+def test_rtsp_cpu_per_stream(wav_file, backend):
+    if backend == 'pyav' and not pyav_available():
+        pytest.skip("PyAV non installé")
+    streams = 4
+    # Serveur dans un processus séparé : seule la lecture est mesurée
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(DATA_DIR, 'stream_test_server.py'), wav_file, '--rtsp', '--port', str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"rtsp://127.0.0.1:{port}/mic"
+    received = {}
+    workers = [
+        RTSPStreamWorker(
+            f"cam{i}", url, lambda data, source_id: received.__setitem__(source_id, received.get(source_id, 0) + len(data)),
+            backend=backend
+        )
+        for i in range(streams)
+    ]
+    try:
+        assert _wait(lambda: _port_open(port), 10.0)
+        for worker in workers:
+            worker.start()
+        assert _wait(lambda: len(received) == streams, 10.0)
+        time.sleep(1.0)
+
+        me = psutil.Process()
+        served = {server.pid} | {process.pid for process in psutil.Process(server.pid).children(recursive=True)}
+        readers = [process for process in me.children(recursive=True) if process.pid not in served]
+
+        def cpu_time():
+            total = sum(me.cpu_times()[:2])
+            for process in readers:
+                try:
+                    total += sum(process.cpu_times()[:2])
+                except psutil.Error:
+                    pass
+            return total
+
+        before, started = cpu_time(), time.monotonic()
+        time.sleep(5.0)
+        cpu_percent = 100.0 * (cpu_time() - before) / (time.monotonic() - started)
+    finally:
+        for worker in workers:
+            worker.stop()
+        server.terminate()
+        server.wait()
+    RESULTS[f"cpu_{backend}"] = {
+        'streams': streams,
+        'cpu_percent': round(cpu_percent, 1),
+        'cpu_percent_per_stream': round(cpu_percent / streams, 2),
+    }
+    assert cpu_percent / streams < CPU_PER_STREAM_BUDGET
@@ -0,0 +1,150 @@
+"""
+Classificateurs audio interchangeables.
+
+Un classificateur reçoit une fenêtre mono float32 et renvoie les scores de
+ses labels, `[(label, score), ...]`. Deux backends :
+- `mediapipe` : YAMNet via MediaPipe (production) ;
+- `stub` : classificateur déterministe sans modèle, pour les tests et les
+  benchmarks. Les scores sont scriptés par des marqueurs insérés dans l'audio
+  (`embed_marker`), avec une latence simulée réglable.
+"""
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+CLASSIFIER_BACKENDS = ('mediapipe', 'stub')
+
+# Marqueur : MARKER_RUN échantillons consécutifs égaux à code / MARKER_SCALE (code de 1 à MARKER_SCALE - 1).
+# La valeur tient sur une grille de 1/256, conservée par le float32 et le PCM 16/24/32 bits ; un
+# rééchantillonnage ou un codec avec perte l'efface.
+MARKER_RUN = 32
+MARKER_SCALE = 256
+# Scores par défaut du classificateur factice : code de marqueur → scores des labels
+DEFAULT_SCRIPT = {
+    1: {'Clapping': 0.9, 'Hands': 0.6},
+    2: {'Finger snapping': 0.8},
+    3: {'Speech': 0.9},
+}
+
+class Classifier(ABC):
+    """Interface d'un classificateur de fenêtres audio"""
+
+    @abstractmethod
+    def classify(self, samples, sample_rate):
+        """
+        Args:
+            samples (np.ndarray): Fenêtre mono float32
+            sample_rate (int): Fréquence d'échantillonnage de la fenêtre
+
+        Returns:
+            list: Paires (label, score), par score décroissant
+        """
+
+    def close(self):
+        pass
+
+class MediaPipeClassifier(Classifier):
+    """YAMNet via MediaPipe en mode clips : chaque fenêtre est classée indépendamment"""
+
+    def __init__(self, model_path, max_results=5, score_threshold=0.3):
+        from mediapipe.tasks import python
+        from mediapipe.tasks.python import audio
+        from mediapipe.tasks.python.components import containers
+        self._containers = containers
+        options = audio.AudioClassifierOptions(
+            base_options=python.BaseOptions(model_asset_path=model_path),
+            running_mode=audio.RunningMode.AUDIO_CLIPS,
+            max_results=max_results,
+            score_threshold=score_threshold
+        )
+        self._classifier = audio.AudioClassifier.create_from_options(options)
+
+    def classify(self, samples, sample_rate):
+        results = self._classifier.classify(self._containers.AudioData.create_from_array(samples, sample_rate))
+        if not results or not results[0].classifications:
+            return []
+        return [
+            (category.category_name, float(category.score))
+            for category in results[0].classifications[0].categories
+        ]
+
+    def close(self):
+        self._classifier.close()
+
+class StubClassifier(Classifier):
+    """
+    Classificateur factice et déterministe.
+
+    Une fenêtre qui contient un marqueur reçoit les scores scriptés pour son
+    code (le maximum par label si elle en contient plusieurs) ; sans marqueur,
+    elle reçoit les scores `default`. Chaque appel attend `latency` secondes,
+    pour simuler le temps d'inférence.
+    """
+
+    def __init__(self, script=None, default=None, latency=0.0, max_results=5, score_threshold=0.3, **options):
+        if options:
+            raise ValueError(f"Option(s) inconnue(s) pour le classificateur stub: {', '.join(options)}")
+        script = DEFAULT_SCRIPT if script is None else script
+        # Les clés d'un script lu en JSON sont des chaînes
+        self.script = {int(code): dict(scores) for code, scores in script.items()}
+        self.default = dict(default or {})
+        self.latency = float(latency)
+        # Négatif ou None : toutes les catégories (comme max_results=-1 pour MediaPipe)
+        self.max_results = None if max_results is None or int(max_results) < 0 else int(max_results)
+        self.score_threshold = float(score_threshold)
+        self.calls = 0
+
+    def classify(self, samples, sample_rate):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        scores = dict(self.default)
+        for code in find_markers(samples):
+            for label, score in self.script.get(code, {}).items():
+                scores[label] = max(score, scores.get(label, 0.0))
+        categories = sorted(
+            ((label, float(score)) for label, score in scores.items() if score >= self.score_threshold),
+            key=lambda category: category[1], reverse=True
+        )
+        return categories if self.max_results is None else categories[:self.max_results]
+
+def embed_marker(samples, code, position=0):
+    """Insère le marqueur `code` dans `samples` (sur place) à partir de `position` ; renvoie `samples`"""
+    if not 1 <= code < MARKER_SCALE:
+        raise ValueError(f"Code de marqueur hors limites: {code} (1 à {MARKER_SCALE - 1})")
+    samples[position:position + MARKER_RUN] = code / MARKER_SCALE
+    return samples
+
+def find_markers(samples):
+    """Codes des marqueurs présents dans une fenêtre, dans l'ordre d'apparition"""
+    scaled = np.asarray(samples, dtype=np.float32).reshape(-1) * MARKER_SCALE
+    codes = np.rint(scaled)
+    # Valeurs sur la grille du marqueur (tolérance de quantification PCM 16 bits), hors zéro
+    codes[(np.abs(scaled - codes) > 0.02) | (codes < 1)] = 0
+    if not codes.any():
+        return []
+    # Plages de valeurs identiques : début de chaque plage et longueur
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    lengths = np.diff(np.append(starts, len(codes)))
+    found = (codes[starts] > 0) & (lengths >= MARKER_RUN)
+    return [int(code) for code in codes[starts[found]]]
+
+def create_classifier(backend='mediapipe', model_path=None, max_results=5, score_threshold=0.3, **options):
+    """
+    Instancie un classificateur.
+
+    Args:
+        backend (str): 'mediapipe' ou 'stub'
+        options: Options propres au backend (`script`, `default`, `latency` pour le stub)
+
+    Raises:
+        ValueError: Backend ou options inconnus
+    """
+    if backend == 'stub':
+        return StubClassifier(max_results=max_results, score_threshold=score_threshold, **options)
+    if backend == 'mediapipe':
+        if options:
+            raise ValueError(f"Option(s) inconnue(s) pour le classificateur mediapipe: {', '.join(options)}")
+        return MediaPipeClassifier(model_path, max_results, score_threshold)
+    raise ValueError(f"Backend de classification inconnu: {backend} ({', '.join(CLASSIFIER_BACKENDS)})")
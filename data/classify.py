@@ -18,9 +18,13 @@ import cv2
 import sys
 from events import send_clap_event, send_labels
 import threading
-from vban_manager import get_vban_detector  # Import the get_vban_detector function
+from vban_manager import get_vban_detector, invalidate_vban_settings  # Import the get_vban_detector function
 import warnings
 from audio_detector import AudioDetector
+from classifiers import CLASSIFIER_BACKENDS
+from pipeline import DetectionPipeline, MicrophoneSource, build_sources
+from stage_graph import StageGraph
+from latency_trace import get_tracer
 
 # Configuration du logging en DEBUG
 logging.basicConfig(
@@ -38,9 +42,15 @@ detection_running = False
 classifier = None
 record = None
 model = "yamnet.tflite"
+# Délai maximal d'un webhook : il est envoyé depuis le thread d'inférence partagé par toutes les sources
+WEBHOOK_TIMEOUT = 5
 output_file = "recorded_audio.wav"
 current_audio_source = None
 _socketio = None  # Renamed to _socketio to avoid conflict with parameter
+pipeline = None  # Pipeline de détection en cours (toutes les sources)
+_default_webhook_url = None  # Webhook des sources qui n'en ont pas
+# Résultats des webhooks par source ({'success', 'failure'}), écrits par le seul thread d'inférence
+webhook_results = collections.defaultdict(lambda: {'success': 0, 'failure': 0})
 
 def reload_settings():
     """Recharge les paramètres depuis le fichier settings.json"""
@@ -119,42 +129,6 @@ def save_audio_to_wav(audio_data, sample_rate, filename):
     except Exception as e:
         logging.error(f"Failed to save audio to {filename}: {e}")
 
-def read_audio_from_rtsp(rtsp_url, buffer_size):
-    """Lit un flux RTSP audio en continu sans buffer fichier"""
-    try:
-        # Configuration du processus ffmpeg pour lire le flux RTSP
-        process = (
-            ffmpeg
-            .input(rtsp_url)
-            .output('pipe:', 
-                   format='f32le',  # Format PCM 32-bit float
-                   acodec='pcm_f32le', 
-                   ac=1,  # Mono
-                   ar='16000',
-                   buffer_size='64k'  # Réduire la taille du buffer
-            )
-            .run_async(pipe_stdout=True, pipe_stderr=True)
-        )
-
-        while True:
-            # Lecture des données audio par blocs
-            in_bytes = process.stdout.read(buffer_size * 4)  # 4 bytes par sample float32
-            if not in_bytes:
-                break
-                
-            # Conversion en numpy array
-            audio_chunk = np.frombuffer(in_bytes, np.float32)
-            
-            if len(audio_chunk) > 0:
-                yield audio_chunk.reshape(-1, 1)
-            
-    except Exception as e:
-        logging.error(f"Erreur lors de la lecture RTSP: {e}")
-        yield None
-    finally:
-        if process:
-            process.kill()
-
 def start_detection(
     model,
     max_results,
@@ -163,46 +137,45 @@ def start_detection(
     socketio: SocketIO,
     webhook_url: str,
     delay: float,
-    audio_source: str,
+    audio_source: str = None,
     rtsp_url: str = None,
+    rtsp_sources: list = None,
 ):
-    global detection_running, classifier, record, current_audio_source, _socketio
+    """
+    Démarre la détection sur toutes les sources activées de settings.json
+    (micros, flux RTSP, sources VBAN), en même temps, avec un seul moteur d'inférence.
+
+    `rtsp_sources`/`rtsp_url` ne servent que si settings.json n'active aucune source.
+    """
+    global detection_running, classifier, record, current_audio_source, _socketio, _default_webhook_url
     
     try:
         if detection_running:
             return False
 
-        # Recharger les paramètres pour avoir les dernières modifications
-        settings = reload_settings()
-        if settings:
-            microphone_settings = settings.get('microphone', {})
-            if isinstance(microphone_settings, dict) and microphone_settings.get('enabled', False):
-                # Utiliser les paramètres du microphone les plus récents
-                audio_source = microphone_settings.get('audio_source')
-                logging.info(f"Utilisation du microphone: {audio_source}")
-
-        detection_running = True
-        current_audio_source = audio_source
-        _socketio = socketio  # Store the socketio instance globally
-
         if (overlapping_factor <= 0) or (overlapping_factor >= 1.0):
             raise ValueError("Overlapping factor must be between 0 and 1.")
 
         if (score_threshold < 0) or (score_threshold > 1.0):
             raise ValueError("Score threshold must be between (inclusive) 0 et 1.")
 
+        # Recharger les paramètres pour avoir les dernières modifications
+        sources = build_sources(reload_settings(), webhook_url)
+        if not sources and (rtsp_sources or rtsp_url):
+            sources = build_sources({'rtsp_sources': [
+                {**source, 'enabled': True} for source in (rtsp_sources or [{'url': rtsp_url}])
+            ]}, webhook_url)
+        if not sources:
+            logging.error("Aucune source audio n'est configurée ou active")
+            return False
+
+        detection_running = True
+        current_audio_source = audio_source
+        _socketio = socketio  # Store the socketio instance globally
+        _default_webhook_url = webhook_url
+
         # Démarrer la détection dans un thread séparé
-        detection_thread = threading.Thread(target=run_detection, args=(
-            model,
-            max_results,
-            score_threshold,
-            overlapping_factor,
-            socketio,
-            webhook_url,
-            delay,
-            audio_source,
-            rtsp_url
-        ))
+        detection_thread = threading.Thread(target=run_detection, args=(model, socketio, sources))
         detection_thread.daemon = True
         detection_thread.start()
         
@@ -213,15 +186,53 @@ def start_detection(
         detection_running = False
         return False
 
-def run_detection(model, max_results, score_threshold, overlapping_factor, socketio, webhook_url, delay, audio_source, rtsp_url):
-    """Fonction qui exécute la détection dans un thread séparé"""
+def detection_rules(settings):
+    """
+    Règles de détection du moteur par défaut (`detection_rules` de settings.json) :
+    mêmes options que l'étape `rules` du graphe, pour appliquer les valeurs de threshold_sweep.py.
+    """
+    rules = (settings or {}).get('detection_rules') or {}
+    return {
+        'threshold': float(rules.get('threshold', 0.3)),
+        'delay': float(rules.get('delay', 1.0)),
+        'weights': rules.get('weights'),
+    }
+
+def run_detection(model, socketio, sources):
+    """Fonction qui exécute la détection de toutes les sources dans un thread séparé"""
+    global pipeline
     try:
-        # Initialiser le détecteur audio
-        detector = AudioDetector(model, sample_rate=16000, buffer_duration=1.0)
-        detector.initialize()
+        # Moteur partagé par toutes les sources : graphe d'étapes s'il est décrit dans les paramètres
+        settings = reload_settings() or {}
+        # Traces des détections en JSONL si un fichier est configuré
+        get_tracer().set_trace_file(settings.get('latency_trace_file'))
+        detector = None
+        graph_settings = settings.get('pipeline_graph')
+        if graph_settings and graph_settings.get('stages'):
+            try:
+                detector = StageGraph.from_settings(graph_settings, model_path=model)
+            except ValueError as e:
+                logging.error(f"Graphe de traitement invalide, moteur par défaut utilisé: {e}")
+        if detector is None:
+            backend = settings.get('classifier_backend') or 'mediapipe'
+            if backend not in CLASSIFIER_BACKENDS:
+                logging.error(f"Backend de classification inconnu, mediapipe utilisé: {backend}")
+                backend = 'mediapipe'
+            elif backend == 'stub':
+                logging.warning("Classificateur factice (stub) : seuls les marqueurs insérés dans l'audio sont détectés")
+            detector = AudioDetector(
+                model, sample_rate=16000, buffer_duration=1.0,
+                classifier_backend=backend, classifier_options=settings.get('classifier_options'),
+                **detection_rules(settings)
+            )
+            detector.initialize()
         
-        def create_detection_callback(source_name, webhook_url=None):
+        def create_detection_callback(source):
+            source_name = source.source_id
+
             def handle_detection(detection_data):
+                # Trace de latence de la fenêtre : horodater l'émission et le webhook
+                trace = detection_data.get('trace')
                 try:
                     logging.info(f"CLAP détecté sur {source_name} avec score {detection_data['score']}")
                     if socketio:
@@ -230,11 +241,21 @@ def run_detection(model, max_results, score_threshold, overlapping_factor, socke
                             'timestamp': detection_data['timestamp'],
                             'score': detection_data['score']
                         })
+                        if trace is not None:
+                            trace['emitted'] = time.time()
                     
-                    # Utiliser le webhook_url passé au callback
+                    # Webhook lu à chaque détection : une modification s'applique sans redémarrer la source
+                    webhook_url = source.webhook_url
                     if webhook_url:
                         logging.info(f"Envoi webhook pour {source_name} vers {webhook_url}")
-                        requests.post(webhook_url)
+                        try:
+                            response = requests.post(webhook_url, timeout=WEBHOOK_TIMEOUT)
+                        except Exception:
+                            webhook_results[source_name]['failure'] += 1
+                            raise
+                        webhook_results[source_name]['success' if response.ok else 'failure'] += 1
+                        if trace is not None:
+                            trace.update(webhook_done=time.time(), webhook_status=response.status_code)
                 except Exception as e:
                     logging.error(f"Erreur lors de l'envoi de l'événement clap pour {source_name}: {str(e)}")
             return handle_detection
@@ -245,128 +266,22 @@ def run_detection(model, max_results, score_threshold, overlapping_factor, socke
                 if socketio:
                     socketio.emit("labels", {"source": source_name, "detected": labels})
             return handle_labels
-        
-        # Vérifier si une source audio est configurée
-        if not audio_source:
-            logging.error("Aucune source audio n'est configurée ou active")
-            return
-            
-        # Initialiser la source audio en fonction du paramètre audio_source
-        if audio_source.startswith("rtsp"):
-            if not rtsp_url:
-                raise ValueError("RTSP URL must be provided for RTSP audio source.")
-                
-            source_id = f"rtsp_{rtsp_url}"
-            
-            # Récupérer le webhook_url depuis les paramètres RTSP
-            settings = reload_settings()
-            rtsp_webhook_url = None
-            if settings and 'rtsp_sources' in settings:
-                for source in settings['rtsp_sources']:
-                    if source.get('url') == rtsp_url and source.get('enabled', True):
-                        rtsp_webhook_url = source.get('webhook_url')
-                        break
-            
-            # Utiliser le webhook spécifique à la source RTSP s'il existe, sinon utiliser celui par défaut
-            webhook_url_to_use = rtsp_webhook_url or webhook_url
-            
-            detector.add_source(
-                source_id=source_id,
-                detection_callback=create_detection_callback(source_id, webhook_url_to_use),
-                labels_callback=create_labels_callback(source_id)
-            )
-            
-            # Démarrer la détection
-            detector.start()
-            logging.info(f"Détection démarrée pour la source RTSP {source_id}")
-            
-            rtsp_reader = read_audio_from_rtsp(rtsp_url, int(16000 * 0.1))  # Buffer de 100ms
-            while detection_running:
-                audio_data = next(rtsp_reader)
-                detector.process_audio(audio_data, source_id)
-                
-        elif audio_source.startswith("vban://"):
-            vban_ip = audio_source.replace("vban://", "")
-            source_id = f"vban_{vban_ip}"
-            
-            # Récupérer le webhook_url depuis les paramètres VBAN
-            settings = reload_settings()
-            vban_webhook_url = None
-            if settings and 'saved_vban_sources' in settings:
-                for source in settings['saved_vban_sources']:
-                    if source.get('ip') == vban_ip and source.get('enabled', True):
-                        vban_webhook_url = source.get('webhook_url')
-                        break
-            
-            # Utiliser le webhook spécifique à la source VBAN s'il existe, sinon utiliser celui par défaut
-            webhook_url_to_use = vban_webhook_url or webhook_url
-            
-            detector.add_source(
-                source_id=source_id,
-                detection_callback=create_detection_callback(source_id, webhook_url_to_use),
-                labels_callback=create_labels_callback(source_id)
-            )
-            
-            # Démarrer la détection
-            detector.start()
-            logging.info(f"Détection démarrée pour la source VBAN {source_id} avec webhook {webhook_url_to_use}")
-            
-            vban_detector = get_vban_detector()
-            
-            def audio_callback(audio_data, timestamp):
-                if not detection_running:
-                    return
-                    
-                active_sources = vban_detector.get_active_sources()
-                if vban_ip not in active_sources:
-                    return
-                    
-                detector.process_audio(audio_data, source_id)
-            
-            vban_detector.set_audio_callback(audio_callback)
-            
-            # Maintenir le thread en vie tant que la détection est active
-            while detection_running:
-                time.sleep(0.1)  # Éviter de surcharger le CPU
-                
-                # Vérifier périodiquement si la source est toujours active
-                active_sources = vban_detector.get_active_sources()
-                if vban_ip not in active_sources:
-                    logging.warning(f"Source VBAN {vban_ip} non trouvée")
-                    time.sleep(1)  # Attendre un peu plus longtemps avant la prochaine vérification
-                    
-        else:  # Microphone
-            # Récupérer l'index du périphérique depuis les paramètres
-            settings = reload_settings()
-            device_index = int(settings.get('microphone', {}).get('device_index', 0))
-            source_id = f"mic_{device_index}"
-            
-            # Récupérer le webhook_url depuis les paramètres du microphone
-            microphone_webhook_url = settings.get('microphone', {}).get('webhook_url')
-            webhook_url_to_use = microphone_webhook_url or webhook_url
-            
-            detector.add_source(
-                source_id=source_id,
-                detection_callback=create_detection_callback(source_id, webhook_url_to_use),
-                labels_callback=create_labels_callback(source_id)
-            )
-            
-            # Démarrer la détection
-            detector.start()
-            logging.info(f"Détection démarrée pour la source microphone {source_id}")
-            
-            with sd.InputStream(
-                device=device_index,
-                channels=1,
-                samplerate=16000,
-                blocksize=int(16000 * 0.1),  # Buffer de 100ms
-                callback=lambda indata, frames, time, status: detector.process_audio(indata[:, 0], source_id)
-            ):
-                logging.info("Stream audio démarré pour le microphone")
+
+        def create_callbacks(source):
+            # Chaque source a son propre webhook (celui par défaut à défaut)
+            return create_detection_callback(source), create_labels_callback(source.source_id)
+
+        pipeline = DetectionPipeline(detector, create_callbacks).start(sources)
+        try:
+            if not pipeline.active_sources():
+                logging.error("Aucune source audio n'a pu démarrer")
+            else:
+                logging.info(f"Détection démarrée pour {len(pipeline.active_sources())} source(s)")
                 while detection_running:
                     time.sleep(0.1)
-                    
-        detector.stop()
+        finally:
+            pipeline.stop()
+            pipeline = None
         return True
         
     except Exception as e:
@@ -404,6 +319,56 @@ def stop_detection():
 def is_running():
     return detection_running
 
+def apply_detection_settings(settings):
+    """
+    Applique les paramètres modifiés à la détection en cours : seules les
+    sources ajoutées, retirées ou modifiées sont démarrées ou arrêtées, les
+    autres continuent sans interruption ni rechargement du modèle.
+
+    Returns:
+        dict: Changements appliqués, ou None si la détection est arrêtée
+    """
+    # Filtre des sources VBAN activées : relu dès le prochain paquet plutôt qu'à l'expiration du cache
+    invalidate_vban_settings()
+    current = pipeline
+    if current is None or not detection_running:
+        return None
+    if isinstance(current.detector, AudioDetector):
+        try:
+            current.detector.set_rules(**detection_rules(settings))
+        except (TypeError, ValueError, AttributeError) as e:
+            logging.error(f"Règles de détection invalides, règles actuelles conservées: {e}")
+    return current.reconcile(build_sources(settings, _default_webhook_url))
+
+def get_pipeline_status():
+    """État de chaque source du pipeline en cours (vide si la détection est arrêtée)"""
+    current = pipeline
+    return current.status() if current is not None else {}
+
+def get_stage_status():
+    """Compteurs de chaque étape du graphe de traitement (vide sans graphe)"""
+    current = pipeline
+    if current is None or not isinstance(current.detector, StageGraph):
+        return {}
+    return current.detector.status()
+
+def get_engine_metrics():
+    """Compteurs du moteur de détection en cours (file d'inférence, compteurs par source)"""
+    current = pipeline
+    if current is None or not hasattr(current.detector, 'metrics'):
+        return {}
+    return current.detector.metrics()
+
+def get_capture_status():
+    """Compteurs des captures micro en cours (débordements, échantillons perdus) par périphérique"""
+    return {str(source.device_index): source.status() for source in _pipeline_sources(MicrophoneSource)}
+
+def _pipeline_sources(source_class):
+    current = pipeline
+    if current is None:
+        return []
+    return [source for source in current.active_sources() if isinstance(source, source_class)]
+
 # Ajout d'une commande simple pour démarrer et arrêter la détection pour les tests
 if __name__ == "__main__":
     try:
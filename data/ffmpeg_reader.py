@@ -0,0 +1,228 @@
+import collections
+import logging
+import os
+import selectors
+import time
+
+import ffmpeg
+import numpy as np
+
+# Profils d'ingestion : options d'entrée ffmpeg
+INGEST_PROFILES = {
+    # Comportement par défaut d'ffmpeg : analyse longue du flux avant le premier échantillon
+    'default': {},
+    # Démarrage immédiat : pas de tampon de démultiplexage, analyse minimale.
+    # Les paquets lus pendant l'analyse peuvent être perdus : adapté aux flux en direct
+    'low_latency': {
+        'fflags': 'nobuffer',
+        'flags': 'low_delay',
+        'probesize': 32,
+        'analyzeduration': 0,
+    },
+}
+DEFAULT_PROFILE = 'low_latency'
+RTSP_TRANSPORTS = ('tcp', 'udp')
+# Tranche d'attente maximale d'une lecture, pour remarquer une fermeture concurrente
+CLOSE_POLL_INTERVAL = 0.25
+
+class StreamStallError(Exception):
+    """Aucune donnée audio reçue avant l'échéance de lecture"""
+
+def ingest_input_options(url, profile=DEFAULT_PROFILE, transport='tcp'):
+    """
+    Options d'entrée ffmpeg pour un profil d'ingestion.
+
+    Args:
+        url (str): URL lue ; le transport ne s'applique qu'aux URL rtsp://
+        profile (str): Nom du profil (voir INGEST_PROFILES)
+        transport (str): 'tcp' ou 'udp' pour RTSP
+
+    Returns:
+        dict: Options à passer à ffmpeg.input
+    """
+    if profile not in INGEST_PROFILES:
+        raise ValueError(f"Profil d'ingestion inconnu: {profile}")
+    options = dict(INGEST_PROFILES[profile])
+    if url.startswith(('rtsp://', 'rtsps://')) and transport:
+        if transport not in RTSP_TRANSPORTS:
+            raise ValueError(f"Transport RTSP inconnu: {transport}")
+        options['rtsp_transport'] = transport
+    return options
+
+class FFmpegAudioReader:
+    """
+    Lit l'audio d'une URL (RTSP, fichier...) via un processus ffmpeg qui
+    décode en PCM float32 mono sur sa sortie standard.
+
+    Les lectures ne bloquent jamais indéfiniment : stdout et stderr sont
+    surveillés avec un sélecteur, stderr est vidé en continu (ffmpeg ne reste
+    jamais bloqué sur un tube plein) et ses dernières lignes sont conservées.
+    Si aucune donnée n'arrive avant `startup_timeout` (premier échantillon) ou
+    `stall_timeout` (ensuite), `read` lève StreamStallError.
+
+    Les échantillons sont lus directement dans un tampon float32 préalloué,
+    réutilisé d'un bloc à l'autre : le tableau renvoyé par `read` n'est valide
+    que jusqu'à l'appel suivant.
+    """
+
+    def __init__(self, url, sample_rate=16000, chunk_samples=1600, startup_timeout=10.0, stall_timeout=3.0,
+                 profile=DEFAULT_PROFILE, transport='tcp'):
+        self.url = url
+        self.input_options = ingest_input_options(url, profile, transport)
+        self.sample_rate = sample_rate
+        self.chunk_samples = chunk_samples
+        self.startup_timeout = startup_timeout
+        self.stall_timeout = stall_timeout
+        self.process = None
+        self.stderr_lines = collections.deque(maxlen=20)
+        self.started_at = None
+        self.first_sample_at = None
+        self._selector = None
+        self._bytes = bytearray(chunk_samples * 4)  # 4 bytes par sample float32
+        self._view = memoryview(self._bytes)
+        self._samples = np.frombuffer(self._bytes, dtype=np.float32)
+        self._filled = 0
+        self._stderr_partial = b''
+
+    def start(self):
+        """Lance le processus ffmpeg"""
+        self.process = (
+            ffmpeg
+            .input(self.url, **self.input_options)
+            .output('pipe:',
+                    format='f32le',  # Format PCM 32-bit float
+                    acodec='pcm_f32le',
+                    ac=1,  # Mono
+                    ar=str(self.sample_rate),
+                    flush_packets=1)
+            .global_args('-loglevel', 'error', '-nostdin')
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+        self.started_at = time.monotonic()
+        self._selector = selectors.DefaultSelector()
+        for pipe in (self.process.stdout, self.process.stderr):
+            os.set_blocking(pipe.fileno(), False)
+            self._selector.register(pipe, selectors.EVENT_READ)
+        return self
+
+    @property
+    def last_error(self):
+        """Dernière ligne d'erreur écrite par ffmpeg"""
+        return self.stderr_lines[-1] if self.stderr_lines else None
+
+    def _drain_stderr(self, data):
+        lines = (self._stderr_partial + data).split(b'\n')
+        self._stderr_partial = lines.pop()[-1024:]
+        for line in lines:
+            line = line.decode('utf-8', errors='replace').strip()
+            if line:
+                self.stderr_lines.append(line)
+
+    def _flush_stderr(self, timeout=0.5):
+        """Récupère les derniers messages d'ffmpeg après la fin de sa sortie audio"""
+        stderr = self.process.stderr
+        deadline = time.monotonic() + timeout
+        while stderr.fileno() in self._selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            for key, _ in self._selector.select(remaining):
+                if key.fileobj is not stderr:
+                    continue
+                data = os.read(stderr.fileno(), 65536)
+                if not data:
+                    self._selector.unregister(stderr)
+                    return
+                self._drain_stderr(data)
+
+    def read(self, timeout=None):
+        """
+        Lit un bloc de `chunk_samples` échantillons.
+
+        Args:
+            timeout (float, optional): Échéance en secondes, sinon startup_timeout / stall_timeout
+
+        Returns:
+            np.ndarray: Bloc float32 mono (tampon réutilisé), ou None en fin de flux
+
+        Raises:
+            StreamStallError: Aucune donnée reçue avant l'échéance
+        """
+        if self.process is None:
+            return None
+        stdout = self.process.stdout
+        fd = stdout.fileno()
+        selector = self._selector
+        if timeout is None:
+            timeout = self.stall_timeout if self.first_sample_at else self.startup_timeout
+        wanted = len(self._bytes)
+        deadline = time.monotonic() + timeout
+
+        while self._filled < wanted and fd in (selector.get_map() or {}):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise StreamStallError(
+                    f"Aucune donnée depuis {timeout:.1f}s" + (f" ({self.last_error})" if self.last_error else "")
+                )
+            eof = False
+            try:
+                # Attente par tranches courtes : une fermeture depuis un autre thread est vue rapidement
+                events = selector.select(min(remaining, CLOSE_POLL_INTERVAL))
+            except (OSError, ValueError):
+                events = []
+            if self.process is None:
+                # Lecteur fermé pendant la lecture
+                return None
+            for key, _ in events:
+                if key.fileobj is stdout:
+                    received = os.readv(fd, [self._view[self._filled:]])
+                    if not received:
+                        eof = True
+                        selector.unregister(stdout)
+                    else:
+                        if self.first_sample_at is None:
+                            self.first_sample_at = time.monotonic()
+                        self._filled += received
+                        # Données reçues : l'échéance repart
+                        deadline = time.monotonic() + self.stall_timeout
+                else:
+                    data = os.read(key.fileobj.fileno(), 65536)
+                    if data:
+                        self._drain_stderr(data)
+                    else:
+                        selector.unregister(key.fileobj)
+            if eof:
+                self._flush_stderr()
+                break
+
+        # Un dernier bloc partiel peut ne pas être aligné sur 4 octets
+        samples = self._filled // 4
+        self._filled = 0
+        if samples == 0:
+            return None
+        return self._samples[:samples]
+
+    def close(self):
+        """Arrête le processus ffmpeg"""
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            process.kill()
+            process.wait(timeout=2.0)
+        except Exception as e:
+            logging.debug(f"Arrêt de ffmpeg pour {self.url}: {e}")
+        finally:
+            for pipe in (process.stdout, process.stderr):
+                if pipe:
+                    pipe.close()
+            if self._selector:
+                self._selector.close()
+                self._selector = None
+
+    def __iter__(self):
+        while True:
+            chunk = self.read()
+            if chunk is None:
+                return
+            yield chunk
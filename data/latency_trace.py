@@ -0,0 +1,156 @@
+import bisect
+import json
+import logging
+import threading
+import time
+
+# Étapes mesurées, dans l'ordre du trajet d'une fenêtre : de la capture au webhook
+SPANS = ('capture', 'resample', 'ingest', 'queue', 'inference', 'scoring', 'emit', 'webhook', 'total')
+# Bornes supérieures des classes des histogrammes, en millisecondes
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+class LatencyHistogram:
+    """Histogramme de durées à classes fixes (ms) ; percentiles estimés par la borne de classe"""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Dernière classe : au-delà de la dernière borne
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, milliseconds):
+        self.counts[bisect.bisect_left(self.buckets, milliseconds)] += 1
+        self.count += 1
+        self.sum_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+
+    def copy(self):
+        histogram = LatencyHistogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count, histogram.sum_ms, histogram.max_ms = self.count, self.sum_ms, self.max_ms
+        return histogram
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum_ms / self.count, 3) if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'max_ms': round(self.max_ms, 3),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('inf',), self.counts)},
+        }
+
+def trace_spans(trace):
+    """
+    Durées (s) de chaque étape d'une trace, à partir des horodatages posés le
+    long du trajet (`capture`, `ingest`, `enqueued`, `dequeued`, `classified`,
+    `scored`, `emitted`, `webhook_done`). Les étapes non franchies sont omises.
+    """
+    spans = {}
+    if trace.get('capture') is not None:
+        spans['capture'] = trace['ingest'] - trace['capture']
+    if trace.get('resample') is not None:
+        spans['resample'] = trace['resample']
+    steps = (('ingest', 'ingest', 'enqueued'), ('queue', 'enqueued', 'dequeued'),
+             ('inference', 'dequeued', 'classified'), ('scoring', 'classified', 'scored'),
+             ('emit', 'scored', 'emitted'), ('webhook', 'emitted', 'webhook_done'))
+    for span, start, end in steps:
+        if trace.get(start) is not None and trace.get(end) is not None:
+            spans[span] = trace[end] - trace[start]
+    if 'webhook' not in spans and trace.get('webhook_done') is not None and trace.get('scored') is not None:
+        spans['webhook'] = trace['webhook_done'] - trace['scored']
+    last = next((trace[key] for key in ('webhook_done', 'emitted', 'scored') if trace.get(key) is not None), None)
+    first = trace.get('capture') if trace.get('capture') is not None else trace.get('ingest')
+    if last is not None and first is not None:
+        spans['total'] = last - first
+    return spans
+
+class LatencyTracer:
+    """
+    Agrège les traces de latence en histogrammes par source et par étape.
+
+    Chaque fenêtre analysée est enregistrée une fois, après les callbacks de
+    détection : une fenêtre sans détection s'arrête à l'étape `scoring`, une
+    détection couvre aussi l'émission Socket.IO et le webhook. Les traces des
+    détections peuvent être écrites dans un fichier JSONL (une ligne par clap).
+    """
+
+    def __init__(self, trace_file=None):
+        self._histograms = {}
+        self.lock = threading.Lock()
+        self.trace_file = None
+        self._file = None
+        self.set_trace_file(trace_file)
+
+    def set_trace_file(self, path):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.trace_file = path or None
+            if self.trace_file:
+                try:
+                    self._file = open(self.trace_file, 'a')
+                except OSError as e:
+                    logging.error(f"Impossible d'ouvrir le fichier de traces {self.trace_file}: {e}")
+                    self.trace_file = None
+
+    def record(self, source_id, trace):
+        spans = trace_spans(trace)
+        with self.lock:
+            histograms = self._histograms.get(source_id)
+            if histograms is None:
+                histograms = self._histograms[source_id] = {span: LatencyHistogram() for span in SPANS}
+            for span, seconds in spans.items():
+                histograms[span].observe(seconds * 1000)
+            if self._file is not None and trace.get('detection'):
+                self._file.write(json.dumps({
+                    'source_id': source_id,
+                    'timestamp': trace.get('scored'),
+                    'score': trace.get('score'),
+                    'webhook_status': trace.get('webhook_status'),
+                    'spans_ms': {span: round(seconds * 1000, 3) for span, seconds in spans.items()},
+                }) + '\n')
+                self._file.flush()
+
+    def status(self):
+        """Par source et par étape : nombre, moyenne, p50, p95, maximum (ms) et classes de l'histogramme"""
+        with self.lock:
+            return {
+                source_id: {span: histogram.summary() for span, histogram in histograms.items() if histogram.count}
+                for source_id, histograms in self._histograms.items()
+            }
+
+    def histograms(self, span):
+        """Copie des histogrammes d'une étape, par source"""
+        with self.lock:
+            return {
+                source_id: histograms[span].copy()
+                for source_id, histograms in self._histograms.items() if histograms[span].count
+            }
+
+    def reset(self):
+        with self.lock:
+            self._histograms = {}
+
+_tracer = LatencyTracer()
+
+def get_tracer():
+    """Traceur partagé par le moteur de détection et l'API"""
+    return _tracer
+
+def new_trace(ingest, capture=None, resample=None):
+    """Trace d'une fenêtre, à l'arrivée de son dernier bloc dans le moteur"""
+    return {'capture': capture, 'ingest': ingest, 'resample': resample, 'enqueued': time.time()}
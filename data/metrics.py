@@ -0,0 +1,143 @@
+"""
+Export des métriques du moteur de détection au format texte Prometheus
+(version 0.0.4), sans dépendance : les compteurs sont tenus par leurs
+propriétaires (moteur, sources, traceur de latence) et seulement lus ici, au
+moment de la collecte.
+"""
+import psutil
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+class MetricsWriter:
+    """Accumule des familles de métriques et les rend au format texte Prometheus"""
+
+    def __init__(self, prefix='claptrap_'):
+        self.prefix = prefix
+        self.lines = []
+
+    def add(self, name, metric_type, help_text, samples):
+        """
+        Args:
+            samples: Paires (labels, valeur) ; une famille sans échantillon n'est pas écrite
+        """
+        samples = list(samples)
+        if not samples:
+            return
+        name = self.prefix + name
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def histogram(self, name, help_text, histograms, scale=0.001):
+        """
+        Écrit des `LatencyHistogram` (ms) en histogrammes Prometheus (secondes par défaut).
+
+        Args:
+            histograms: Paires (labels, LatencyHistogram)
+        """
+        histograms = list(histograms)
+        if not histograms:
+            return
+        name = self.prefix + name
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in histograms:
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                self.lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound * scale})} {cumulative}")
+            self.lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+            self.lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum_ms * scale)}")
+            self.lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
+
+def render_metrics(running, engine=None, sources=None, webhooks=None, tracer=None, process=None):
+    """
+    Métriques de la détection en cours.
+
+    Args:
+        running (bool): Détection démarrée
+        engine (dict): `metrics()` du moteur (AudioDetector ou StageGraph)
+        sources (dict): `DetectionPipeline.status()`
+        webhooks (dict): Résultats des webhooks par source ({'success', 'failure'})
+        tracer (LatencyTracer): Histogrammes de latence (inférence, webhook)
+        process (psutil.Process): Processus mesuré (le processus courant par défaut)
+
+    Returns:
+        str: Texte au format Prometheus
+    """
+    engine = engine or {}
+    sources = sources or {}
+    webhooks = webhooks or {}
+    counters = engine.get('sources', {})
+    writer = MetricsWriter()
+
+    def labels(source_id):
+        return {'source_id': source_id, 'kind': sources.get(source_id, {}).get('kind') or ''}
+
+    def per_source(key):
+        return [(labels(source_id), values[key]) for source_id, values in counters.items() if key in values]
+
+    writer.add('detection_running', 'gauge', "Détection démarrée (1) ou arrêtée (0)", [({}, int(bool(running)))])
+    writer.add('source_up', 'gauge', "Source démarrée et alimentant le moteur",
+               [(labels(source_id), int(status.get('state') in ('running', 'streaming'))) for source_id, status in sources.items()])
+    writer.add('source_blocks_total', 'counter', "Blocs audio (paquets) reçus par le moteur", per_source('blocks'))
+    writer.add('source_samples_total', 'counter', "Échantillons reçus par le moteur", per_source('samples'))
+    writer.add('inference_windows_total', 'counter', "Fenêtres complètes soumises à l'inférence", per_source('windows'))
+    writer.add('inferences_total', 'counter', "Fenêtres classées", per_source('inferences'))
+    writer.add('gated_blocks_total', 'counter', "Blocs abandonnés par la porte de bruit", per_source('gated'))
+    writer.add('dropped_windows_total', 'counter', "Fenêtres abandonnées, file d'inférence pleine", per_source('dropped'))
+    writer.add('detections_total', 'counter', "Claps détectés", per_source('detections'))
+    if 'queue_depth' in engine:
+        writer.add('inference_queue_depth', 'gauge', "Fenêtres en attente d'inférence", [({}, engine['queue_depth'])])
+        writer.add('inference_queue_dropped_total', 'counter', "Fenêtres abandonnées, toutes sources",
+                   [({}, engine.get('dropped_windows', 0))])
+
+    writer.add('webhook_requests_total', 'counter', "Webhooks envoyés, par résultat", [
+        ({**labels(source_id), 'result': result}, count)
+        for source_id, results in webhooks.items() for result, count in results.items()
+    ])
+    if tracer is not None:
+        writer.histogram('inference_duration_seconds', "Durée d'inférence d'une fenêtre",
+                         [(labels(source_id), histogram) for source_id, histogram in tracer.histograms('inference').items()])
+        writer.histogram('queue_wait_seconds', "Attente d'une fenêtre dans la file d'inférence",
+                         [(labels(source_id), histogram) for source_id, histogram in tracer.histograms('queue').items()])
+        writer.histogram('webhook_duration_seconds', "Aller-retour du webhook",
+                         [(labels(source_id), histogram) for source_id, histogram in tracer.histograms('webhook').items()])
+
+    writer.add('rtsp_restarts_total', 'counter', "Redémarrages du lecteur ffmpeg d'un flux RTSP",
+               [(labels(source_id), status['restarts']) for source_id, status in sources.items() if 'restarts' in status])
+    writer.add('rtsp_stalls_total', 'counter', "Blocages détectés d'un flux RTSP",
+               [(labels(source_id), status['stalls']) for source_id, status in sources.items() if 'stalls' in status])
+    writer.add('vban_packets_total', 'counter', "Paquets VBAN reçus",
+               [(labels(source_id), status['packets']) for source_id, status in sources.items() if 'packets' in status])
+    writer.add('vban_lost_frames_total', 'counter', "Trames VBAN perdues (trous dans le compteur de trames)",
+               [(labels(source_id), status['lost_frames']) for source_id, status in sources.items() if 'lost_frames' in status])
+    writer.add('microphone_dropped_samples_total', 'counter', "Échantillons micro perdus, tampon de capture plein",
+               [(labels(source_id), status['dropped_samples']) for source_id, status in sources.items() if 'dropped_samples' in status])
+
+    process = process or psutil.Process()
+    with process.oneshot():
+        cpu = process.cpu_times()
+        writer.add('process_cpu_seconds_total', 'counter', "Temps CPU du processus (utilisateur + système)",
+                   [({}, float(cpu.user + cpu.system))])
+        writer.add('process_resident_memory_bytes', 'gauge', "Mémoire résidente du processus",
+                   [({}, process.memory_info().rss)])
+        writer.add('process_threads', 'gauge', "Threads du processus", [({}, process.num_threads())])
+    return writer.render()
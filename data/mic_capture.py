@@ -0,0 +1,244 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import sounddevice as sd
+
+from resampler import PolyphaseResampler
+
+def microphone_devices(microphone_settings):
+    """
+    Liste des microphones à capturer d'après la section `microphone` des paramètres.
+
+    `devices` (liste de {device_index, webhook_url, enabled, name}) permet
+    d'analyser plusieurs périphériques en même temps ; sans cette liste, le
+    périphérique unique `device_index` est utilisé.
+
+    Returns:
+        list: {'device_index', 'source_id', 'webhook_url', 'name'} des micros activés
+    """
+    microphone_settings = microphone_settings or {}
+    entries = microphone_settings.get('devices') or [{
+        'device_index': microphone_settings.get('device_index', 0),
+        'webhook_url': microphone_settings.get('webhook_url'),
+    }]
+    devices = []
+    for entry in entries:
+        if not entry.get('enabled', True):
+            continue
+        device_index = int(entry.get('device_index', 0))
+        if any(device['device_index'] == device_index for device in devices):
+            logging.warning(f"Micro {device_index} configuré plusieurs fois, entrée ignorée")
+            continue
+        devices.append({
+            'device_index': device_index,
+            'source_id': f"mic_{device_index}",
+            'webhook_url': entry.get('webhook_url') or None,
+            'name': entry.get('name') or f"Micro {device_index}",
+        })
+    return devices
+
+class SPSCRingBuffer:
+    """
+    Tampon circulaire d'échantillons pour un seul producteur et un seul consommateur.
+
+    Sans verrou : le producteur (callback PortAudio) n'avance que le compteur
+    d'écriture, le consommateur que le compteur de lecture, chacun après avoir
+    copié les données. Quand le tampon est plein, les nouveaux échantillons sont
+    perdus (le producteur ne touche jamais à la position de lecture) et comptés.
+    """
+
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=dtype)
+        self._written = 0  # Total écrit (producteur uniquement)
+        self._read = 0  # Total lu (consommateur uniquement)
+
+    def available(self):
+        """Nombre d'échantillons en attente de lecture"""
+        return self._written - self._read
+
+    def write(self, data):
+        """
+        Copie `data` dans le tampon (côté producteur).
+
+        Returns:
+            int: Nombre d'échantillons perdus faute de place
+        """
+        free = self.capacity - (self._written - self._read)
+        dropped = max(0, len(data) - free)
+        if dropped:
+            data = data[:free]
+        n = len(data)
+        if n:
+            start = self._written % self.capacity
+            first = min(n, self.capacity - start)
+            self._buffer[start:start + first] = data[:first]
+            self._buffer[:n - first] = data[first:]
+            # Publier l'écriture seulement après la copie
+            self._written += n
+        return dropped
+
+    def read(self, out):
+        """
+        Copie au plus `len(out)` échantillons dans `out` (côté consommateur).
+
+        Returns:
+            int: Nombre d'échantillons copiés
+        """
+        n = min(len(out), self._written - self._read)
+        if n:
+            start = self._read % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self._buffer[start:start + first]
+            out[first:n] = self._buffer[:n - first]
+            self._read += n
+        return n
+
+class MicrophoneCapture:
+    """
+    Capture d'un microphone découplée de l'analyse.
+
+    Le flux est ouvert à la fréquence et à la taille de bloc natives du
+    périphérique (pas de conversion par PortAudio/ALSA). Le callback PortAudio
+    (thread temps réel) ne fait que compter les débordements signalés par
+    PortAudio et copier les échantillons dans un `SPSCRingBuffer` ; un thread
+    de traitement vide le tampon par blocs, les convertit à `sample_rate` avec
+    un `PolyphaseResampler` et appelle `on_audio(bloc, source_id)`. Le bloc
+    n'est valable que jusqu'à l'appel suivant. Avec `sample_rate=None`, les
+    blocs sont livrés à la fréquence du périphérique, sans conversion.
+    """
+
+    def __init__(self, device, on_audio, source_id=None, sample_rate=16000, block_duration=0.1,
+                 ring_duration=2.0, stream_factory=None, device_rate=None):
+        self.device = device
+        self.on_audio = on_audio
+        self.source_id = source_id or f"mic_{device}"
+        self.sample_rate = sample_rate
+        self.block_duration = block_duration
+        self.ring_duration = ring_duration
+        # Fréquence du périphérique : celle par défaut de PortAudio si non imposée
+        self.device_rate = device_rate
+        self.stream_factory = stream_factory or sd.InputStream
+        self.ring = None
+        self.resampler = None
+        self.blocksize = int((sample_rate or 16000) * block_duration)
+        # Attente du thread de traitement quand le tampon est vide (un quart de bloc)
+        self.poll_interval = block_duration / 4
+        self.callbacks = 0
+        self.input_overflows = 0  # Débordements signalés par PortAudio
+        self.ring_overflows = 0  # Callbacks dont une partie n'a pas tenu dans le tampon
+        self.dropped_samples = 0
+        self.processed_samples = 0  # Échantillons à la fréquence du périphérique
+        self.resample_seconds = 0.0  # Temps passé à rééchantillonner
+        self.block_resample_seconds = None  # Durée de conversion du dernier bloc livré (None sans conversion)
+        self.last_callback_at = None  # Heure du dernier callback PortAudio
+        self.capture_time = None  # Heure de capture estimée du dernier échantillon du bloc en cours
+        self.stream = None
+        self.running = False
+        self._thread = None
+
+    def _callback(self, indata, frames, time_info, status):
+        """Callback PortAudio : compter et copier, rien d'autre"""
+        self.callbacks += 1
+        self.last_callback_at = time.time()
+        if status and status.input_overflow:
+            self.input_overflows += 1
+        dropped = self.ring.write(indata[:, 0])
+        if dropped:
+            self.ring_overflows += 1
+            self.dropped_samples += dropped
+
+    def _run(self):
+        block = np.empty(self.blocksize, dtype=np.float32)
+        while self.running:
+            if self.ring.available() < self.blocksize:
+                time.sleep(self.poll_interval)
+                continue
+            n = self.ring.read(block)
+            # Les échantillons restés dans le tampon ont été capturés après ce bloc
+            self.capture_time = self.last_callback_at - self.ring.available() / self.device_rate
+            audio = block[:n]
+            self.block_resample_seconds = None
+            if not self.resampler.passthrough:
+                started = time.perf_counter()
+                audio = self.resampler.process(audio)
+                self.block_resample_seconds = time.perf_counter() - started
+                self.resample_seconds += self.block_resample_seconds
+            try:
+                self.on_audio(audio, self.source_id)
+            except Exception as e:
+                logging.error(f"Erreur de traitement audio pour {self.source_id}: {e}")
+            self.processed_samples += n
+
+    def start(self):
+        if self.device_rate is None:
+            self.device_rate = int(sd.query_devices(self.device, 'input')['default_samplerate'])
+        # blocksize=0 : taille de bloc choisie par PortAudio (optimale pour le périphérique)
+        self.stream = self.stream_factory(
+            device=self.device,
+            channels=1,
+            samplerate=self.device_rate,
+            blocksize=0,
+            callback=self._callback
+        )
+        # Fréquence effectivement négociée
+        self.device_rate = int(getattr(self.stream, 'samplerate', None) or self.device_rate)
+        self.blocksize = int(self.device_rate * self.block_duration)
+        self.ring = SPSCRingBuffer(int(self.device_rate * self.ring_duration))
+        self.sample_rate = self.sample_rate or self.device_rate
+        self.resampler = PolyphaseResampler(self.device_rate, self.sample_rate)
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f"mic-capture-{self.device}")
+        self._thread.daemon = True
+        self._thread.start()
+        self.stream.start()
+        logging.info(
+            f"Micro {self.device} capturé à {self.device_rate} Hz"
+            + ("" if self.resampler.passthrough else f", rééchantillonné à {self.sample_rate} Hz")
+        )
+        return self
+
+    def stop(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception as e:
+                logging.debug(f"Fermeture du flux micro {self.device}: {e}")
+            self.stream = None
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self.input_overflows or self.ring_overflows:
+            logging.warning(
+                f"Micro {self.device}: {self.input_overflows} débordements PortAudio, "
+                f"{self.dropped_samples} échantillons perdus (tampon plein)"
+            )
+
+    def status(self):
+        audio_seconds = self.processed_samples / self.device_rate if self.device_rate else 0.0
+        resampling = self.resampler is not None and not self.resampler.passthrough
+        return {
+            'source_id': self.source_id,
+            'device': self.device,
+            'device_rate': self.device_rate,
+            'sample_rate': self.sample_rate,
+            'resample_ratio': f"{self.resampler.up}/{self.resampler.down}" if resampling else None,
+            # Temps de rééchantillonnage rapporté à la durée d'audio traitée (fraction d'un cœur)
+            'resample_cost': round(self.resample_seconds / audio_seconds, 5) if audio_seconds else 0.0,
+            'callbacks': self.callbacks,
+            'input_overflows': self.input_overflows,
+            'ring_overflows': self.ring_overflows,
+            'dropped_samples': self.dropped_samples,
+            'buffered_samples': self.ring.available() if self.ring else 0,
+            'processed_samples': self.processed_samples,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
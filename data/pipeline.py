@@ -0,0 +1,352 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from mic_capture import MicrophoneCapture, microphone_devices
+from rtsp_supervisor import RTSPStreamWorker, rtsp_source_id
+
+class AudioSource(ABC):
+    """
+    Source audio d'un pipeline de détection.
+
+    Chaque source a son identifiant (celui de la source dans `AudioDetector`),
+    son webhook et son propre cycle de vie : `start(on_audio)` commence à
+    livrer l'audio via `on_audio(bloc, source_id)`, `stop()` l'arrête.
+    """
+
+    kind = None
+    # Livrer l'audio à la fréquence native, quand le moteur rééchantillonne lui-même
+    native_rate = False
+
+    def __init__(self, source_id, webhook_url=None, name=None):
+        self.source_id = source_id
+        self.webhook_url = webhook_url
+        self.name = name or source_id
+        self.state = 'stopped'
+        self.last_error = None
+        self.started_at = None
+
+    def config(self):
+        """Paramètres dont la modification impose de redémarrer la source (le webhook et le nom n'en font pas partie)"""
+        return ()
+
+    @abstractmethod
+    def start(self, on_audio):
+        """Commence à livrer l'audio ; lève une exception si la source ne peut pas démarrer"""
+
+    @abstractmethod
+    def stop(self):
+        """Arrête la livraison de l'audio"""
+
+    def status(self):
+        return {
+            'source_id': self.source_id,
+            'kind': self.kind,
+            'name': self.name,
+            'state': self.state,
+            'webhook_url': self.webhook_url,
+            'started_at': self.started_at,
+            'last_error': self.last_error,
+        }
+
+class MicrophoneSource(AudioSource):
+    kind = 'microphone'
+
+    def __init__(self, device_index, webhook_url=None, name=None, capture_factory=None):
+        super().__init__(f"mic_{device_index}", webhook_url, name)
+        self.device_index = device_index
+        self.capture_factory = capture_factory or MicrophoneCapture
+        self.capture = None
+
+    def config(self):
+        return (self.device_index,)
+
+    def start(self, on_audio):
+        def deliver(data, source_id):
+            # Heure de capture et durée de conversion connues de la capture micro : mesure de latence depuis le micro
+            options = {
+                'capture_time': getattr(self.capture, 'capture_time', None),
+                'resample_seconds': getattr(self.capture, 'block_resample_seconds', None),
+            }
+            if self.native_rate:
+                options['sample_rate'] = self.capture.sample_rate
+            on_audio(data, source_id, **options)
+
+        if self.native_rate:
+            self.capture = self.capture_factory(self.device_index, deliver, source_id=self.source_id, sample_rate=None)
+        else:
+            self.capture = self.capture_factory(self.device_index, deliver, source_id=self.source_id)
+        self.capture.start()
+
+    def stop(self):
+        if self.capture is not None:
+            self.capture.stop()
+
+    def status(self):
+        status = super().status()
+        if self.capture is not None:
+            status.update(self.capture.status())
+        return status
+
+class RTSPSource(AudioSource):
+    kind = 'rtsp'
+
+    # Options de lecture propres à chaque flux dans rtsp_sources
+    STREAM_OPTIONS = ('profile', 'transport', 'backend')
+
+    def __init__(self, url, webhook_url=None, name=None, worker_factory=None, **options):
+        super().__init__(rtsp_source_id({'url': url}), webhook_url, name)
+        self.url = url
+        self.options = options
+        self.worker_factory = worker_factory or RTSPStreamWorker
+        self.worker = None
+
+    def config(self):
+        return (self.url, tuple(sorted(self.options.items())))
+
+    def start(self, on_audio):
+        self.worker = self.worker_factory(self.source_id, self.url, on_audio, **self.options)
+        self.worker.start()
+
+    def stop(self):
+        if self.worker is not None:
+            self.worker.stop()
+
+    def status(self):
+        status = super().status()
+        if self.worker is not None:
+            worker_status = self.worker.status()
+            # L'état du lecteur (connecting, streaming, backoff) précise celui de la source
+            status.update(worker_status, state=worker_status['state'] if self.state == 'running' else self.state)
+        return status
+
+class VBANSource(AudioSource):
+    kind = 'vban'
+
+    def __init__(self, ip, stream_name=None, webhook_url=None, name=None, vban_detector_factory=None):
+        stream_name = stream_name or None
+        # Un identifiant par flux : deux flux d'un même équipement sont analysés séparément
+        super().__init__(f"vban_{ip}_{stream_name}" if stream_name else f"vban_{ip}", webhook_url, name)
+        self.ip = ip
+        self.stream_name = stream_name
+        self.vban_detector_factory = vban_detector_factory
+        self.vban_detector = None
+        self.samples = 0
+        self._callback = None
+
+    def config(self):
+        return (self.ip, self.stream_name)
+
+    @property
+    def _stream(self):
+        # S'abonner uniquement au flux configuré, ou à tous les flux de l'IP si le nom est inconnu
+        return (self.ip, self.stream_name) if self.stream_name else None
+
+    def start(self, on_audio):
+        if self.vban_detector_factory is None:
+            from vban_manager import get_vban_detector
+            self.vban_detector_factory = get_vban_detector
+        self.vban_detector = self.vban_detector_factory()
+        if self.vban_detector is None:
+            raise RuntimeError("Détecteur VBAN indisponible")
+
+        def audio_callback(audio_data, timestamp):
+            if self.ip not in self.vban_detector.get_active_sources():
+                return
+            self.samples += len(audio_data)
+            on_audio(audio_data, self.source_id, capture_time=timestamp)
+
+        self._callback = audio_callback
+        self.vban_detector.add_callback(audio_callback, stream=self._stream)
+
+    def stop(self):
+        if self.vban_detector is not None and self._callback is not None:
+            self.vban_detector.remove_callback(self._callback, stream=self._stream)
+            self._callback = None
+
+    def status(self):
+        status = super().status()
+        status.update(ip=self.ip, stream_name=self.stream_name, samples=self.samples)
+        if self.vban_detector is not None and self.state == 'running':
+            status['active'] = self.ip in self.vban_detector.get_active_sources()
+            stream_stats = getattr(self.vban_detector, 'stream_stats', None)
+            if stream_stats is not None:
+                # Paquets et trames perdues des flux de la source (trous dans le compteur de trames VBAN)
+                streams = [
+                    counters for (ip, name), counters in stream_stats.snapshot().items()
+                    if ip == self.ip and (self.stream_name is None or name == self.stream_name)
+                ]
+                status['packets'] = sum(counters['packets'] for counters in streams)
+                status['lost_frames'] = sum(counters['lost_frames'] for counters in streams)
+        return status
+
+def build_sources(settings, default_webhook_url=None):
+    """
+    Instancie une source pour chaque entrée activée des paramètres : micros
+    (section microphone activée), flux `rtsp_sources` et `saved_vban_sources`.
+
+    Returns:
+        list: Sources (AudioSource), sans doublon d'identifiant
+    """
+    settings = settings or {}
+    sources = []
+
+    microphone_settings = settings.get('microphone') or {}
+    if microphone_settings.get('enabled', False):
+        for device in microphone_devices(microphone_settings):
+            sources.append(MicrophoneSource(
+                device['device_index'], device['webhook_url'] or microphone_settings.get('webhook_url') or default_webhook_url,
+                device['name']
+            ))
+
+    for source in settings.get('rtsp_sources') or []:
+        if not source.get('enabled', False) or not source.get('url'):
+            continue
+        options = {key: source[key] for key in RTSPSource.STREAM_OPTIONS if source.get(key)}
+        sources.append(RTSPSource(
+            source['url'], source.get('webhook_url') or default_webhook_url, source.get('name'), **options
+        ))
+
+    for source in settings.get('saved_vban_sources') or []:
+        if not source.get('enabled', True) or not source.get('ip'):
+            continue
+        sources.append(VBANSource(
+            source['ip'], source.get('stream_name'), source.get('webhook_url') or default_webhook_url,
+            source.get('name')
+        ))
+
+    unique = {}
+    for source in sources:
+        if source.source_id in unique:
+            logging.warning(f"Source {source.source_id} configurée plusieurs fois, entrée ignorée")
+            continue
+        unique[source.source_id] = source
+    return list(unique.values())
+
+class DetectionPipeline:
+    """
+    Exécute toutes les sources audio configurées en même temps sur un seul
+    moteur d'inférence (`AudioDetector` ou graphe d'étapes `StageGraph`).
+
+    `callbacks_factory(source)` renvoie les callbacks (détection, labels) de
+    chaque source. Le démarrage d'une source qui échoue (micro absent...) est
+    journalisé et n'empêche pas les autres de tourner.
+    """
+
+    def __init__(self, detector, callbacks_factory=None):
+        self.detector = detector
+        self.callbacks_factory = callbacks_factory or (lambda source: (None, None))
+        self.sources = {}
+        self.running = False
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()
+
+    def start(self, sources=()):
+        self.detector.start()
+        self.running = True
+        for source in sources:
+            self.add_source(source)
+        return self
+
+    def add_source(self, source):
+        """Ajoute une source au moteur d'inférence et la démarre"""
+        with self._lock:
+            current = self.sources.get(source.source_id)
+            if current is not None and current.state != 'error':
+                return False
+            self.sources[source.source_id] = source
+        source.native_rate = getattr(self.detector, 'accepts_native_rate', False)
+        detection_callback, labels_callback = self.callbacks_factory(source)
+        self.detector.add_source(
+            source_id=source.source_id,
+            detection_callback=detection_callback,
+            labels_callback=labels_callback
+        )
+        source.state = 'starting'
+        try:
+            source.start(self.detector.process_audio)
+        except Exception as e:
+            # La source reste listée (état error) mais ne reçoit plus d'analyse
+            source.state = 'error'
+            source.last_error = str(e)
+            logging.error(f"Impossible de démarrer la source {source.source_id}: {e}")
+            try:
+                source.stop()
+            except Exception:
+                pass
+            self.detector.remove_source(source.source_id)
+            return False
+        source.state = 'running'
+        source.started_at = time.time()
+        logging.info(f"Source {source.kind} démarrée: {source.source_id}")
+        return True
+
+    def remove_source(self, source_id):
+        """Arrête une source et la retire du moteur d'inférence"""
+        with self._lock:
+            source = self.sources.pop(source_id, None)
+        if source is None:
+            return False
+        if source.state == 'running':
+            try:
+                source.stop()
+            except Exception as e:
+                logging.error(f"Erreur à l'arrêt de la source {source_id}: {e}")
+        source.state = 'stopped'
+        self.detector.remove_source(source_id)
+        logging.info(f"Source {source.kind} arrêtée: {source_id}")
+        return True
+
+    def reconcile(self, sources):
+        """
+        Applique une nouvelle liste de sources à la détection en cours, sans
+        toucher aux sources inchangées : seules les sources ajoutées, retirées
+        ou dont la configuration a changé sont démarrées ou arrêtées. Un
+        changement de webhook ou de nom est appliqué sur place. Une source en
+        erreur est retentée.
+
+        Returns:
+            dict: Identifiants ajoutés, retirés, redémarrés et mis à jour
+        """
+        desired = {source.source_id: source for source in sources}
+        changes = {'added': [], 'removed': [], 'restarted': [], 'updated': []}
+        with self._reconcile_lock:
+            with self._lock:
+                current = dict(self.sources)
+            for source_id in current:
+                if source_id not in desired:
+                    self.remove_source(source_id)
+                    changes['removed'].append(source_id)
+            for source_id, source in desired.items():
+                running = current.get(source_id)
+                if running is None:
+                    self.add_source(source)
+                    changes['added'].append(source_id)
+                elif running.config() != source.config() or running.state == 'error':
+                    self.remove_source(source_id)
+                    self.add_source(source)
+                    changes['restarted'].append(source_id)
+                elif (running.webhook_url, running.name) != (source.webhook_url, source.name):
+                    running.webhook_url = source.webhook_url
+                    running.name = source.name
+                    changes['updated'].append(source_id)
+        if any(changes.values()):
+            logging.info(f"Sources mises à jour à chaud: {changes}")
+        return changes
+
+    def stop(self):
+        for source_id in list(self.sources):
+            self.remove_source(source_id)
+        self.running = False
+        self.detector.stop()
+
+    def active_sources(self):
+        """Sources effectivement démarrées"""
+        with self._lock:
+            return [source for source in self.sources.values() if source.state == 'running']
+
+    def status(self):
+        with self._lock:
+            sources = list(self.sources.values())
+        return {source.source_id: source.status() for source in sources}
@@ -1,5 +1,5 @@
+import argparse
 import ffmpeg
-import numpy as np
 from subprocess import TimeoutExpired
 
 def read_audio_from_rtsp(rtsp_url, output_file):
@@ -30,9 +30,13 @@ def read_audio_from_rtsp(rtsp_url, output_file):
 
     print(f"Audio saved to {output_file}")
 
-# Exemple d'utilisation
-rtsp_url = "rtsp://localhost:8554/mic"
-output_file = "recorded_audio.wav"
+if __name__ == "__main__":
+    # Par défaut le flux micro du MediaMTX local ; tester sans caméra avec
+    # `python stream_test_server.py fichier.wav --rtsp --port 8554`
+    parser = argparse.ArgumentParser(description="Enregistre l'audio d'un flux RTSP dans un WAV")
+    parser.add_argument('rtsp_url', nargs='?', default="rtsp://localhost:8554/mic")
+    parser.add_argument('output_file', nargs='?', default="recorded_audio.wav")
+    args = parser.parse_args()
 
-read_audio_from_rtsp(rtsp_url, output_file)
+    read_audio_from_rtsp(args.rtsp_url, args.output_file)
 
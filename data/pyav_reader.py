@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from ffmpeg_reader import DEFAULT_PROFILE, StreamStallError, ingest_input_options
+
+try:
+    import av
+except ImportError:
+    av = None
+
+def pyav_available():
+    """Indique si le backend de décodage PyAV (bindings libav) est installé"""
+    return av is not None
+
+class DecoderPool:
+    """
+    Pool de threads de décodage partagé par tous les flux PyAV.
+
+    Le nombre de décodages simultanés est borné par `max_workers`, quel que
+    soit le nombre de caméras ; chaque flux soumet ses tâches de décodage au
+    pool au lieu d'avoir son propre processus ffmpeg.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pyav-decode')
+
+    @classmethod
+    def shared(cls):
+        """Pool commun à tous les lecteurs PyAV du processus"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def submit(self, fn, *args):
+        return self.executor.submit(fn, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+class PyAVAudioReader:
+    """
+    Lecteur audio en processus via PyAV : démultiplexe, décode et rééchantillonne
+    (float32 mono, `sample_rate`) sans processus ffmpeg ni copie dans un tube.
+
+    Même interface que `FFmpegAudioReader` : `start()`, `read()` qui renvoie un
+    bloc de `chunk_samples` échantillons dans un tampon réutilisé (ou None en
+    fin de flux), `close()`, itération, `last_error`, `first_sample_at`.
+    Le décodage s'exécute sur le `DecoderPool` partagé ; une lecture qui ne
+    produit rien avant l'échéance lève StreamStallError.
+    """
+
+    def __init__(self, url, sample_rate=16000, chunk_samples=1600, startup_timeout=10.0, stall_timeout=3.0,
+                 profile=DEFAULT_PROFILE, transport='tcp', pool=None):
+        if av is None:
+            raise RuntimeError("PyAV n'est pas installé (pip install av)")
+        self.url = url
+        self.sample_rate = sample_rate
+        self.chunk_samples = chunk_samples
+        self.startup_timeout = startup_timeout
+        self.stall_timeout = stall_timeout
+        self.options = {key: str(value) for key, value in ingest_input_options(url, profile, transport).items()}
+        self.pool = pool or DecoderPool.shared()
+        self.container = None
+        self.last_error = None
+        self.started_at = None
+        self.first_sample_at = None
+        self._packets = None
+        self._resampler = None
+        self._chunk = np.empty(chunk_samples, dtype=np.float32)
+        # Échantillons décodés en trop pour le bloc courant
+        self._leftover = np.empty(0, dtype=np.float32)
+        self._eof = False
+        self._closed = False
+        self._decode_lock = threading.Lock()
+
+    def start(self):
+        """Ouvre le flux (connexion et analyse) dans le pool de décodage"""
+        self.started_at = time.monotonic()
+        future = self.pool.submit(self._open)
+        try:
+            future.result(timeout=self.startup_timeout)
+        except FutureTimeoutError:
+            self.close()
+            raise StreamStallError(f"Ouverture de {self.url} trop longue")
+        return self
+
+    def _open(self):
+        container = av.open(
+            self.url, options=self.options, timeout=(self.startup_timeout, self.stall_timeout)
+        )
+        if self._closed:
+            # Ouverture abandonnée entre-temps (échéance de démarrage dépassée)
+            container.close()
+            return
+        self.container = container
+        stream = self.container.streams.audio[0]
+        stream.thread_type = 'AUTO'
+        self._packets = self.container.demux(stream)
+        self._resampler = av.AudioResampler(format='flt', layout='mono', rate=self.sample_rate)
+
+    def _fill(self):
+        """Tâche du pool : remplit le bloc courant, renvoie le nombre d'échantillons écrits"""
+        with self._decode_lock:
+            filled = min(len(self._leftover), self.chunk_samples)
+            self._chunk[:filled] = self._leftover[:filled]
+            self._leftover = self._leftover[filled:]
+            while filled < self.chunk_samples and not self._eof and not self._closed:
+                try:
+                    packet = next(self._packets)
+                except StopIteration:
+                    packet = None
+                frames = []
+                if packet is not None:
+                    frames = [
+                        resampled
+                        for frame in packet.decode()
+                        for resampled in self._resampler.resample(frame)
+                    ]
+                if packet is None or packet.size == 0:
+                    # Fin du flux (paquet de vidage du décodeur) : vider le rééchantillonneur
+                    self._eof = True
+                    frames += self._resampler.resample(None)
+                for frame in frames:
+                    samples = frame.to_ndarray().reshape(-1)
+                    if self.first_sample_at is None and len(samples):
+                        self.first_sample_at = time.monotonic()
+                    take = min(len(samples), self.chunk_samples - filled)
+                    self._chunk[filled:filled + take] = samples[:take]
+                    filled += take
+                    if take < len(samples):
+                        self._leftover = np.concatenate((self._leftover, samples[take:]))
+            return filled
+
+    def read(self, timeout=None):
+        """
+        Lit un bloc de `chunk_samples` échantillons.
+
+        Returns:
+            np.ndarray: Bloc float32 mono (tampon réutilisé), ou None en fin de flux
+
+        Raises:
+            StreamStallError: Aucune donnée décodée avant l'échéance
+        """
+        if self.container is None or (self._eof and not len(self._leftover)):
+            return None
+        if timeout is None:
+            timeout = self.stall_timeout if self.first_sample_at else self.startup_timeout
+        future = self.pool.submit(self._fill)
+        try:
+            filled = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise StreamStallError(f"Aucune donnée depuis {timeout:.1f}s")
+        except av.error.FFmpegError as e:
+            self.last_error = str(e)
+            if isinstance(e, (av.error.ExitError, av.error.EOFError)):
+                return None
+            if 'timed out' in str(e).lower() or isinstance(e, av.error.BlockingIOError):
+                raise StreamStallError(str(e))
+            raise
+        if filled == 0:
+            return None
+        return self._chunk[:filled]
+
+    def close(self):
+        """Ferme le flux ; une tâche de décodage en cours se termine d'elle-même"""
+        self._closed = True
+        container, self.container = self.container, None
+        if container is None:
+            return
+        # Attendre la fin d'un éventuel décodage en cours avant de libérer le conteneur
+        if self._decode_lock.acquire(timeout=self.stall_timeout + 1.0):
+            try:
+                container.close()
+            except Exception as e:
+                logging.debug(f"Fermeture PyAV de {self.url}: {e}")
+            finally:
+                self._decode_lock.release()
+
+    def __iter__(self):
+        while True:
+            chunk = self.read()
+            if chunk is None:
+                return
+            yield chunk
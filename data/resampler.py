@@ -0,0 +1,71 @@
+import functools
+import math
+
+import numpy as np
+from scipy import signal
+
+@functools.lru_cache(maxsize=None)
+def polyphase_filter(up, down, taps_per_phase=24, beta=5.0):
+    """
+    Filtre anti-repliement d'un rapport up/down, découpé en phases.
+
+    Calculé une seule fois par rapport et partagé par tous les rééchantillonneurs.
+
+    Returns:
+        np.ndarray: Matrice (up, taps) ; la ligne p contient les coefficients
+        h[p + j * up], dans l'ordre inverse pour un produit avec la fenêtre
+        d'entrée en ordre chronologique
+    """
+    taps = math.ceil(taps_per_phase * max(up, down) / up)
+    h = signal.firwin(taps * up, 1.0 / max(up, down), window=('kaiser', beta)) * up
+    phases = h.reshape(taps, up).T[:, ::-1]
+    phases = np.ascontiguousarray(phases, dtype=np.float32)
+    phases.setflags(write=False)
+    return phases
+
+class PolyphaseResampler:
+    """
+    Rééchantillonneur polyphase avec état : les blocs successifs d'un même
+    flux sont convertis sans discontinuité (l'historique du filtre et la phase
+    sont conservés d'un bloc à l'autre).
+
+    Un rééchantillonneur par flux ; les filtres sont partagés via `polyphase_filter`.
+    """
+
+    def __init__(self, input_rate, output_rate, taps_per_phase=24):
+        self.input_rate = int(input_rate)
+        self.output_rate = int(output_rate)
+        g = math.gcd(self.input_rate, self.output_rate)
+        self.up = self.output_rate // g
+        self.down = self.input_rate // g
+        # Même fréquence : pas de filtre
+        self.phases = None if self.passthrough else polyphase_filter(self.up, self.down, taps_per_phase)
+        self.taps = 1 if self.phases is None else self.phases.shape[1]
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        # Position du prochain échantillon de sortie, en 1/up d'échantillon d'entrée depuis le début du bloc
+        self._position = 0
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def process(self, data):
+        """
+        Convertit un bloc d'échantillons mono.
+
+        Returns:
+            np.ndarray: Échantillons float32 à `output_rate`
+        """
+        data = np.asarray(data, dtype=np.float32).reshape(-1)
+        if self.passthrough:
+            return data.copy()
+        n = len(data)
+        buffer = np.concatenate((self._history, data))
+        count = max(0, -(-(n * self.up - self._position) // self.down))
+        positions = self._position + np.arange(count) * self.down
+        # windows[i] couvre les entrées i - taps + 1 .. i du bloc
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps)
+        output = np.einsum('kj,kj->k', self.phases[positions % self.up], windows[positions // self.up])
+        self._position += count * self.down - n * self.up
+        self._history = buffer[len(buffer) - (self.taps - 1):].copy()
+        return output.astype(np.float32, copy=False)
@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+
+from ffmpeg_reader import FFmpegAudioReader, StreamStallError, DEFAULT_PROFILE
+from pyav_reader import PyAVAudioReader, pyav_available
+
+# Backends de décodage : processus ffmpeg par flux, ou PyAV en processus (optionnel)
+DECODE_BACKENDS = ('ffmpeg', 'pyav')
+
+def rtsp_source_id(source):
+    """Identifiant de source utilisé par la détection pour une entrée de rtsp_sources"""
+    return f"rtsp_{source['url']}"
+
+class RTSPStreamWorker:
+    """
+    Lit un flux RTSP dans son propre thread et pousse l'audio vers le moteur
+    d'inférence. En cas de fin de flux ou d'erreur, le lecteur est relancé avec
+    un délai exponentiel (initial_backoff, doublé jusqu'à max_backoff), remis à
+    zéro dès que le flux a tenu `stable_after` secondes. Un flux qui ne livre
+    plus de données pendant `stall_timeout` secondes est considéré bloqué :
+    son processus ffmpeg est tué et relancé.
+
+    Avec backend='pyav' (si PyAV est installé), le flux est décodé en
+    processus sur le pool de décodage partagé au lieu d'un processus ffmpeg.
+    """
+
+    def __init__(self, source_id, url, on_audio, reader_factory=None, sample_rate=16000,
+                 chunk_samples=1600, initial_backoff=1.0, max_backoff=30.0, stable_after=10.0,
+                 startup_timeout=10.0, stall_timeout=3.0, profile=DEFAULT_PROFILE, transport='tcp',
+                 backend='ffmpeg'):
+        self.source_id = source_id
+        self.url = url
+        self.on_audio = on_audio
+        if backend not in DECODE_BACKENDS:
+            raise ValueError(f"Backend de décodage inconnu: {backend}")
+        if backend == 'pyav' and not pyav_available():
+            logging.warning(f"PyAV non installé, décodage de {source_id} via ffmpeg")
+            backend = 'ffmpeg'
+        self.backend = backend
+        reader_class = PyAVAudioReader if backend == 'pyav' else FFmpegAudioReader
+        self.reader_factory = reader_factory or (
+            lambda url: reader_class(
+                url, sample_rate, chunk_samples, startup_timeout, stall_timeout, profile, transport
+            ).start()
+        )
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+
+        self.state = 'stopped'
+        self.restarts = 0
+        self.stalls = 0
+        self.samples = 0
+        self.last_error = None
+        self.last_audio_time = None
+        self.backoff = initial_backoff
+        self._reader = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f'rtsp-{self.source_id}')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        reader = self._reader
+        if reader is not None:
+            # Débloquer une lecture en cours
+            reader.close()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        self.state = 'stopped'
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.state = 'connecting'
+            connected_at = time.monotonic()
+            try:
+                self._reader = self.reader_factory(self.url)
+                if self._stop_event.is_set():
+                    break
+                for chunk in self._reader:
+                    if self._stop_event.is_set():
+                        break
+                    if len(chunk) == 0:
+                        continue
+                    self.state = 'streaming'
+                    self.samples += len(chunk)
+                    self.last_audio_time = time.time()
+                    self.on_audio(chunk, self.source_id)
+                else:
+                    self.last_error = getattr(self._reader, 'last_error', None) or 'fin du flux'
+            except StreamStallError as e:
+                self.stalls += 1
+                self.last_error = f"flux bloqué: {e}"
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+                self.last_error = str(e)
+                logging.error(f"Erreur sur le flux RTSP {self.source_id}: {e}")
+            finally:
+                reader, self._reader = self._reader, None
+                if reader is not None:
+                    reader.close()
+
+            if self._stop_event.is_set():
+                break
+
+            # Flux resté stable assez longtemps : repartir du délai initial
+            if time.monotonic() - connected_at >= self.stable_after:
+                self.backoff = self.initial_backoff
+            self.state = 'backoff'
+            self.restarts += 1
+            logging.warning(
+                f"Flux RTSP {self.source_id} interrompu ({self.last_error}), "
+                f"reconnexion dans {self.backoff:.1f}s"
+            )
+            if self._stop_event.wait(self.backoff):
+                break
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+
+        self.state = 'stopped'
+
+    def status(self):
+        return {
+            'source_id': self.source_id,
+            'url': self.url,
+            'backend': self.backend,
+            'state': self.state,
+            'restarts': self.restarts,
+            'stalls': self.stalls,
+            'samples': self.samples,
+            'last_audio_time': self.last_audio_time,
+            'last_error': self.last_error,
+            'backoff': self.backoff
+        }
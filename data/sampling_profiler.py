@@ -0,0 +1,148 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+class ProfilerBusyError(Exception):
+    """Un profil est déjà en cours"""
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage de tous les threads Python du processus.
+
+    Un thread dédié relève la pile de chaque thread (`sys._current_frames`)
+    toutes les `interval` secondes, sans instrumenter le code profilé : le
+    coût est celui de la lecture des piles, indépendant de la charge. Le temps
+    passé dans du code natif (inférence MediaPipe, décodage) est attribué à la
+    fonction Python qui l'a appelé. Un seul profil à la fois.
+    """
+
+    MAX_DURATION = 120.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last_result = None  # Dernier profil lancé par `start`
+        self._started = None
+        self._duration = None
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def start(self, duration, interval=0.01, lines=False):
+        """
+        Lance un profil sur un thread dédié et rend la main aussitôt ; le résultat
+        est disponible dans `last_result` à la fin (voir `status`).
+
+        Returns:
+            float: Durée effective du profil en secondes
+
+        Raises:
+            ProfilerBusyError: Un profil est déjà en cours
+        """
+        duration = min(max(float(duration), interval), self.MAX_DURATION)
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Un profil est déjà en cours")
+        self._started = time.monotonic()
+        self._duration = duration
+
+        def run():
+            try:
+                self.last_result = self._sample(duration, interval, lines)
+            finally:
+                self._lock.release()
+        try:
+            threading.Thread(target=run, name='sampling-profiler', daemon=True).start()
+        except Exception:
+            self._lock.release()
+            raise
+        return duration
+
+    def status(self):
+        """État du profil lancé par `start` : en cours (temps restant) ou terminé"""
+        if self.running and self._started is not None:
+            remaining = max(0.0, self._started + self._duration - time.monotonic())
+            return {'running': True, 'remaining': round(remaining, 3)}
+        return {'running': False, 'available': self.last_result is not None}
+
+    def profile(self, duration, interval=0.01, lines=False):
+        """
+        Échantillonne les piles pendant `duration` secondes.
+
+        Args:
+            lines (bool): Distinguer les lignes d'une même fonction
+
+        Returns:
+            dict: {'duration', 'interval', 'samples', 'threads', 'stacks'} ; `stacks`
+            associe chaque pile repliée (thread;racine;...;feuille) à son nombre d'échantillons
+
+        Raises:
+            ProfilerBusyError: Un profil est déjà en cours
+        """
+        duration = min(max(float(duration), interval), self.MAX_DURATION)
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Un profil est déjà en cours")
+        try:
+            return self._sample(duration, interval, lines)
+        finally:
+            self._lock.release()
+
+    def _sample(self, duration, interval, lines):
+        me = threading.get_ident()
+        stacks = collections.Counter()
+        labels = {}  # Cache des libellés de frames : (code, ligne) → texte
+        samples = 0
+        threads = {}
+        started = time.monotonic()
+        deadline = started + duration
+        next_sample = started
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                name = names.get(ident, f"thread-{ident}")
+                threads[name] = threads.get(name, 0) + 1
+                path = []
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code, frame.f_lineno if lines else 0)
+                    label = labels.get(key)
+                    if label is None:
+                        label = labels[key] = _frame_label(code, key[1])
+                    path.append(label)
+                    frame = frame.f_back
+                path.append(name)
+                stacks[';'.join(reversed(path))] += 1
+            samples += 1
+            next_sample += interval
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+        return {
+            'duration': round(time.monotonic() - started, 3),
+            'interval': interval,
+            'samples': samples,
+            'threads': threads,
+            'stacks': dict(stacks),
+        }
+
+def _frame_label(code, lineno=0):
+    filename = os.path.basename(code.co_filename)
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({filename}:{lineno})" if lineno else f"{name} ({filename})"
+
+def collapsed_stacks(profile):
+    """Format « piles repliées » (une pile et son nombre par ligne), lu par flamegraph.pl, speedscope, inferno"""
+    return ''.join(
+        f"{stack} {count}\n"
+        for stack, count in sorted(profile['stacks'].items(), key=lambda item: item[1], reverse=True)
+    )
+
+_profiler = SamplingProfiler()
+
+def get_profiler():
+    """Profileur partagé par l'API"""
+    return _profiler
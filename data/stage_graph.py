@@ -0,0 +1,617 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from classifiers import CLASSIFIER_BACKENDS, create_classifier
+from resampler import PolyphaseResampler
+
+@dataclass
+class Frame:
+    """Bloc d'échantillons mono d'une source (type 'audio') ou fenêtre complète à classer (type 'window')"""
+    source_id: str
+    samples: np.ndarray
+    sample_rate: int
+    timestamp: float
+
+@dataclass
+class Control:
+    """Message de contrôle transmis à toutes les étapes, dans l'ordre des données"""
+    action: str
+    source_id: str
+
+class Stage:
+    """
+    Étape du graphe de traitement.
+
+    `consumes` et `produces` sont les types des éléments reçus et émis
+    ('audio', 'window', 'scores', 'event', None pour une étape terminale) ;
+    le graphe vérifie à la construction que chaque lien relie des types
+    identiques. `process(item)` renvoie les éléments à transmettre aux étapes
+    suivantes. L'état par source est libéré par `forget(source_id)`.
+    """
+
+    type = None
+    consumes = None
+    produces = None
+
+    def __init__(self, name, **options):
+        if options:
+            raise ValueError(f"Option(s) inconnue(s) pour l'étape {name} ({self.type}): {', '.join(options)}")
+        self.name = name
+
+    def start(self):
+        """Prépare l'étape, dans le thread ou le processus où elle s'exécute"""
+
+    def stop(self):
+        pass
+
+    def process(self, item):
+        raise NotImplementedError
+
+    def forget(self, source_id):
+        pass
+
+class ResampleStage(Stage):
+    """Convertit chaque source à `sample_rate`, avec un rééchantillonneur polyphase par source et par fréquence"""
+
+    type = 'resample'
+    consumes = produces = 'audio'
+
+    def __init__(self, name, sample_rate=16000, **options):
+        super().__init__(name, **options)
+        self.sample_rate = int(sample_rate)
+        self._resamplers = {}
+
+    def process(self, frame):
+        if frame.sample_rate == self.sample_rate:
+            return [frame]
+        key = (frame.source_id, frame.sample_rate)
+        resampler = self._resamplers.get(key)
+        if resampler is None:
+            resampler = self._resamplers[key] = PolyphaseResampler(frame.sample_rate, self.sample_rate)
+        return [Frame(frame.source_id, resampler.process(frame.samples), self.sample_rate, frame.timestamp)]
+
+    def forget(self, source_id):
+        for key in [key for key in self._resamplers if key[0] == source_id]:
+            del self._resamplers[key]
+
+class GateStage(Stage):
+    """
+    Porte de bruit : les blocs dont le niveau RMS reste sous `threshold_db`
+    (dBFS) sont abandonnés, sauf pendant `hold` secondes après le dernier bloc
+    sonore pour laisser la fenêtre d'analyse se compléter.
+    """
+
+    type = 'gate'
+    consumes = produces = 'audio'
+
+    def __init__(self, name, threshold_db=-50.0, hold=1.0, **options):
+        super().__init__(name, **options)
+        self.threshold = 10 ** (float(threshold_db) / 20)
+        self.hold = float(hold)
+        self.gated = {}  # Blocs abandonnés par source
+        self._open_until = {}
+
+    def process(self, frame):
+        samples = frame.samples
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float32)))) if len(samples) else 0.0
+        if rms >= self.threshold:
+            self._open_until[frame.source_id] = frame.timestamp + self.hold
+        elif frame.timestamp > self._open_until.get(frame.source_id, 0):
+            self.gated[frame.source_id] = self.gated.get(frame.source_id, 0) + 1
+            return []
+        return [frame]
+
+    def forget(self, source_id):
+        self._open_until.pop(source_id, None)
+        self.gated.pop(source_id, None)
+
+class WindowStage(Stage):
+    """Fenêtre glissante par source : émet une fenêtre YAMNet complète tous les `hop` secondes"""
+
+    type = 'window'
+    consumes = 'audio'
+    produces = 'window'
+
+    def __init__(self, name, sample_rate=16000, window=0.975, hop=0.5, **options):
+        super().__init__(name, **options)
+        self.sample_rate = int(sample_rate)
+        self.window_size = int(float(window) * self.sample_rate)
+        self.hop_size = max(1, int(float(hop) * self.sample_rate))
+        self._sources = {}
+
+    def process(self, frame):
+        if frame.sample_rate != self.sample_rate:
+            raise ValueError(
+                f"{frame.source_id}: audio à {frame.sample_rate} Hz, {self.sample_rate} Hz attendus "
+                "(ajouter une étape resample avant l'étape window)"
+            )
+        state = self._sources.get(frame.source_id)
+        if state is None:
+            state = self._sources[frame.source_id] = {
+                'buffer': np.zeros(self.window_size, dtype=np.float32), 'filled': 0, 'since_last_window': 0
+            }
+        buffer = state['buffer']
+        data = np.asarray(frame.samples, dtype=np.float32).reshape(-1)
+        n = len(data)
+        if n >= self.window_size:
+            buffer[:] = data[-self.window_size:]
+        elif n > 0:
+            buffer[:-n] = buffer[n:]
+            buffer[-n:] = data
+        state['filled'] = min(self.window_size, state['filled'] + n)
+        state['since_last_window'] += n
+        if state['filled'] < self.window_size or state['since_last_window'] < self.hop_size:
+            return []
+        state['since_last_window'] = 0
+        return [Frame(frame.source_id, buffer.copy(), self.sample_rate, frame.timestamp)]
+
+    def forget(self, source_id):
+        self._sources.pop(source_id, None)
+
+class ClassifyStage(Stage):
+    """
+    Classe chaque fenêtre (YAMNet par défaut) ; le modèle est chargé là où l'étape s'exécute.
+    `backend` et `backend_options` choisissent le classificateur (voir `classifiers`).
+    """
+
+    type = 'classify'
+    consumes = 'window'
+    produces = 'scores'
+
+    def __init__(self, name, model_path=None, max_results=5, score_threshold=0.3, backend='mediapipe',
+                 backend_options=None, **options):
+        super().__init__(name, **options)
+        if backend not in CLASSIFIER_BACKENDS:
+            raise ValueError(f"Backend de classification inconnu pour l'étape {name}: {backend}")
+        self.model_path = model_path
+        self.max_results = int(max_results)
+        self.score_threshold = float(score_threshold)
+        self.backend = backend
+        self.backend_options = dict(backend_options or {})
+        self.classifier = None
+
+    def start(self):
+        self.classifier = create_classifier(
+            self.backend, self.model_path, self.max_results, self.score_threshold, **self.backend_options
+        )
+
+    def stop(self):
+        if self.classifier is not None:
+            self.classifier.close()
+            self.classifier = None
+
+    def process(self, frame):
+        categories = self.classifier.classify(frame.samples, frame.sample_rate)
+        return [{'source_id': frame.source_id, 'timestamp': frame.timestamp, 'categories': categories}]
+
+class RulesStage(Stage):
+    """
+    Règles de détection : un clap est signalé quand son score (somme des
+    scores des labels pondérés par `weights`) dépasse `threshold`, au plus une
+    fois par `delay` secondes et par source. Les labels les plus probables sont
+    émis pour l'affichage.
+    """
+
+    type = 'rules'
+    consumes = 'scores'
+    produces = 'event'
+
+    def __init__(self, name, threshold=0.3, delay=1.0, weights=None, **options):
+        super().__init__(name, **options)
+        self.threshold = float(threshold)
+        self.delay = float(delay)
+        self.weights = {label: float(weight) for label, weight in weights.items()} if weights else None
+        self._last_detection = {}
+
+    def process(self, scores):
+        from audio_detector import clap_score, top_labels
+        source_id = scores['source_id']
+        events = []
+        labels = top_labels(scores['categories'])
+        if labels:
+            events.append({'kind': 'labels', 'source_id': source_id, 'labels': labels})
+        score = clap_score(scores['categories'], self.weights)
+        # Horodatage de l'audio (heure d'arrivée en direct, position dans le fichier hors ligne)
+        timestamp = scores['timestamp']
+        last = self._last_detection.get(source_id)
+        if score > self.threshold and (last is None or timestamp - last > self.delay):
+            self._last_detection[source_id] = timestamp
+            events.append({'kind': 'clap', 'source_id': source_id, 'timestamp': timestamp, 'score': float(score)})
+        return events
+
+    def forget(self, source_id):
+        self._last_detection.pop(source_id, None)
+
+class SinkStage(Stage):
+    """Transmet les événements aux callbacks de détection et de labels de chaque source"""
+
+    type = 'sink'
+    consumes = 'event'
+    produces = None
+
+    def __init__(self, name, events=('clap', 'labels'), callbacks=None, **options):
+        super().__init__(name, **options)
+        self.events = tuple(events)
+        self.callbacks = callbacks if callbacks is not None else {}
+        self.detections = {}  # Claps transmis par source
+
+    def process(self, event):
+        if event['kind'] not in self.events:
+            return []
+        detection_callback, labels_callback = self.callbacks.get(event['source_id'], (None, None))
+        if event['kind'] == 'clap':
+            self.detections[event['source_id']] = self.detections.get(event['source_id'], 0) + 1
+        if event['kind'] == 'clap' and detection_callback:
+            detection_callback({key: event[key] for key in ('timestamp', 'score', 'source_id')})
+        elif event['kind'] == 'labels' and labels_callback:
+            labels_callback(event['labels'])
+        return []
+
+    def forget(self, source_id):
+        self.detections.pop(source_id, None)
+
+STAGE_TYPES = {stage.type: stage for stage in (ResampleStage, GateStage, WindowStage, ClassifyStage, RulesStage, SinkStage)}
+PLACEMENTS = ('inline', 'thread', 'process')
+
+# Équivalent du moteur AudioDetector : fenêtrage et règles dans le thread de la source, inférence sur un thread dédié
+DEFAULT_GRAPH = {
+    'stages': [
+        {'name': 'window', 'type': 'window'},
+        {'name': 'classify', 'type': 'classify', 'placement': 'thread', 'queue_size': 64},
+        {'name': 'rules', 'type': 'rules'},
+        {'name': 'sink', 'type': 'sink'},
+    ]
+}
+
+def _process_stage_main(stage, inbox, outbox):
+    """Boucle d'une étape placée dans un processus séparé"""
+    stage.start()
+    try:
+        while True:
+            item = inbox.get()
+            if item is None:
+                break
+            if isinstance(item, Control):
+                stage.forget(item.source_id)
+                outbox.put(([item], 0.0))
+                continue
+            started = time.perf_counter()
+            try:
+                outputs = stage.process(item)
+            except Exception as e:
+                logging.error(f"Erreur dans l'étape {stage.name}: {e}")
+                outputs = []
+            outbox.put((outputs, time.perf_counter() - started))
+    finally:
+        stage.stop()
+
+class StageRunner:
+    """
+    Exécute une étape selon son placement :
+    - `inline` : dans le thread de l'étape précédente (ou de la source) ;
+    - `thread` : sur un thread dédié, derrière une file bornée (les éléments
+      les plus anciens sont abandonnés quand elle est pleine) ;
+    - `process` : dans un processus séparé, derrière une file bornée (les
+      nouveaux éléments sont abandonnés quand elle est pleine).
+    """
+
+    def __init__(self, stage, placement='inline', queue_size=64):
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Placement inconnu pour l'étape {stage.name}: {placement} ({', '.join(PLACEMENTS)})")
+        self.stage = stage
+        self.placement = placement
+        self.queue_size = int(queue_size)
+        self.downstream = []
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.running = False
+        self._queue = None
+        self._threads = []
+        self._process = None
+
+    def start(self):
+        self.running = True
+        if self.placement == 'process':
+            context = multiprocessing.get_context('spawn')
+            self._queue = context.Queue(maxsize=self.queue_size)
+            self._results = context.Queue()
+            self._process = context.Process(
+                target=_process_stage_main, args=(self.stage, self._queue, self._results),
+                name=f"stage-{self.stage.name}", daemon=True
+            )
+            self._process.start()
+            self._threads = [threading.Thread(target=self._collect, name=f"stage-{self.stage.name}-results")]
+        else:
+            self.stage.start()
+            if self.placement == 'thread':
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._threads = [threading.Thread(target=self._run, name=f"stage-{self.stage.name}")]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._process is not None:
+            try:
+                self._queue.put(None, timeout=1.0)
+            except queue.Full:
+                pass
+            self._process.join(timeout=5.0)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+            # Ne pas bloquer la sortie sur des éléments qu'aucun processus ne lira
+            self._queue.cancel_join_thread()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+        if self.placement != 'process':
+            self.stage.stop()
+
+    def submit(self, item):
+        if isinstance(item, Control):
+            # Les messages de contrôle ne sont jamais abandonnés
+            if self._queue is not None:
+                self._queue.put(item)
+            else:
+                self.stage.forget(item.source_id)
+                self._forward([item])
+            return
+        if self.placement == 'inline':
+            self._execute(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if self.placement == 'thread':
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                pass
+        self.dropped += 1
+        if self.dropped % 100 == 1:
+            logging.warning(f"File de l'étape {self.stage.name} pleine, {self.dropped} éléments abandonnés")
+
+    def _execute(self, item):
+        started = time.perf_counter()
+        try:
+            outputs = self.stage.process(item)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Erreur dans l'étape {self.stage.name}: {e}")
+            return
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+        self.processed += 1
+        self._forward(outputs)
+
+    def _forward(self, outputs):
+        for output in outputs:
+            for runner in self.downstream:
+                runner.submit(output)
+
+    def _run(self):
+        while self.running:
+            try:
+                item = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if isinstance(item, Control):
+                self.stage.forget(item.source_id)
+                self._forward([item])
+            else:
+                self._execute(item)
+
+    def _collect(self):
+        while self.running or (self._process is not None and self._process.is_alive()):
+            try:
+                outputs, busy = self._results.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if not any(isinstance(output, Control) for output in outputs):
+                self.processed += 1
+                self.busy_seconds += busy
+            self._forward(outputs)
+
+    def status(self):
+        return {
+            'type': self.stage.type,
+            'placement': self.placement,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'queued': self._queue.qsize() if self._queue is not None and self.placement == 'thread' else 0,
+        }
+
+class StageGraph:
+    """
+    Graphe d'étapes décrit dans les paramètres (clé `pipeline_graph`) :
+    ingestion → rééchantillonnage → porte de bruit → fenêtrage → classification
+    → règles → sorties, dans l'ordre et avec le placement choisis.
+
+    Même interface que `AudioDetector` (add_source, remove_source,
+    process_audio, start, stop) : le graphe remplace le moteur d'inférence
+    dans `DetectionPipeline` sans changer les sources.
+    """
+
+    def __init__(self, runners, entry):
+        self.runners = runners
+        self.entry = entry
+        self.callbacks = {}
+        self.counters = {}  # Blocs et échantillons reçus par source
+        self.running = False
+        self.lock = threading.Lock()
+        self.sample_rate = 16000
+
+    @classmethod
+    def from_settings(cls, graph_settings, model_path=None):
+        """
+        Construit le graphe décrit par `{'stages': [{name, type, placement, queue_size, next, ...options}]}`.
+
+        Les étapes sont chaînées dans l'ordre de la liste, sauf si `next`
+        (nom ou liste de noms) désigne explicitement les suivantes. La première
+        étape reçoit l'audio des sources.
+
+        Raises:
+            ValueError: Description invalide (type ou lien inconnu, types incompatibles, cycle)
+        """
+        stages = (graph_settings or {}).get('stages') or []
+        if not stages:
+            raise ValueError("Le graphe ne contient aucune étape")
+        graph = cls({}, None)
+        links = {}
+        for index, config in enumerate(stages):
+            config = dict(config)
+            stage_type = config.pop('type', None)
+            name = config.pop('name', None) or stage_type
+            if stage_type not in STAGE_TYPES:
+                raise ValueError(f"Type d'étape inconnu: {stage_type} ({', '.join(STAGE_TYPES)})")
+            if name in graph.runners:
+                raise ValueError(f"Nom d'étape en double: {name}")
+            placement = config.pop('placement', 'inline')
+            queue_size = config.pop('queue_size', 64)
+            following = config.pop('next', None)
+            if following is None:
+                following = [stages[index + 1].get('name') or stages[index + 1].get('type')] if index + 1 < len(stages) else []
+            elif isinstance(following, str):
+                following = [following]
+            if stage_type == 'classify':
+                config.setdefault('model_path', model_path)
+            if stage_type == 'sink':
+                if placement == 'process':
+                    raise ValueError(f"L'étape {name} appelle les callbacks des sources : placement process impossible")
+                config['callbacks'] = graph.callbacks
+            graph.runners[name] = StageRunner(STAGE_TYPES[stage_type](name, **config), placement, queue_size)
+            links[name] = following
+
+        for name, following in links.items():
+            runner = graph.runners[name]
+            for target in following:
+                if target not in graph.runners:
+                    raise ValueError(f"Étape suivante inconnue pour {name}: {target}")
+                downstream = graph.runners[target]
+                if runner.stage.produces != downstream.stage.consumes:
+                    raise ValueError(
+                        f"{name} produit '{runner.stage.produces}' mais {target} attend '{downstream.stage.consumes}'"
+                    )
+                runner.downstream.append(downstream)
+        graph._check_acyclic()
+
+        graph.entry = graph.runners[stages[0].get('name') or stages[0].get('type')]
+        if graph.entry.stage.consumes != 'audio':
+            raise ValueError(f"La première étape ({graph.entry.stage.name}) doit recevoir l'audio des sources")
+        window = next((runner.stage for runner in graph.runners.values() if isinstance(runner.stage, WindowStage)), None)
+        if window is not None:
+            graph.sample_rate = window.sample_rate
+        return graph
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(runner):
+            if runner.stage.name in done:
+                return
+            if runner.stage.name in visiting:
+                raise ValueError(f"Le graphe contient un cycle (étape {runner.stage.name})")
+            visiting.add(runner.stage.name)
+            for downstream in runner.downstream:
+                visit(downstream)
+            visiting.discard(runner.stage.name)
+            done.add(runner.stage.name)
+
+        for runner in self.runners.values():
+            visit(runner)
+
+    @property
+    def accepts_native_rate(self):
+        """Vrai si le graphe rééchantillonne lui-même : les sources peuvent livrer leur fréquence native"""
+        return any(isinstance(runner.stage, ResampleStage) for runner in self.runners.values())
+
+    def start(self):
+        if self.running:
+            return True
+        # Démarrer les étapes aval d'abord : elles sont prêtes quand les premiers éléments arrivent
+        for runner in reversed(list(self.runners.values())):
+            runner.start()
+        self.running = True
+        logging.info(
+            "Graphe de traitement démarré: "
+            + " → ".join(f"{name} ({runner.placement})" for name, runner in self.runners.items())
+        )
+        return True
+
+    def stop(self):
+        self.running = False
+        for runner in self.runners.values():
+            runner.stop()
+
+    def add_source(self, source_id, detection_callback=None, labels_callback=None):
+        with self.lock:
+            self.callbacks[source_id] = (detection_callback, labels_callback)
+            self.counters[source_id] = {'blocks': 0, 'samples': 0}
+
+    def remove_source(self, source_id):
+        with self.lock:
+            known = self.callbacks.pop(source_id, None) is not None
+            self.counters.pop(source_id, None)
+        if known and self.running:
+            # Libérer l'état de la source dans chaque étape, après ses derniers éléments
+            self.entry.submit(Control('forget', source_id))
+
+    def process_audio(self, audio_data, source_id, sample_rate=None, capture_time=None, resample_seconds=None):
+        """Point d'entrée des sources : même signature que `AudioDetector.process_audio` (sans traces de latence)"""
+        if audio_data is None or len(audio_data) == 0 or source_id not in self.callbacks:
+            return
+        # Copie : les sources réutilisent leur tampon, et une étape en aval peut le lire plus tard (file, processus)
+        samples = np.array(audio_data, dtype=np.float32).reshape(-1)
+        counters = self.counters.get(source_id)
+        if counters is not None:
+            counters['blocks'] += 1
+            counters['samples'] += len(samples)
+        self.entry.submit(Frame(source_id, samples, int(sample_rate or self.sample_rate), time.time()))
+
+    def status(self):
+        return {name: runner.status() for name, runner in self.runners.items()}
+
+    def metrics(self):
+        """
+        Compteurs du graphe, lus sans verrou, au format de `AudioDetector.metrics` :
+        files des étapes, blocs abandonnés par les portes, claps transmis
+        (les étapes placées dans un processus séparé ne sont pas visibles)
+        """
+        sources = {source_id: dict(counters) for source_id, counters in list(self.counters.items())}
+        for runner in self.runners.values():
+            if runner.placement == 'process':
+                continue
+            stage = runner.stage
+            if isinstance(stage, GateStage):
+                for source_id, gated in list(stage.gated.items()):
+                    entry = sources.setdefault(source_id, {})
+                    entry['gated'] = entry.get('gated', 0) + gated
+            elif isinstance(stage, SinkStage):
+                for source_id, detections in list(stage.detections.items()):
+                    entry = sources.setdefault(source_id, {})
+                    entry['detections'] = entry.get('detections', 0) + detections
+        return {
+            'queue_depth': sum(runner.status()['queued'] for runner in self.runners.values()),
+            'dropped_windows': sum(runner.dropped for runner in self.runners.values()),
+            'sources': sources,
+        }
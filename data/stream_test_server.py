@@ -0,0 +1,504 @@
+import argparse
+import itertools
+import logging
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+
+import numpy as np
+
+from vban_loadgen import synthetic_clap
+
+# Configuration MediaMTX fournie avec l'add-on
+MEDIAMTX_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mediamtx', 'mediamtx.yml')
+
+def write_test_wav(path, duration=10.0, sample_rate=16000, clap_every=2.0):
+    """Écrit un WAV de bruit faible ponctué de claps synthétiques (toutes les `clap_every` s dès 1 s)"""
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0.0, 0.005, int(duration * sample_rate)).astype(np.float32)
+    clap = synthetic_clap(sample_rate)
+    for t in np.arange(1.0, duration - 0.5, clap_every):
+        start = int(t * sample_rate)
+        audio[start:start + len(clap)] += clap
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+    return path
+
+class FileStreamServer:
+    """
+    Serveur de test qui diffuse un fichier audio en continu, au rythme réel,
+    via ffmpeg, à chaque client TCP qui se connecte (URL tcp://hôte:port).
+    Par défaut l'audio est encodé en AAC (ADTS), comme sur la plupart des caméras.
+
+    Sert à exercer la chaîne de lecture ffmpeg sans caméra : `stall()` gèle
+    les sessions en cours (socket ouvert, plus aucune donnée), comme une caméra
+    bloquée ; les nouvelles connexions sont servies normalement.
+    """
+
+    def __init__(self, path, host='127.0.0.1', port=0, ffmpeg_binary='ffmpeg', realtime=True, loop=True,
+                 container='adts', codec='aac'):
+        self.path = path
+        self.container = container
+        self.codec = codec
+        self.host = host
+        self.port = port
+        self.ffmpeg_binary = ffmpeg_binary
+        self.realtime = realtime
+        self.loop = loop
+        self.connections = 0
+        self.session_starts = []  # Heure (time.time) de début de chaque session
+        self._server = None
+        self._thread = None
+        self._running = False
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._initial_burst_option = None
+
+    @property
+    def url(self):
+        return f"tcp://{self.host}:{self.port}"
+
+    def start(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen(8)
+        self._server.settimeout(0.2)
+        self.port = self._server.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_loop, name='stream-test-server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _supports_option(self, option):
+        try:
+            help_text = subprocess.run(
+                [self.ffmpeg_binary, '-hide_banner', '-h', 'full'], capture_output=True, text=True, timeout=10
+            ).stdout
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return f'-{option} ' in help_text
+
+    def _ffmpeg_input(self):
+        command = [self.ffmpeg_binary, '-loglevel', 'error', '-nostdin']
+        if self.realtime:
+            command.append('-re')
+            # ffmpeg >= 6.1 envoie par défaut 0.5 s d'avance avec -re : rester au rythme réel
+            if self._initial_burst_option is None:
+                self._initial_burst_option = self._supports_option('readrate_initial_burst')
+            if self._initial_burst_option:
+                command += ['-readrate_initial_burst', '0']
+        if self.loop:
+            command += ['-stream_loop', '-1']
+        return command + ['-i', self.path]
+
+    def _ffmpeg_command(self):
+        return self._ffmpeg_input() + [
+            '-c:a', self.codec, '-flush_packets', '1', '-f', self.container, 'pipe:1'
+        ]
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            with self._lock:
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        """Sert une connexion cliente : une session ffmpeg depuis le début du fichier"""
+        session = self._open_session(conn)
+        session['process'] = subprocess.Popen(self._ffmpeg_command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._pump(session)
+
+    def _open_session(self, conn):
+        session = {'conn': conn, 'process': None, 'stalled': threading.Event()}
+        with self._lock:
+            self._sessions.append(session)
+            self.session_starts.append(time.time())
+        return session
+
+    def _pump(self, session):
+        conn, process = session['conn'], session['process']
+        try:
+            while self._running:
+                if session['stalled'].is_set():
+                    time.sleep(0.05)
+                    continue
+                data = process.stdout.read1(4096)
+                if not data:
+                    break
+                conn.sendall(data)
+        except OSError:
+            pass
+        finally:
+            self._close_session(session)
+
+    def _close_session(self, session):
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        process = session['process']
+        if process is not None:
+            process.kill()
+            process.wait()
+            if process.stdout:
+                process.stdout.close()
+        if session.get('rtp'):
+            session['rtp'].close()
+        session['conn'].close()
+
+    def stall(self):
+        """Gèle les sessions en cours : le client ne reçoit plus rien mais reste connecté"""
+        with self._lock:
+            for session in self._sessions:
+                session['stalled'].set()
+
+    def drop(self):
+        """Coupe les sessions en cours (fin de flux côté client)"""
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            try:
+                session['conn'].shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self):
+        self._running = False
+        if self._server:
+            self._server.close()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        self.drop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class RTSPTestServer(FileStreamServer):
+    """
+    Serveur RTSP de substitution (sans MediaMTX) : diffuse un fichier audio au
+    rythme réel sur rtsp://hôte:port/`stream_name`, comme une caméra.
+
+    Chaque lecture (PLAY) lance un ffmpeg qui encode et met en paquets RTP
+    (AAC par défaut) vers un port UDP local ; les paquets sont relayés au
+    client entrelacés dans la connexion RTSP (RTP/AVP/TCP, le transport par
+    défaut des lecteurs). `stall()` et `drop()` se comportent comme pour
+    `FileStreamServer`.
+    """
+
+    def __init__(self, path, host='127.0.0.1', port=0, ffmpeg_binary='ffmpeg', realtime=True, loop=True,
+                 codec='aac', stream_name='mic', sample_rate=16000):
+        super().__init__(path, host, port, ffmpeg_binary, realtime, loop, container='rtp', codec=codec)
+        self.stream_name = stream_name
+        self.sample_rate = sample_rate
+        self._sdp = None
+        self._session_ids = itertools.count(1)
+
+    @property
+    def url(self):
+        return f"rtsp://{self.host}:{self.port}/{self.stream_name}"
+
+    def start(self):
+        self._sdp = self._describe()
+        return super().start()
+
+    def _encoder_args(self):
+        return ['-c:a', self.codec, '-ar', str(self.sample_rate), '-ac', '1', '-f', 'rtp']
+
+    def _describe(self):
+        """Description SDP du flux, obtenue d'ffmpeg sur un court extrait du fichier"""
+        with tempfile.TemporaryDirectory(prefix='claptrap-rtsp-') as tmp:
+            sdp_path = os.path.join(tmp, 'stream.sdp')
+            subprocess.run(
+                [self.ffmpeg_binary, '-loglevel', 'error', '-nostdin', '-i', self.path, '-t', '0.2']
+                + self._encoder_args() + ['-sdp_file', sdp_path, 'rtp://127.0.0.1:9'],
+                check=True, capture_output=True, timeout=30
+            )
+            with open(sdp_path) as f:
+                lines = f.read().splitlines()
+        media = []
+        for line in lines[next(i for i, line in enumerate(lines) if line.startswith('m=')):]:
+            if line.startswith('m='):
+                # En RTSP le port est négocié au SETUP
+                fields = line.split(' ')
+                fields[1] = '0'
+                line = ' '.join(fields)
+            if not line.startswith('c='):
+                media.append(line)
+        return '\r\n'.join(
+            ['v=0', 'o=- 0 0 IN IP4 127.0.0.1', 's=ClapTrap test stream', 'c=IN IP4 0.0.0.0', 't=0 0',
+             'a=control:*'] + media + ['a=control:trackID=0', '']
+        ).encode()
+
+    @staticmethod
+    def _read_request(reader):
+        """Lit une requête RTSP (méthode, URI, en-têtes) en ignorant les paquets RTCP entrelacés du client"""
+        while True:
+            first = reader.read(1)
+            if not first:
+                return None
+            if first == b'$':
+                header = reader.read(3)
+                reader.read(int.from_bytes(header[1:3], 'big'))
+                continue
+            if first not in (b'\r', b'\n'):
+                break
+        request_line = (first + reader.readline()).decode('utf-8', 'replace').split()
+        headers = {}
+        while True:
+            line = reader.readline()
+            if not line:
+                return None
+            line = line.decode('utf-8', 'replace').strip()
+            if not line:
+                break
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+        if headers.get('content-length'):
+            reader.read(int(headers['content-length']))
+        if len(request_line) < 2:
+            return None
+        return request_line[0], request_line[1], headers
+
+    def _reply(self, conn, send_lock, headers, status='200 OK', extra=None, body=b''):
+        lines = [f"RTSP/1.0 {status}", f"CSeq: {headers.get('cseq', '0')}"]
+        lines += [f"{key}: {value}" for key, value in (extra or {}).items()]
+        if body:
+            lines.append(f"Content-Length: {len(body)}")
+        with send_lock:
+            conn.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+
+    def _serve(self, conn):
+        """Dialogue RTSP d'un client : OPTIONS, DESCRIBE, SETUP (TCP entrelacé), PLAY, TEARDOWN"""
+        send_lock = threading.Lock()
+        reader = conn.makefile('rb')
+        session = None
+        session_header = f"{next(self._session_ids):08d};timeout=60"
+        try:
+            while self._running:
+                request = self._read_request(reader)
+                if request is None:
+                    break
+                method, uri, headers = request
+                if method == 'OPTIONS':
+                    self._reply(conn, send_lock, headers, extra={
+                        'Public': 'OPTIONS, DESCRIBE, SETUP, PLAY, TEARDOWN, GET_PARAMETER'
+                    })
+                elif method == 'DESCRIBE':
+                    if uri.rstrip('/').rsplit('/', 1)[-1] != self.stream_name:
+                        self._reply(conn, send_lock, headers, status='404 Not Found')
+                        continue
+                    self._reply(conn, send_lock, headers, extra={
+                        'Content-Base': f"{self.url}/", 'Content-Type': 'application/sdp'
+                    }, body=self._sdp)
+                elif method == 'SETUP':
+                    if 'interleaved' not in headers.get('transport', '') and 'TCP' not in headers.get('transport', ''):
+                        # Seul le transport TCP entrelacé est servi : le client retente en TCP
+                        self._reply(conn, send_lock, headers, status='461 Unsupported Transport')
+                        continue
+                    self._reply(conn, send_lock, headers, extra={
+                        'Transport': 'RTP/AVP/TCP;unicast;interleaved=0-1', 'Session': session_header
+                    })
+                elif method == 'PLAY':
+                    self._reply(conn, send_lock, headers, extra={'Session': session_header, 'Range': 'npt=0.000-'})
+                    if session is None:
+                        session = self._play(conn, send_lock)
+                elif method == 'TEARDOWN':
+                    self._reply(conn, send_lock, headers, extra={'Session': session_header})
+                    break
+                elif method in ('GET_PARAMETER', 'SET_PARAMETER'):
+                    self._reply(conn, send_lock, headers, extra={'Session': session_header})
+                else:
+                    self._reply(conn, send_lock, headers, status='501 Not Implemented')
+        except OSError:
+            pass
+        finally:
+            reader.close()
+            if session is not None:
+                self._close_session(session)
+            else:
+                conn.close()
+
+    def _play(self, conn, send_lock):
+        """Lance la session ffmpeg → RTP et le relais vers le client"""
+        rtp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rtp.bind(('127.0.0.1', 0))
+        rtp.settimeout(0.2)
+        session = self._open_session(conn)
+        session['rtp'] = rtp
+        session['send_lock'] = send_lock
+        session['process'] = subprocess.Popen(
+            self._ffmpeg_input() + self._encoder_args() + [f"rtp://127.0.0.1:{rtp.getsockname()[1]}?pkt_size=1200"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        threading.Thread(target=self._relay, args=(session,), daemon=True).start()
+        return session
+
+    def _relay(self, session):
+        conn, rtp = session['conn'], session['rtp']
+        try:
+            while self._running and session in self._sessions:
+                try:
+                    packet = rtp.recv(65536)
+                except socket.timeout:
+                    continue
+                if session['stalled'].is_set():
+                    continue
+                with session['send_lock']:
+                    conn.sendall(b'$\x00' + len(packet).to_bytes(2, 'big') + packet)
+        except OSError:
+            pass
+        finally:
+            self._close_session(session)
+
+class MediaMTXTestServer(FileStreamServer):
+    """
+    Banc RTSP basé sur MediaMTX avec la configuration fournie (`mediamtx/mediamtx.yml`) :
+    un ffmpeg publie le fichier en boucle sur le chemin `stream_name`, les
+    lecteurs le lisent sur rtsp://hôte:port/`stream_name` comme en production.
+
+    Le flux est en direct : `session_starts` contient l'heure de chaque
+    publication (position 0 du fichier). `stall()` suspend le publieur
+    (`resume()` le relance), `drop()` le remplace, ce qui déconnecte les lecteurs.
+    """
+
+    def __init__(self, path, host='127.0.0.1', port=0, ffmpeg_binary='ffmpeg', mediamtx_binary='mediamtx',
+                 config=MEDIAMTX_CONFIG, codec='aac', stream_name='mic', sample_rate=16000):
+        super().__init__(path, host, port, ffmpeg_binary, realtime=True, loop=True, container='rtsp', codec=codec)
+        self.mediamtx_binary = mediamtx_binary
+        self.config = config
+        self.stream_name = stream_name
+        self.sample_rate = sample_rate
+        self._mediamtx = None
+        self._publisher = None
+
+    @property
+    def url(self):
+        return f"rtsp://{self.host}:{self.port}/{self.stream_name}"
+
+    def start(self):
+        if not self.port:
+            with socket.socket() as probe:
+                probe.bind((self.host, 0))
+                self.port = probe.getsockname()[1]
+        env = dict(os.environ)
+        # Surcharges de la configuration fournie : RTSP seul, pas de capture micro au démarrage
+        env.update({
+            'MTX_RTSPADDRESS': f"{self.host}:{self.port}",
+            'MTX_RTMP': 'no', 'MTX_HLS': 'no', 'MTX_WEBRTC': 'no', 'MTX_SRT': 'no', 'MTX_API': 'no',
+            'MTX_METRICS': 'no', 'MTX_PPROF': 'no', 'MTX_PLAYBACK': 'no',
+            f"MTX_PATHS_{self.stream_name.upper()}_RUNONINIT": '',
+        })
+        self._mediamtx = subprocess.Popen(
+            [self.mediamtx_binary, self.config], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 10.0
+        while True:
+            try:
+                socket.create_connection((self.host, self.port), timeout=0.5).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or self._mediamtx.poll() is not None:
+                    self.stop()
+                    raise RuntimeError("MediaMTX n'a pas démarré")
+                time.sleep(0.05)
+        self._running = True
+        self._publish()
+        return self
+
+    def _publish(self):
+        self._publisher = subprocess.Popen(
+            self._ffmpeg_input() + [
+                '-c:a', self.codec, '-ar', str(self.sample_rate), '-ac', '1',
+                '-f', 'rtsp', '-rtsp_transport', 'tcp', self.url
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        with self._lock:
+            self.connections += 1
+            self.session_starts.append(time.time())
+
+    def _stop_publisher(self):
+        if self._publisher is not None:
+            self._publisher.kill()
+            self._publisher.wait()
+            self._publisher = None
+
+    def stall(self):
+        """Suspend le publieur : les lecteurs restent connectés sans recevoir de données"""
+        if self._publisher is not None:
+            self._publisher.send_signal(signal.SIGSTOP)
+
+    def resume(self):
+        if self._publisher is not None:
+            self._publisher.send_signal(signal.SIGCONT)
+
+    def drop(self):
+        """Remplace le publieur : MediaMTX ferme les lecteurs du flux interrompu"""
+        self._stop_publisher()
+        if self._running:
+            self._publish()
+
+    def stop(self):
+        self._running = False
+        self._stop_publisher()
+        if self._mediamtx is not None:
+            self._mediamtx.terminate()
+            try:
+                self._mediamtx.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._mediamtx.kill()
+            self._mediamtx = None
+
+def rtsp_test_server(path, mediamtx_binary=None, **kwargs):
+    """
+    Serveur RTSP de test pour un fichier audio : MediaMTX (configuration fournie)
+    si son binaire est disponible (`mediamtx_binary`, $MEDIAMTX_BINARY ou PATH),
+    sinon le serveur de substitution `RTSPTestServer`.
+    """
+    binary = mediamtx_binary or os.environ.get('MEDIAMTX_BINARY') or shutil.which('mediamtx')
+    if binary:
+        return MediaMTXTestServer(path, mediamtx_binary=binary, **kwargs)
+    return RTSPTestServer(path, **kwargs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diffuse un fichier audio en boucle sur TCP ou RTSP via ffmpeg")
+    parser.add_argument('path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8555)
+    parser.add_argument('--rtsp', action='store_true', help="Servir en RTSP (MediaMTX si disponible)")
+    parser.add_argument('--mediamtx', default=None, help="Binaire MediaMTX à utiliser")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.rtsp:
+        server = rtsp_test_server(args.path, args.mediamtx, host=args.host, port=args.port).start()
+    else:
+        server = FileStreamServer(args.path, args.host, args.port).start()
+    logging.info(f"Diffusion de {args.path} sur {server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import time
+import numpy as np
+import pytest
+from audio_bus import AudioBus
+from vban_detector_new import VBANDetector
+from vban_ingest import build_vban_packet
+
+@pytest.fixture
+def bus():
+    return AudioBus()
+
+def test_all_subscribers_share_one_read_only_buffer(bus):
+    """Tous les abonnés reçoivent la même vue, en lecture seule, sans copie."""
+    received = []
+    for _ in range(4):
+        bus.subscribe(lambda data, ts: received.append(data), stream='mic')
+
+    chunk = np.arange(16, dtype=np.float32)
+    assert bus.publish('mic', chunk, 1.0) == 4
+
+    assert len(received) == 4
+    for view in received:
+        assert view is received[0]
+        assert np.shares_memory(view, chunk)
+        assert not view.flags.writeable
+        with pytest.raises(ValueError):
+            view[0] = 1.0
+
+def test_stream_filtering_and_wildcard(bus):
+    calls = {'a': 0, 'all': 0}
+    streams = []
+    bus.subscribe(lambda data, ts: calls.__setitem__('a', calls['a'] + 1), stream='a')
+    bus.subscribe(lambda data, ts, stream: streams.append(stream), pass_stream=True)
+    bus.subscribe(lambda data, ts: calls.__setitem__('all', calls['all'] + 1))
+
+    bus.publish('a', np.zeros(4, dtype=np.float32), 0.0)
+    bus.publish('b', np.zeros(4, dtype=np.float32), 0.0)
+
+    assert calls == {'a': 1, 'all': 2}
+    assert streams == ['a', 'b']
+
+def test_unsubscribe(bus):
+    received = []
+    callback = bus.subscribe(lambda data, ts: received.append(ts), stream='a')
+    assert bus.has_subscribers('a')
+    assert bus.unsubscribe(callback, stream='a')
+    assert not bus.unsubscribe(callback, stream='a')
+    assert not bus.has_subscribers('a')
+    assert bus.publish('a', np.zeros(4, dtype=np.float32), 0.0) == 0
+    assert received == []
+
+def test_failing_subscriber_does_not_block_others(bus):
+    received = []
+
+    def failing(data, ts):
+        raise RuntimeError("boom")
+
+    bus.subscribe(failing)
+    bus.subscribe(lambda data, ts: received.append(ts))
+    bus.publish('a', np.zeros(4, dtype=np.float32), 2.0)
+    assert received == [2.0]
+
+def test_detector_fans_out_to_multiple_callbacks(tmp_path, monkeypatch):
+    """Plusieurs consommateurs d'un même flux VBAN, sans que le dernier écrase les autres."""
+    monkeypatch.chdir(tmp_path)  # Pas de settings.json : toutes les sources sont actives
+    detector = VBANDetector(port=0)
+    first, second, other = [], [], []
+    detector.add_callback(lambda data, ts: first.append(data), stream=('10.0.0.159', 'ESP32Mic'))
+    detector.add_callback(lambda data, ts: second.append(data), stream=('10.0.0.159', 'ESP32Mic'))
+    detector.add_callback(lambda data, ts: other.append(data), stream=('10.0.0.2', 'Other'))
+
+    samples = (np.ones(400) * 16384).astype('<i2').tobytes()
+    for counter in range(41):  # 41 x 400 échantillons > 1 seconde à 16 kHz
+        packet = build_vban_packet('ESP32Mic', samples, frame_counter=counter)
+        detector.ingest.dispatch(packet, ('10.0.0.159', 6980), time.time())
+
+    assert len(first) == 1
+    assert second[0] is first[0]
+    assert first[0].shape == (detector.chunk_size,)
+    np.testing.assert_allclose(first[0], 0.5)
+    assert other == []
+
+def test_disabled_source_applies_after_invalidation(tmp_path, monkeypatch):
+    """Une source désactivée dans settings.json est filtrée dès l'invalidation du cache."""
+    monkeypatch.chdir(tmp_path)
+    settings = tmp_path / 'settings.json'
+    settings.write_text('{"saved_vban_sources": [{"ip": "10.0.0.159", "stream_name": "ESP32Mic", "enabled": true}]}')
+    detector = VBANDetector(port=0)
+    assert detector._is_source_enabled('10.0.0.159', 'ESP32Mic')
+
+    settings.write_text('{"saved_vban_sources": [{"ip": "10.0.0.159", "stream_name": "ESP32Mic", "enabled": false}]}')
+    assert detector._is_source_enabled('10.0.0.159', 'ESP32Mic')  # Paramètres en cache
+    detector.invalidate_settings_cache()
+    assert not detector._is_source_enabled('10.0.0.159', 'ESP32Mic')
@@ -0,0 +1,52 @@
+import csv
+import json
+import os
+import shutil
+import subprocess
+import pytest
+from batch_analysis import find_audio_files, main
+from stream_test_server import write_test_wav
+
+pytest.importorskip('mediapipe')
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg non installé")
+
+@pytest.fixture(scope='module')
+def recordings(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('recordings')
+    write_test_wav(str(directory / 'a.wav'), duration=6.0)
+    nested = directory / 'jour2'
+    nested.mkdir()
+    write_test_wav(str(nested / 'b.wav'), duration=4.0)
+    subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-i', str(nested / 'b.wav'), str(nested / 'b.flac')], check=True
+    )
+    os.remove(nested / 'b.wav')
+    (directory / 'notes.txt').write_text("pas de l'audio")
+    return directory
+
+def test_find_audio_files(recordings):
+    assert [os.path.relpath(path, recordings) for path in find_audio_files([str(recordings)])] == [
+        'a.wav', os.path.join('jour2', 'b.flac')
+    ]
+
+def test_batch_outputs_scores_and_detections(recordings, tmp_path):
+    output = tmp_path / 'scores.jsonl'
+    assert main([str(recordings), '-o', str(output), '--workers', '2']) == 0
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    by_file = {}
+    for row in rows:
+        by_file.setdefault(os.path.basename(row['file']), []).append(row)
+    # Une fenêtre par pas de 0,5 s une fois la première fenêtre complète
+    assert len(by_file['a.wav']) == 11 and len(by_file['b.flac']) == 7
+    assert by_file['a.wav'][0]['offset'] == 1.0
+    assert any(row['detection'] for row in by_file['a.wav'])
+    detected = [row for row in rows if row['detection']]
+    assert all(row['score'] > 0.3 for row in detected)
+
+    csv_output = tmp_path / 'scores.csv'
+    assert main([str(recordings / 'a.wav'), '-o', str(csv_output), '--workers', '1', '--threshold', '2']) == 0
+    with open(csv_output) as f:
+        csv_rows = list(csv.DictReader(f))
+    assert len(csv_rows) == 11
+    assert all(row['detection'] == 'False' for row in csv_rows)
+    assert isinstance(json.loads(csv_rows[0]['categories']), dict)
@@ -0,0 +1,93 @@
+import time
+import numpy as np
+import pytest
+from audio_detector import AudioDetector
+from classifiers import Classifier, StubClassifier, create_classifier, embed_marker, find_markers
+from stage_graph import StageGraph
+from vban_ingest import VBAN_DATATYPE_INT16, decode_pcm, encode_pcm
+
+def _noise(n, seed=0):
+    return (np.random.default_rng(seed).standard_normal(n) * 0.1).astype(np.float32)
+
+def test_markers_survive_int16_pcm():
+    audio = embed_marker(embed_marker(_noise(16000), 1, 1000), 3, 9000)
+    decoded = decode_pcm(encode_pcm(audio, VBAN_DATATYPE_INT16), VBAN_DATATYPE_INT16, 1)[:, 0]
+    assert find_markers(audio) == find_markers(decoded) == [1, 3]
+    assert find_markers(_noise(160000, seed=1)) == []
+    assert find_markers(np.zeros(16000, dtype=np.float32)) == []
+
+def test_stub_scores_are_scripted():
+    classifier = StubClassifier(script={'5': {'Clapping': 0.7}, 6: {'Clapping': 0.4, 'Hands': 0.8}}, default={'Silence': 0.5})
+    window = embed_marker(embed_marker(_noise(15600), 5, 100), 6, 5000)
+    assert classifier.classify(window, 16000) == [('Hands', 0.8), ('Clapping', 0.7), ('Silence', 0.5)]
+    assert classifier.classify(_noise(15600), 16000) == [('Silence', 0.5)]
+    # max_results négatif ou None : toutes les catégories au-dessus du seuil (threshold_sweep scores)
+    for max_results in (-1, None):
+        assert len(create_classifier('stub', max_results=max_results, score_threshold=0.0,
+                                     script={1: {f'label{i}': i / 10 for i in range(1, 8)}})
+                   .classify(embed_marker(_noise(15600), 1), 16000)) == 7
+    with pytest.raises(TypeError):
+        Classifier()
+    with pytest.raises(ValueError):
+        create_classifier('stub', jitter=0.1)
+    with pytest.raises(ValueError):
+        create_classifier('onnx')
+
+def test_detector_runs_thousands_of_windows_without_model():
+    detections = []
+    detector = AudioDetector('yamnet.tflite', queue_size=4096, classifier_backend='stub')
+    sources = [f"src_{i}" for i in range(50)]
+    for source_id in sources:
+        detector.add_source(source_id, detection_callback=detections.append)
+    detector.start()
+    try:
+        window = _noise(detector.window_size)
+        marked = embed_marker(window.copy(), 1, 500)
+        for index in range(20):
+            for source_id in sources:
+                # Un seul clap par source (délai entre détections d'une seconde)
+                detector.process_audio(marked if index == 10 else window, source_id)
+        deadline = time.monotonic() + 10
+        while sum(source['inferences'] for source in detector.sources.values()) < 1000 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        detector.stop()
+    metrics = detector.metrics()
+    assert metrics['dropped_windows'] == 0
+    assert sum(source['inferences'] for source in metrics['sources'].values()) == 1000
+    assert sorted(detection['source_id'] for detection in detections) == sorted(sources)
+    assert detections[0]['score'] == pytest.approx(1.5)  # Clapping 0.9 + Hands 0.6
+
+def test_classify_stage_uses_backend():
+    graph = StageGraph.from_settings({'stages': [
+        {'name': 'window', 'type': 'window'},
+        {'name': 'classify', 'type': 'classify', 'backend': 'stub', 'backend_options': {'latency': 0.001}},
+        {'name': 'rules', 'type': 'rules'},
+        {'name': 'sink', 'type': 'sink'},
+    ]})
+    detections = []
+    graph.add_source('mic_1', detection_callback=detections.append)
+    graph.start()
+    try:
+        graph.process_audio(embed_marker(_noise(16000), 1, 12000), 'mic_1')
+    finally:
+        graph.stop()
+    assert [detection['source_id'] for detection in detections] == ['mic_1']
+    with pytest.raises(ValueError):
+        StageGraph.from_settings({'stages': [{'type': 'classify', 'backend': 'onnx'}]})
+
+def test_detector_rules_are_configurable():
+    detections = []
+    # Clapping 0.9 + Hands 0.6 : 1.5 avec les poids par défaut, 0.9 avec les poids réglés
+    detector = AudioDetector('yamnet.tflite', classifier_backend='stub', threshold=1.0, delay=1.0,
+                             weights={'Clapping': 1.0})
+    detector.initialize()
+    detector.add_source('mic_1', detection_callback=detections.append)
+    categories = [('Clapping', 0.9), ('Hands', 0.6)]
+    detector._handle_result(categories, 0, 'mic_1')
+    assert detections == []
+    detector.set_rules(threshold=0.5, delay=60.0, weights={'Clapping': 1.0})
+    detector._handle_result(categories, 0, 'mic_1')
+    # Délai entre deux détections : la seconde fenêtre est ignorée
+    detector._handle_result(categories, 0, 'mic_1')
+    assert [detection['score'] for detection in detections] == [pytest.approx(0.9)]
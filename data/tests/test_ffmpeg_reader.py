@@ -0,0 +1,101 @@
+import shutil
+import time
+import pytest
+import numpy as np
+from ffmpeg_reader import FFmpegAudioReader, StreamStallError, ingest_input_options
+from rtsp_supervisor import RTSPStreamWorker
+from stream_test_server import FileStreamServer, RTSPTestServer, write_test_wav
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg non installé")
+
+@pytest.fixture(scope='module')
+def wav_file(tmp_path_factory):
+    return write_test_wav(str(tmp_path_factory.mktemp('audio') / 'stream.wav'), duration=4.0)
+
+def test_ingest_profiles():
+    assert ingest_input_options('rtsp://cam/audio', 'default') == {'rtsp_transport': 'tcp'}
+    low_latency = ingest_input_options('rtsp://cam/audio', 'low_latency', 'udp')
+    assert low_latency['fflags'] == 'nobuffer'
+    assert low_latency['rtsp_transport'] == 'udp'
+    assert 'rtsp_transport' not in ingest_input_options('tcp://127.0.0.1:8555')
+    with pytest.raises(ValueError):
+        ingest_input_options('rtsp://cam/audio', 'turbo')
+
+def test_reads_file_to_end_into_reused_buffer(wav_file):
+    # Le profil low_latency peut sauter les paquets lus pendant l'analyse : lire tout le fichier en default
+    reader = FFmpegAudioReader(wav_file, chunk_samples=1600, profile='default').start()
+    total = 0
+    first = None
+    try:
+        for chunk in reader:
+            assert chunk.ndim == 1 and chunk.dtype == np.float32
+            first = chunk if first is None else first
+            assert np.shares_memory(chunk, first)
+            total += len(chunk)
+    finally:
+        reader.close()
+    assert total == 4 * 16000
+
+def test_missing_input_reports_ffmpeg_error(tmp_path):
+    reader = FFmpegAudioReader(str(tmp_path / 'absent.wav')).start()
+    try:
+        assert reader.read() is None
+        assert 'No such file' in reader.last_error
+    finally:
+        reader.close()
+
+def test_stalled_stream_raises_instead_of_blocking(wav_file):
+    with FileStreamServer(wav_file) as server:
+        reader = FFmpegAudioReader(server.url, stall_timeout=0.5).start()
+        try:
+            assert reader.read() is not None
+            server.stall()
+            started = time.monotonic()
+            with pytest.raises(StreamStallError):
+                while True:
+                    reader.read()
+            # Données déjà dans les tubes + échéance
+            assert time.monotonic() - started < 3.0
+        finally:
+            reader.close()
+
+def test_worker_respawns_after_stall(wav_file):
+    received = []
+    with FileStreamServer(wav_file) as server:
+        worker = RTSPStreamWorker(
+            'cam', server.url, lambda data, source: received.append(len(data)),
+            initial_backoff=0.1, stall_timeout=0.5
+        )
+        worker.start()
+        try:
+            deadline = time.monotonic() + 10
+            while worker.state != 'streaming' and time.monotonic() < deadline:
+                time.sleep(0.05)
+            server.stall()
+            while (worker.restarts == 0 or worker.state != 'streaming') and time.monotonic() < deadline + 10:
+                time.sleep(0.05)
+            assert worker.stalls == 1
+            assert worker.state == 'streaming'
+            assert server.connections == 2
+        finally:
+            worker.stop()
+
+def test_worker_reads_rtsp_test_server_and_reconnects(wav_file):
+    received = []
+    with RTSPTestServer(wav_file) as server:
+        worker = RTSPStreamWorker(
+            'cam', server.url, lambda data, source: received.append(len(data)), initial_backoff=0.1
+        )
+        worker.start()
+        try:
+            deadline = time.monotonic() + 10
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert received and received[0] == 1600
+            server.drop()
+            while (worker.restarts == 0 or worker.state != 'streaming') and time.monotonic() < deadline + 10:
+                time.sleep(0.05)
+            assert worker.state == 'streaming'
+            assert server.connections == 2
+        finally:
+            worker.stop()
@@ -0,0 +1,52 @@
+import numpy as np
+from latency_trace import LatencyTracer
+from metrics import render_metrics
+from stage_graph import StageGraph
+
+def _samples(text):
+    return {
+        line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+        for line in text.splitlines() if line and not line.startswith('#')
+    }
+
+def test_render_metrics_exposes_sources_webhooks_and_histograms():
+    tracer = LatencyTracer()
+    tracer.record('mic_1', {'ingest': 0.0, 'enqueued': 0.0, 'dequeued': 0.004, 'classified': 0.012, 'scored': 0.012})
+    engine = {
+        'queue_depth': 3, 'dropped_windows': 2,
+        'sources': {'mic_1': {'blocks': 10, 'samples': 16000, 'windows': 2, 'inferences': 2, 'detections': 1, 'dropped': 2}},
+    }
+    sources = {
+        'mic_1': {'kind': 'microphone', 'state': 'running', 'dropped_samples': 5},
+        'rtsp_cam': {'kind': 'rtsp', 'state': 'backoff', 'restarts': 4, 'stalls': 1},
+        'vban_1': {'kind': 'vban', 'state': 'running', 'packets': 100, 'lost_frames': 3},
+    }
+    text = render_metrics(True, engine, sources, {'mic_1': {'success': 1, 'failure': 2}}, tracer)
+    samples = _samples(text)
+    mic = 'source_id="mic_1",kind="microphone"'
+    assert samples['claptrap_detection_running'] == 1
+    assert samples[f'claptrap_source_samples_total{{{mic}}}'] == 16000
+    assert samples[f'claptrap_dropped_windows_total{{{mic}}}'] == 2
+    assert samples['claptrap_inference_queue_depth'] == 3
+    assert samples[f'claptrap_webhook_requests_total{{{mic},result="failure"}}'] == 2
+    assert samples['claptrap_source_up{source_id="rtsp_cam",kind="rtsp"}'] == 0
+    assert samples['claptrap_rtsp_restarts_total{source_id="rtsp_cam",kind="rtsp"}'] == 4
+    assert samples['claptrap_vban_lost_frames_total{source_id="vban_1",kind="vban"}'] == 3
+    # Inférence de 8 ms : classe 0,01 s, histogramme cumulatif
+    assert samples[f'claptrap_inference_duration_seconds_bucket{{{mic},le="0.005"}}'] == 0
+    assert samples[f'claptrap_inference_duration_seconds_bucket{{{mic},le="0.01"}}'] == 1
+    assert samples[f'claptrap_inference_duration_seconds_bucket{{{mic},le="+Inf"}}'] == 1
+    assert samples[f'claptrap_inference_duration_seconds_count{{{mic}}}'] == 1
+    assert '# TYPE claptrap_inference_duration_seconds histogram' in text
+    assert samples['claptrap_process_resident_memory_bytes'] > 0
+
+def test_stage_graph_counts_gated_blocks():
+    graph = StageGraph.from_settings({'stages': [{'name': 'gate', 'type': 'gate', 'threshold_db': -40, 'hold': 0.0}]})
+    graph.add_source('mic_1')
+    graph.start()
+    try:
+        graph.process_audio(np.zeros(1600, dtype=np.float32), 'mic_1')
+        graph.process_audio(np.full(1600, 0.5, dtype=np.float32), 'mic_1')
+    finally:
+        graph.stop()
+    assert graph.metrics()['sources']['mic_1'] == {'blocks': 2, 'samples': 3200, 'gated': 1}
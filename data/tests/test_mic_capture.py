@@ -0,0 +1,145 @@
+import threading
+import time
+import numpy as np
+from mic_capture import MicrophoneCapture, SPSCRingBuffer, microphone_devices
+from resampler import PolyphaseResampler
+
+class FakeFlags:
+    def __init__(self, input_overflow=False):
+        self.input_overflow = input_overflow
+
+class FakeInputStream:
+    """Flux d'entrée qui appelle le callback depuis son propre thread, comme PortAudio"""
+
+    def __init__(self, callback, samplerate, blocksize=0, blocks=10, overflow_at=(), frames=100, **kwargs):
+        self.callback = callback
+        self.samplerate = samplerate
+        # blocksize=0 : taille choisie par le périphérique
+        self.blocksize = blocksize or frames
+        self.blocks = blocks
+        self.overflow_at = overflow_at
+        self.callback_threads = set()
+        self._thread = threading.Thread(target=self._run)
+
+    def _run(self):
+        for i in range(self.blocks):
+            self.callback_threads.add(threading.get_ident())
+            indata = np.full((self.blocksize, 1), i, dtype=np.float32)
+            self.callback(indata, self.blocksize, None, FakeFlags(i in self.overflow_at))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._thread.join()
+
+    def close(self):
+        pass
+
+def test_ring_buffer_wraps_and_drops_when_full():
+    ring = SPSCRingBuffer(8)
+    out = np.empty(8, dtype=np.float32)
+    assert ring.write(np.arange(6, dtype=np.float32)) == 0
+    assert ring.read(out[:4]) == 4
+    # Écriture à cheval sur la fin du tampon
+    assert ring.write(np.arange(6, 12, dtype=np.float32)) == 0
+    assert ring.available() == 8
+    assert ring.write(np.ones(3, dtype=np.float32)) == 3
+    assert ring.read(out) == 8
+    np.testing.assert_array_equal(out, np.arange(4, 12))
+
+def test_capture_processes_off_the_callback_thread():
+    streams = []
+    received = []
+    processing_threads = set()
+
+    def on_audio(block, source_id):
+        processing_threads.add(threading.get_ident())
+        received.append((source_id, block.copy()))
+
+    def factory(**kwargs):
+        streams.append(FakeInputStream(overflow_at=(3,), **kwargs))
+        return streams[0]
+
+    capture = MicrophoneCapture(
+        2, on_audio, sample_rate=1000, block_duration=0.1, stream_factory=factory, device_rate=1000
+    )
+    with capture:
+        deadline = time.monotonic() + 5
+        while len(received) < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    assert [block[0] for _, block in received] == list(range(10))
+    assert received[0][0] == 'mic_2'
+    assert not processing_threads & streams[0].callback_threads
+    status = capture.status()
+    assert status['input_overflows'] == 1
+    assert status['dropped_samples'] == 0
+    assert status['processed_samples'] == 1000
+
+def test_slow_processing_counts_dropped_samples():
+    release = threading.Event()
+    capture = MicrophoneCapture(
+        0, lambda block, source_id: release.wait(), sample_rate=1000, block_duration=0.1, ring_duration=0.3,
+        stream_factory=lambda **kwargs: FakeInputStream(**kwargs), device_rate=1000
+    )
+    capture.start()
+    capture.stream.stop()
+    release.set()
+    capture.stop()
+    assert capture.ring_overflows > 0
+    assert capture.dropped_samples > 0
+    assert capture.callbacks == 10
+
+def test_capture_at_native_rate_resamples_on_worker():
+    streams = []
+    received = []
+
+    def factory(**kwargs):
+        streams.append(FakeInputStream(blocks=20, frames=480, **kwargs))
+        return streams[0]
+
+    resample_times = []
+
+    def on_audio(block, source_id):
+        received.append(len(block))
+        resample_times.append(capture.block_resample_seconds)
+
+    capture = MicrophoneCapture(1, on_audio, stream_factory=factory, device_rate=48000)
+    with capture:
+        deadline = time.monotonic() + 5
+        while sum(received) < 3200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    # Flux ouvert à la fréquence du périphérique, blocs de 100 ms convertis à 16 kHz
+    assert streams[0].samplerate == 48000
+    assert received == [1600, 1600]
+    # Durée de conversion de chaque bloc, transmise à la trace de latence
+    assert all(seconds > 0 for seconds in resample_times)
+    status = capture.status()
+    assert status['device_rate'] == 48000 and status['sample_rate'] == 16000
+    assert status['resample_ratio'] == '1/3'
+    assert status['resample_cost'] > 0
+
+def test_resampler_is_continuous_across_blocks():
+    t = np.arange(44100) / 44100
+    audio = np.sin(2 * np.pi * 440 * t).astype(np.float32)
+    whole = PolyphaseResampler(44100, 16000).process(audio)
+    resampler = PolyphaseResampler(44100, 16000)
+    chunked = np.concatenate([resampler.process(audio[i:i + 1000]) for i in range(0, len(audio), 1000)])
+    assert len(chunked) == len(whole) == 16000
+    np.testing.assert_allclose(chunked, whole, atol=1e-6)
+    # Filtres calculés une fois par rapport et partagés
+    assert resampler.phases is PolyphaseResampler(44100, 16000).phases
+
+def test_microphone_devices_from_settings():
+    # Sans liste : le périphérique unique historique
+    assert microphone_devices({'device_index': '3', 'webhook_url': 'http://ha/hook'}) == [
+        {'device_index': 3, 'source_id': 'mic_3', 'webhook_url': 'http://ha/hook', 'name': 'Micro 3'}
+    ]
+    devices = microphone_devices({'device_index': '0', 'devices': [
+        {'device_index': 1, 'webhook_url': 'http://ha/a'},
+        {'device_index': 2, 'enabled': False},
+        {'device_index': '4', 'name': 'Réseau 4'},
+        {'device_index': 1},
+    ]})
+    assert [device['source_id'] for device in devices] == ['mic_1', 'mic_4']
+    assert devices[1]['name'] == 'Réseau 4' and devices[1]['webhook_url'] is None
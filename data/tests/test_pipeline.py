@@ -0,0 +1,178 @@
+import threading
+import time
+import numpy as np
+import pytest
+from pipeline import AudioSource, DetectionPipeline, MicrophoneSource, RTSPSource, VBANSource, build_sources
+from rtsp_supervisor import RTSPStreamWorker
+
+SETTINGS = {
+    'microphone': {'enabled': True, 'webhook_url': 'http://ha/mic', 'devices': [
+        {'device_index': 1}, {'device_index': 2, 'webhook_url': 'http://ha/mic2'}
+    ]},
+    'rtsp_sources': [
+        {'url': 'rtsp://cam1/audio', 'enabled': True, 'webhook_url': 'http://ha/cam1', 'profile': 'default'},
+        {'url': 'rtsp://cam2/audio', 'enabled': False},
+    ],
+    'saved_vban_sources': [
+        {'ip': '192.168.1.20', 'stream_name': 'Stream1', 'enabled': True},
+        {'ip': '192.168.1.20', 'stream_name': 'Stream2', 'enabled': True},
+    ],
+}
+
+class FakeDetector:
+    def __init__(self):
+        self.sources = {}
+        self.received = {}
+        self.running = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def add_source(self, source_id, detection_callback=None, labels_callback=None):
+        self.sources[source_id] = detection_callback
+
+    def remove_source(self, source_id):
+        self.sources.pop(source_id, None)
+
+    def process_audio(self, audio_data, source_id, **options):
+        with self.lock:
+            self.received[source_id] = self.received.get(source_id, 0) + len(audio_data)
+
+class FakeSource(AudioSource):
+    kind = 'fake'
+
+    def __init__(self, source_id, fail=False):
+        super().__init__(source_id)
+        self.fail = fail
+        self.stopped = False
+
+    def start(self, on_audio):
+        if self.fail:
+            raise OSError("périphérique absent")
+        on_audio(np.zeros(1600, dtype=np.float32), self.source_id)
+
+    def stop(self):
+        self.stopped = True
+
+class FakeVBANDetector:
+    def __init__(self):
+        self.callbacks = []
+
+    def add_callback(self, callback, stream=None):
+        self.callbacks.append((callback, stream))
+
+    def remove_callback(self, callback, stream=None):
+        self.callbacks.remove((callback, stream))
+
+    def get_active_sources(self):
+        return {'192.168.1.20': {}}
+
+def test_build_sources_instantiates_every_enabled_entry():
+    sources = build_sources(SETTINGS, default_webhook_url='http://ha/default')
+    assert [(source.kind, source.source_id) for source in sources] == [
+        ('microphone', 'mic_1'), ('microphone', 'mic_2'), ('rtsp', 'rtsp_rtsp://cam1/audio'),
+        ('vban', 'vban_192.168.1.20_Stream1'), ('vban', 'vban_192.168.1.20_Stream2')
+    ]
+    assert [source.webhook_url for source in sources] == [
+        'http://ha/mic', 'http://ha/mic2', 'http://ha/cam1', 'http://ha/default', 'http://ha/default'
+    ]
+    assert sources[2].options == {'profile': 'default'}
+    # Micro désactivé : aucune source micro
+    assert all(source.kind != 'microphone' for source in build_sources({**SETTINGS, 'microphone': {'enabled': False}}))
+
+def test_pipeline_runs_all_sources_and_isolates_failures():
+    detector = FakeDetector()
+    sources = [FakeSource('mic_1'), FakeSource('mic_2', fail=True), FakeSource('rtsp_cam')]
+    pipeline = DetectionPipeline(detector, lambda source: (f"clap:{source.source_id}", None)).start(sources)
+    assert detector.running
+    assert set(detector.sources) == {'mic_1', 'rtsp_cam'}
+    assert detector.sources['mic_1'] == 'clap:mic_1'
+    assert detector.received == {'mic_1': 1600, 'rtsp_cam': 1600}
+    status = pipeline.status()
+    assert status['mic_2']['state'] == 'error' and 'absent' in status['mic_2']['last_error']
+    assert [source.source_id for source in pipeline.active_sources()] == ['mic_1', 'rtsp_cam']
+
+    pipeline.stop()
+    assert sources[0].stopped and sources[2].stopped
+    assert detector.sources == {} and not detector.running
+    assert pipeline.status() == {}
+
+def test_sources_of_every_kind_feed_one_detector():
+    from test_rtsp_supervisor import FakeReader
+    detector = FakeDetector()
+    vban = FakeVBANDetector()
+    captures = []
+
+    class FakeCapture:
+        def __init__(self, device, on_audio, source_id):
+            self.device, self.on_audio, self.source_id = device, on_audio, source_id
+            captures.append(self)
+
+        def start(self):
+            self.on_audio(np.zeros(1600, dtype=np.float32), self.source_id)
+
+        def stop(self):
+            pass
+
+        def status(self):
+            return {'device': self.device}
+
+    sources = [
+        MicrophoneSource(3, capture_factory=FakeCapture),
+        RTSPSource('rtsp://cam/audio', worker_factory=lambda *args, **kwargs: RTSPStreamWorker(
+            *args, reader_factory=lambda url: FakeReader(url, chunks=2), initial_backoff=5.0, **kwargs
+        )),
+        VBANSource('192.168.1.20', 'Stream1', vban_detector_factory=lambda: vban),
+    ]
+    pipeline = DetectionPipeline(detector).start(sources)
+    try:
+        vban.callbacks[0][0](np.zeros(256, dtype=np.float32), time.time())
+        deadline = time.monotonic() + 3
+        while detector.received.get('rtsp_rtsp://cam/audio', 0) < 3200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert detector.received == {'mic_3': 1600, 'rtsp_rtsp://cam/audio': 3200, 'vban_192.168.1.20_Stream1': 256}
+        assert vban.callbacks[0][1] == ('192.168.1.20', 'Stream1')
+        status = pipeline.status()
+        assert status['rtsp_rtsp://cam/audio']['state'] == 'backoff'
+        assert status['vban_192.168.1.20_Stream1']['active'] is True
+    finally:
+        pipeline.stop()
+    assert vban.callbacks == []
+
+def test_reconcile_applies_only_the_delta():
+    detector = FakeDetector()
+    mic, cam, vban = FakeSource('mic_1'), FakeSource('rtsp_cam'), FakeSource('vban_1')
+    cam.config = lambda: ('rtsp://cam/audio',)
+    pipeline = DetectionPipeline(detector).start([mic, cam, vban])
+
+    renamed_mic = FakeSource('mic_1')
+    renamed_mic.webhook_url = 'http://ha/new'
+    moved_cam = FakeSource('rtsp_cam')
+    moved_cam.config = lambda: ('rtsp://cam/other',)
+    new_mic = FakeSource('mic_2')
+    changes = pipeline.reconcile([renamed_mic, moved_cam, new_mic])
+
+    assert changes == {'added': ['mic_2'], 'removed': ['vban_1'], 'restarted': ['rtsp_cam'], 'updated': ['mic_1']}
+    # Source inchangée : toujours la même instance, jamais arrêtée, webhook mis à jour sur place
+    assert pipeline.sources['mic_1'] is mic and not mic.stopped
+    assert mic.webhook_url == 'http://ha/new'
+    assert cam.stopped and pipeline.sources['rtsp_cam'] is moved_cam
+    assert vban.stopped and set(detector.sources) == {'mic_1', 'rtsp_cam', 'mic_2'}
+    assert detector.running
+    assert pipeline.reconcile([renamed_mic, moved_cam, new_mic]) == {
+        'added': [], 'removed': [], 'restarted': [], 'updated': []
+    }
+    pipeline.stop()
+
+def test_incomplete_source_fails_at_instantiation():
+    class NoStop(AudioSource):
+        def start(self, on_audio):
+            pass
+
+    # Erreur à la construction, pas au démarrage où elle ne serait qu'une erreur de source
+    with pytest.raises(TypeError):
+        NoStop('broken')
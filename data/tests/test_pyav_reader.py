@@ -0,0 +1,56 @@
+import shutil
+import time
+import pytest
+import numpy as np
+from ffmpeg_reader import FFmpegAudioReader, StreamStallError
+from rtsp_supervisor import RTSPStreamWorker
+from stream_test_server import FileStreamServer, write_test_wav
+
+pytest.importorskip('av')
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg non installé")
+
+from pyav_reader import DecoderPool, PyAVAudioReader  # noqa: E402
+
+@pytest.fixture(scope='module')
+def wav_file(tmp_path_factory):
+    return write_test_wav(str(tmp_path_factory.mktemp('audio') / 'stream.wav'), duration=4.0)
+
+def _read_all(reader):
+    reader.start()
+    try:
+        return np.concatenate([chunk.copy() for chunk in reader])
+    finally:
+        reader.close()
+
+def test_decodes_like_ffmpeg_subprocess(wav_file):
+    decoded = _read_all(PyAVAudioReader(wav_file, profile='default', pool=DecoderPool(1)))
+    reference = _read_all(FFmpegAudioReader(wav_file, profile='default'))
+    assert decoded.dtype == np.float32
+    assert len(decoded) == len(reference) == 4 * 16000
+    assert np.allclose(decoded, reference, atol=1e-4)
+
+def test_stalled_stream_raises(wav_file):
+    with FileStreamServer(wav_file) as server:
+        reader = PyAVAudioReader(server.url, stall_timeout=0.5).start()
+        try:
+            assert reader.read() is not None
+            server.stall()
+            with pytest.raises(StreamStallError):
+                while True:
+                    reader.read()
+        finally:
+            reader.close()
+
+def test_worker_streams_with_pyav_backend(wav_file):
+    received = []
+    with FileStreamServer(wav_file) as server:
+        worker = RTSPStreamWorker('cam', server.url, lambda data, source: received.append(len(data)), backend='pyav')
+        worker.start()
+        try:
+            deadline = time.monotonic() + 10
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert worker.status()['backend'] == 'pyav'
+            assert received and received[0] == 1600
+        finally:
+            worker.stop()
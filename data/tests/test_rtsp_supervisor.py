@@ -0,0 +1,154 @@
+import threading
+import time
+import numpy as np
+import pytest
+from rtsp_supervisor import RTSPStreamWorker
+
+class FakeReader:
+    """Lecteur simulé : produit quelques blocs puis termine (coupure du flux)"""
+
+    def __init__(self, url, chunks=3, value=0.1):
+        self.url = url
+        self.chunks = chunks
+        self.value = value
+        self.closed = False
+
+    def __iter__(self):
+        for _ in range(self.chunks):
+            if self.closed:
+                return
+            time.sleep(0.01)
+            yield np.full(1600, self.value, dtype=np.float32)
+
+    def close(self):
+        self.closed = True
+
+class BlockingReader(FakeReader):
+    """Lecteur simulé qui bloque jusqu'à sa fermeture, comme un flux RTSP sans données"""
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.released = threading.Event()
+
+    def __iter__(self):
+        self.released.wait()
+        return iter(())
+
+    def close(self):
+        super().close()
+        self.released.set()
+
+class FakeDetector:
+    def __init__(self):
+        self.received = {}
+        self.lock = threading.Lock()
+
+    def process_audio(self, audio_data, source_id):
+        with self.lock:
+            self.received[source_id] = self.received.get(source_id, 0) + len(audio_data)
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_reconnect_with_exponential_backoff():
+    connections = []
+
+    def factory(url):
+        connections.append(time.monotonic())
+        return FakeReader(url, chunks=2)
+
+    received = []
+    worker = RTSPStreamWorker(
+        'cam', 'rtsp://camera/audio', lambda data, source: received.append(len(data)),
+        reader_factory=factory, initial_backoff=0.05, max_backoff=0.2
+    )
+    worker.start()
+    try:
+        assert wait_for(lambda: len(connections) >= 5)
+    finally:
+        worker.stop()
+
+    gaps = np.diff(connections[:5])
+    # Délais : 0.05, 0.1, 0.2, 0.2 (plafonné) + durée de lecture
+    assert gaps[1] > gaps[0]
+    assert gaps[2] > gaps[1]
+    assert gaps[3] < 0.2 + 0.15
+    assert worker.restarts >= 4
+    assert sum(received) >= 2 * 1600 * 4
+    assert worker.state == 'stopped'
+
+def test_failing_reader_is_retried():
+    attempts = []
+
+    def factory(url):
+        attempts.append(url)
+        if len(attempts) < 3:
+            raise RuntimeError("Connection refused")
+        return FakeReader(url, chunks=1000)
+
+    detector = FakeDetector()
+    worker = RTSPStreamWorker('cam', 'rtsp://camera/audio', detector.process_audio,
+                              reader_factory=factory, initial_backoff=0.01)
+    worker.start()
+    try:
+        assert wait_for(lambda: detector.received.get('cam', 0) > 0)
+        status = worker.status()
+        assert status['restarts'] == 2
+        assert status['last_error'] == "Connection refused"
+    finally:
+        worker.stop()
+
+def test_stop_unblocks_stalled_reader():
+    readers = []
+
+    def factory(url):
+        readers.append(BlockingReader(url))
+        return readers[-1]
+
+    worker = RTSPStreamWorker('cam', 'rtsp://camera/audio', FakeDetector().process_audio, reader_factory=factory)
+    worker.start()
+    assert wait_for(lambda: readers)
+    started = time.monotonic()
+    worker.stop()
+    assert time.monotonic() - started < 1.0
+    assert readers[0].closed
+
+@pytest.fixture
+def detector(monkeypatch):
+    """AudioDetector avec un classificateur simulé qui enregistre les fenêtres reçues"""
+    from mediapipe.tasks.python import audio
+    from audio_detector import AudioDetector
+
+    windows = []
+
+    class FakeClassifier:
+        def classify(self, audio_data):
+            windows.append(np.array(audio_data.buffer).copy())
+            return []
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(audio.AudioClassifier, 'create_from_options', lambda options: FakeClassifier())
+    detector = AudioDetector('yamnet.tflite')
+    detector.windows = windows
+    yield detector
+    detector.stop()
+
+def test_audio_detector_keeps_sources_separate(detector):
+    detector.add_source('a')
+    detector.add_source('b')
+    detector.start()
+    for _ in range(10):  # 1 seconde par source, blocs entrelacés
+        detector.process_audio(np.full(1600, 0.25, dtype=np.float32), 'a')
+        detector.process_audio(np.full(1600, -0.5, dtype=np.float32), 'b')
+
+    assert wait_for(lambda: len(detector.windows) == 2)
+    values = sorted(float(np.unique(window)[0]) for window in detector.windows)
+    assert values == [-0.5, 0.25]
+    assert all(len(np.unique(window)) == 1 and len(window) == detector.window_size for window in detector.windows)
@@ -0,0 +1,51 @@
+import threading
+import time
+import pytest
+from sampling_profiler import ProfilerBusyError, SamplingProfiler, collapsed_stacks
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_profile_collapses_stacks_per_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name='ingest-test', daemon=True)
+    worker.start()
+    try:
+        profile = SamplingProfiler().profile(0.3, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+    assert profile['samples'] > 10
+    assert profile['threads']['ingest-test'] == profile['samples']
+    lines = collapsed_stacks(profile).splitlines()
+    busy = [line for line in lines if line.startswith('ingest-test;')]
+    assert busy and all('_busy_loop (test_sampling_profiler.py)' in line for line in busy)
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in busy) == profile['samples']
+
+def test_single_profile_at_a_time():
+    profiler = SamplingProfiler()
+    runner = threading.Thread(target=profiler.profile, args=(0.3,))
+    runner.start()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(ProfilerBusyError):
+            profiler.profile(0.1)
+    finally:
+        runner.join()
+
+def test_start_profiles_in_background():
+    profiler = SamplingProfiler()
+    started = time.perf_counter()
+    assert profiler.start(0.2, interval=0.005) == 0.2
+    # L'appelant (thread de requête Flask) n'attend pas la fin du profil
+    assert time.perf_counter() - started < 0.1
+    assert profiler.status()['running']
+    with pytest.raises(ProfilerBusyError):
+        profiler.start(0.1)
+    deadline = time.monotonic() + 5
+    while profiler.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert profiler.status() == {'running': False, 'available': True}
+    assert profiler.last_result['samples'] > 10
+    assert 'sampling-profiler' not in profiler.last_result['threads']
@@ -0,0 +1,130 @@
+import time
+import numpy as np
+import pytest
+from stage_graph import STAGE_TYPES, Stage, StageGraph
+
+class FakeClassify(Stage):
+    """Classification factice : une fenêtre sonore est un clap"""
+
+    type = 'classify'
+    consumes = 'window'
+    produces = 'scores'
+
+    def __init__(self, name, model_path=None, **options):
+        super().__init__(name, **options)
+        self.windows = 0
+
+    def process(self, frame):
+        self.windows += 1
+        score = 0.9 if np.abs(frame.samples).max() > 0.5 else 0.0
+        return [{'source_id': frame.source_id, 'timestamp': frame.timestamp, 'categories': [('Clapping', score)]}]
+
+@pytest.fixture(autouse=True)
+def fake_classifier(monkeypatch):
+    monkeypatch.setitem(STAGE_TYPES, 'classify', FakeClassify)
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def _graph(*stages):
+    return StageGraph.from_settings({'stages': list(stages)})
+
+def test_graph_is_checked_when_built():
+    with pytest.raises(ValueError, match="attend 'window'"):
+        _graph({'type': 'gate'}, {'type': 'classify'})
+    with pytest.raises(ValueError, match="inconnu"):
+        _graph({'type': 'window'}, {'type': 'denoise'})
+    with pytest.raises(ValueError, match="cycle"):
+        _graph({'type': 'gate'}, {'type': 'resample', 'next': 'gate'})
+    with pytest.raises(ValueError, match="placement process"):
+        _graph({'type': 'window'}, {'type': 'classify'}, {'type': 'rules'}, {'type': 'sink', 'placement': 'process'})
+    with pytest.raises(ValueError, match="Option"):
+        _graph({'type': 'gate', 'threshold': 0.1})
+
+def test_gate_before_resample_skips_silence():
+    graph = _graph(
+        {'name': 'gate', 'type': 'gate', 'threshold_db': -40, 'hold': 0.0},
+        {'name': 'resample', 'type': 'resample'},
+        {'name': 'window', 'type': 'window'},
+        {'name': 'classify', 'type': 'classify', 'placement': 'thread', 'queue_size': 8},
+        {'name': 'rules', 'type': 'rules', 'delay': 0.0},
+        {'name': 'sink', 'type': 'sink'},
+    )
+    assert graph.accepts_native_rate
+    claps = []
+    graph.add_source('mic_1', detection_callback=claps.append)
+    graph.start()
+    try:
+        silence = np.zeros(4800, dtype=np.float32)
+        for _ in range(20):
+            graph.process_audio(silence, 'mic_1', sample_rate=48000)
+        loud = np.full(4800, 0.8, dtype=np.float32)
+        for _ in range(20):
+            graph.process_audio(loud, 'mic_1', sample_rate=48000)
+        assert _wait(lambda: claps)
+        assert graph.metrics()['sources']['mic_1']['gated'] == 20
+        # Source retirée : plus de compteurs par source dans les métriques
+        graph.remove_source('mic_1')
+        assert _wait(lambda: 'mic_1' not in graph.metrics()['sources'])
+    finally:
+        graph.stop()
+    status = graph.status()
+    # Les blocs silencieux n'ont pas été rééchantillonnés
+    assert status['gate']['processed'] == 40
+    assert status['resample']['processed'] == 20
+    assert claps[0]['source_id'] == 'mic_1' and claps[0]['score'] == pytest.approx(0.9)
+
+def test_stage_in_separate_process():
+    graph = _graph(
+        {'name': 'window', 'type': 'window', 'placement': 'process'},
+        {'name': 'classify', 'type': 'classify'},
+        {'name': 'rules', 'type': 'rules', 'delay': 0.0},
+        {'name': 'sink', 'type': 'sink'},
+    )
+    claps = []
+    graph.add_source('cam', detection_callback=claps.append)
+    graph.start()
+    try:
+        for _ in range(20):
+            graph.process_audio(np.full(1600, 0.8, dtype=np.float32), 'cam')
+        assert _wait(lambda: len(claps) >= 2, timeout=20.0)
+        graph.remove_source('cam')
+        graph.process_audio(np.full(1600, 0.8, dtype=np.float32), 'cam')
+    finally:
+        graph.stop()
+    assert graph.status()['window']['processed'] == 20
+
+class RecordWindow(Stage):
+    """Étape window factice : consigne la première valeur de chaque bloc reçu"""
+
+    type = 'window'
+    consumes = 'audio'
+    produces = 'window'
+    received = []
+
+    def process(self, frame):
+        self.received.append(float(frame.samples[0]))
+        return []
+
+def test_reused_source_buffer_is_copied(monkeypatch):
+    monkeypatch.setitem(STAGE_TYPES, 'window', RecordWindow)
+    monkeypatch.setattr(RecordWindow, 'received', [])
+    graph = _graph(
+        {'name': 'gate', 'type': 'gate', 'threshold_db': -80, 'hold': 0.0},
+        {'name': 'window', 'type': 'window', 'placement': 'thread', 'queue_size': 64},
+    )
+    graph.add_source('cam')
+    graph.start()
+    try:
+        # Comme FFmpegAudioReader et MicrophoneCapture : un seul tampon, réécrit à chaque bloc
+        buffer = np.empty(160, dtype=np.float32)
+        for index in range(50):
+            buffer[:] = (index + 1) / 100
+            graph.process_audio(buffer, 'cam')
+        assert _wait(lambda: len(RecordWindow.received) == 50)
+    finally:
+        graph.stop()
+    assert RecordWindow.received == pytest.approx([(index + 1) / 100 for index in range(50)])
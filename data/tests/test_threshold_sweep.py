@@ -0,0 +1,63 @@
+import json
+import numpy as np
+import pytest
+from threshold_sweep import load_labels, load_scores, main, parse_values, sweep, window_scores
+
+# Fenêtres toutes les 0,5 s ; claps annotés à 1,2 s et 4,2 s, claquement de doigts à 3,0 s
+WINDOWS = [
+    (1.0, {}), (1.5, {'Clapping': 0.8, 'Hands': 0.2}), (2.0, {'Clapping': 0.4}), (2.5, {}),
+    (3.0, {'Finger snapping': 0.6, 'Clapping': 0.5}), (3.5, {}), (4.0, {}), (4.5, {'Clapping': 0.35}), (5.0, {}),
+]
+
+@pytest.fixture
+def stored(tmp_path):
+    scores = tmp_path / 'scores.jsonl'
+    scores.write_text(''.join(
+        json.dumps({'file': '/enregistrements/a.wav', 'offset': offset, 'score': 0.0, 'categories': categories}) + '\n'
+        for offset, categories in WINDOWS
+    ))
+    labels = tmp_path / 'claps.csv'
+    labels.write_text("file,time\na.wav,1.2\na.wav,4.2\n")
+    return scores, labels
+
+def test_sweep_counts_against_labels(stored):
+    scores, labels = stored
+    results = sweep(load_scores(str(scores)), load_labels(str(labels)), [0.3, 0.5], [1.0])
+    low, high = results
+    # Seuil 0,3 : les deux claps, la fenêtre suivante (1,5 s → 2,0 s) est absorbée par le délai
+    assert (low['true_positives'], low['false_positives'], low['false_negatives']) == (2, 0, 0)
+    assert low['latency_p50'] == pytest.approx(0.3)
+    # Seuil 0,5 : le second clap (0,35) est manqué
+    assert (high['true_positives'], high['false_negatives'], high['recall']) == (1, 1, 0.5)
+
+def test_delay_and_weights_change_detections(stored):
+    scores, labels = stored
+    stored_scores, claps = load_scores(str(scores)), load_labels(str(labels))
+    short_delay = sweep(stored_scores, claps, [0.3], [0.25])[0]
+    assert short_delay['false_positives'] == 1
+    # Sans pénalité pour le claquement de doigts, la fenêtre de 3,0 s devient une fausse détection
+    unpenalized = sweep(stored_scores, claps, [0.3], [1.0], [{'Clapping': 1.0, 'Hands': 1.0}])[0]
+    assert unpenalized['false_positives'] == 1 and unpenalized['precision'] == pytest.approx(2 / 3, abs=1e-4)
+
+def test_cli_writes_curves(stored, tmp_path):
+    scores, labels = stored
+    output = tmp_path / 'curves.json'
+    assert main([
+        'sweep', str(scores), '--labels', str(labels), '--thresholds', '0.1:0.5:0.1', '--delays', '1,2',
+        '--weights', 'Clapping=1,Hands=1,Finger snapping=-1', '-o', str(output)
+    ]) == 0
+    curves = json.loads(output.read_text())
+    assert len(curves) == 10
+    assert [curve['threshold'] for curve in curves[::2]] == parse_values('0.1:0.5:0.1') == [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert curves[0]['weights'] == {'Clapping': 1.0, 'Hands': 1.0, 'Finger snapping': -1.0}
+
+def test_scores_match_live_classifier_output():
+    scores = {'a.wav': (np.array([1.0, 1.5]), [{'Clapping': 0.25, 'Hands': 0.2}, {'Clapping': 0.6, 'Hands': 0.35}])}
+    claps = {'a.wav': [1.2]}
+    # Labels sous 0,3 invisibles en direct : la première fenêtre vaut 0, la seconde 0,95
+    live, unfiltered = sweep(scores, claps, [0.4], [1.0], [{'Clapping': 1.0, 'Hands': 1.0}],
+                             max_results=[5, 1], score_thresholds=[0.3, 0.0])[::3]
+    assert window_scores(scores['a.wav'][1], {'Clapping': 1.0, 'Hands': 1.0}).tolist() == pytest.approx([0.0, 0.95])
+    assert (live['max_results'], live['score_threshold'], live['latency_p50']) == (5, 0.3, pytest.approx(0.3))
+    # Un seul label sans score minimum : la première fenêtre (0,25) reste sous le seuil, la seconde (0,6) détecte
+    assert (unfiltered['max_results'], unfiltered['score_threshold'], unfiltered['true_positives']) == (1, 0.0, 1)
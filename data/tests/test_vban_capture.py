@@ -0,0 +1,66 @@
+import socket
+import time
+import numpy as np
+import pytest
+from vban_capture import VBANCaptureRecorder, VBANReplayer, read_capture, CaptureFormatError
+from vban_ingest import VBANIngest, build_vban_packet
+
+@pytest.fixture
+def capture_file(tmp_path):
+    """Crée une capture de 10 paquets espacés de 50 ms."""
+    path = str(tmp_path / 'test.vbcap')
+    ingest = VBANIngest(port=0)
+    with VBANCaptureRecorder(path) as recorder:
+        ingest.add_consumer(recorder)
+        payload = np.arange(256, dtype='<i2').tobytes()
+        for counter in range(10):
+            packet = build_vban_packet('ESP32Mic', payload, frame_counter=counter)
+            ingest.dispatch(packet, ('10.0.0.159', 6980), 1000.0 + counter * 0.05)
+    return path
+
+@pytest.fixture
+def receiver():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(1.0)
+    yield sock
+    sock.close()
+
+def test_read_capture(capture_file):
+    records = list(read_capture(capture_file))
+    assert len(records) == 10
+    arrival_time, addr, data = records[3]
+    assert arrival_time == pytest.approx(1000.15)
+    assert addr == ('10.0.0.159', 6980)
+    assert data[:4] == b'VBAN'
+    assert data[24:28] == (3).to_bytes(4, 'little')
+
+def test_recorder_appends(capture_file):
+    with VBANCaptureRecorder(capture_file) as recorder:
+        recorder.write(build_vban_packet('Other', bytes(8)), ('10.0.0.2', 6980), 2000.0)
+    assert len(list(read_capture(capture_file))) == 11
+
+def test_invalid_capture(tmp_path):
+    path = tmp_path / 'bad.vbcap'
+    path.write_bytes(b'not a capture')
+    with pytest.raises(CaptureFormatError):
+        list(read_capture(str(path)))
+
+def test_replay_max_speed(capture_file, receiver):
+    """Le rejeu à vitesse maximale renvoie tous les datagrammes, dans l'ordre."""
+    port = receiver.getsockname()[1]
+    result = VBANReplayer(capture_file, port=port, speed=None).run()
+    assert result['packets'] == 10
+    assert result['duration'] < 0.45
+
+    expected = [data for _, _, data in read_capture(capture_file)]
+    received = [receiver.recvfrom(2048)[0] for _ in range(10)]
+    assert received == expected
+
+def test_replay_respects_speed(capture_file, receiver):
+    port = receiver.getsockname()[1]
+    started = time.perf_counter()
+    VBANReplayer(capture_file, port=port, speed=3.0).run()
+    elapsed = time.perf_counter() - started
+    # 9 intervalles de 50 ms à 3x = 150 ms
+    assert 0.14 <= elapsed < 0.45
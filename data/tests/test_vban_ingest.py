@@ -0,0 +1,119 @@
+import socket
+import time
+import numpy as np
+import pytest
+from vban_ingest import (
+    VBANIngest, VBANStreamStats, parse_vban_header, build_vban_packet, decode_pcm,
+    VBAN_DATATYPE_INT16, VBAN_DATATYPE_INT24, VBAN_DATATYPE_FLOAT32, VBAN_PROTOCOL_SERVICE
+)
+from vban_discovery import VBANDiscovery
+
+class RecordingConsumer:
+    def __init__(self):
+        self.frames = []
+
+    def on_frame(self, frame):
+        self.frames.append(frame)
+
+@pytest.fixture
+def ingest():
+    """Crée une ingestion VBAN sur un port libre."""
+    ingest = VBANIngest(bind_ip='127.0.0.1', port=0, idle_interval=0.05)
+    yield ingest
+    ingest.stop()
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_parse_header():
+    """Test l'analyse de l'en-tête : canaux à l'octet 6, sample rate à l'octet 4."""
+    payload = np.zeros(256 * 2, dtype='<i2').tobytes()
+    packet = build_vban_packet('ESP32Mic', payload, sample_rate=44100, channels=2, frame_counter=42)
+    frame = parse_vban_header(packet, ('10.0.0.159', 6980))
+
+    assert frame.stream_name == 'ESP32Mic'
+    assert frame.sample_rate == 44100
+    assert frame.channels == 2
+    assert frame.samples_per_frame == 256
+    assert frame.data_format == VBAN_DATATYPE_INT16
+    assert frame.frame_counter == 42
+    assert frame.is_audio
+    assert frame.stream_key == ('10.0.0.159', 'ESP32Mic')
+
+def test_parse_rejects_invalid_packets():
+    assert parse_vban_header(b'VBAN') is None
+    assert parse_vban_header(b'XXXX' + bytes(40)) is None
+
+def test_decode_formats():
+    """Test le décodage des formats PCM courants."""
+    values = np.array([0.0, 0.5, -0.5, 0.25], dtype=np.float32)
+
+    int16 = (values * 32767).astype('<i2').tobytes()
+    np.testing.assert_allclose(decode_pcm(int16, VBAN_DATATYPE_INT16, 1)[:, 0], values, atol=1e-4)
+
+    as_int = (values * 8388607).astype(np.int32)
+    int24 = b''.join(int(v).to_bytes(3, 'little', signed=True) for v in as_int)
+    np.testing.assert_allclose(decode_pcm(int24, VBAN_DATATYPE_INT24, 1)[:, 0], values, atol=1e-6)
+
+    float32 = values.astype('<f4').tobytes()
+    stereo = decode_pcm(float32, VBAN_DATATYPE_FLOAT32, 2)
+    assert stereo.shape == (2, 2)
+
+def test_decode_is_cached():
+    """Le décodage n'est fait qu'une fois, quel que soit le nombre de consommateurs."""
+    payload = np.ones(64, dtype='<i2').tobytes()
+    frame = parse_vban_header(build_vban_packet('s', payload), ('127.0.0.1', 1))
+    assert frame.mono is frame.mono
+    assert frame.samples is frame.samples
+
+def test_service_packets_have_no_audio():
+    packet = build_vban_packet('VBAN Service', bytes(16), sub_protocol=VBAN_PROTOCOL_SERVICE)
+    frame = parse_vban_header(packet, ('127.0.0.1', 1))
+    assert not frame.is_audio
+    assert frame.samples is None
+
+def test_ingest_fans_out_to_consumers(ingest):
+    """Un seul socket, chaque paquet est transmis à tous les consommateurs."""
+    first, second = RecordingConsumer(), RecordingConsumer()
+    stats = VBANStreamStats()
+    discovery = VBANDiscovery(ingest=ingest)
+    for consumer in (first, second, stats):
+        ingest.add_consumer(consumer)
+    ingest.start()
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    payload = np.zeros(128, dtype='<i2').tobytes()
+    # Les trames 2 et 3 sont perdues
+    for counter in (0, 1, 4):
+        sender.sendto(build_vban_packet('Mic', payload, frame_counter=counter), ('127.0.0.1', ingest.port))
+    sender.sendto(b'not a vban packet', ('127.0.0.1', ingest.port))
+    sender.close()
+
+    assert wait_for(lambda: ingest.stats['packets'] == 4)
+    assert len(first.frames) == 3
+    assert [f.frame_counter for f in second.frames] == [0, 1, 4]
+    assert first.frames[0] is second.frames[0]
+    assert ingest.stats['invalid'] == 1
+
+    key = ('127.0.0.1', 'Mic')
+    assert stats.snapshot()[key]['packets'] == 3
+    assert stats.snapshot()[key]['lost_frames'] == 2
+
+    sources = discovery.get_active_sources()
+    assert len(sources) == 1
+    assert sources[0].stream_name == 'Mic'
+    assert sources[0].sample_rate == 16000
+
+def test_discovery_expires_sources(ingest):
+    discovery = VBANDiscovery(ingest=ingest, max_age=0.1)
+    packet = build_vban_packet('Mic', bytes(64))
+    ingest.dispatch(packet, ('127.0.0.1', 5000), time.time())
+    assert len(discovery.get_active_sources()) == 1
+
+    discovery.on_idle(time.time() + 1.0)
+    assert discovery.get_active_sources() == []
@@ -1,8 +1,7 @@
 import pytest
 import numpy as np
 from unittest.mock import Mock, patch
-from mediapipe.tasks.python.components import containers
-from mediapipe.tasks.python import audio
+from classifiers import StubClassifier, embed_marker
 from vban_processor import VBANAudioProcessor
 
 @pytest.fixture
@@ -16,31 +15,21 @@ def mock_vban_detector():
     return detector
 
 @pytest.fixture
-def mock_classifier():
-    classifier = Mock()
-    classifier.classify.return_value = Mock(
-        classifications=[Mock(
-            categories=[
-                Mock(category_name="Clapping", score=0.7),
-                Mock(category_name="Finger snapping", score=0.1)
-            ]
-        )]
-    )
-    return classifier
-
-@pytest.fixture
-def processor(mock_classifier):
-    with patch('vban_processor.get_vban_detector') as mock_get_detector, \
-         patch('mediapipe.tasks.python.audio.AudioClassifier.create_from_options', return_value=mock_classifier):
+def processor():
+    with patch('vban_processor.get_vban_detector') as mock_get_detector:
         mock_get_detector.return_value = Mock()
+        # Classificateur factice : scores scriptés par les marqueurs insérés dans l'audio
         processor = VBANAudioProcessor(
             ip='192.168.1.10',
             port=6980,
             stream_name='test_stream',
             webhook_url='http://test.webhook',
             score_threshold=0.2,
-            delay=1.0
+            delay=1.0,
+            classifier_backend='stub'
         )
+        # Pas d'appel réseau : les reprises du webhook dépasseraient le délai entre deux claps
+        processor.webhook_manager = Mock()
         yield processor
 
 def test_initialization(processor):
@@ -53,6 +42,7 @@ def test_initialization(processor):
     assert processor.delay == 1.0
     assert processor.sample_rate == 16000
     assert not processor.is_running
+    assert isinstance(processor.classifier, StubClassifier)
 
 def test_start_stop(processor):
     """Test le démarrage et l'arrêt du traitement."""
@@ -75,41 +65,36 @@ def test_preprocess_audio(processor):
     # Test avec données mono
     mono_data = np.random.rand(16000)  # 1 seconde de données mono
     processed = processor.preprocess_audio(mono_data)
-    assert isinstance(processed, containers.AudioData)
-    assert isinstance(processed.audio_format, containers.AudioDataFormat)
-    assert processed.audio_format.num_channels == 1
-    
-    # Vérification de la forme du buffer
-    assert processed.buffer.shape[0] == processor.buffer_size  # Longueur correcte
-    assert processed.buffer.shape[1] == 1  # Mono
+    assert processed.dtype == np.float32
+    # Fenêtre mono de la longueur attendue, échantillons les plus récents
+    assert processed.shape == (processor.buffer_size,)
+    np.testing.assert_allclose(processed, mono_data[-processor.buffer_size:], rtol=1e-6)
     
     # Test avec données stéréo
     stereo_data = np.random.rand(16000, 2)  # 1 seconde de données stéréo
     processed = processor.preprocess_audio(stereo_data)
-    assert isinstance(processed, containers.AudioData)
-    assert processed.audio_format.num_channels == 1  # Devrait être converti en mono
-    assert processed.buffer.shape[1] == 1  # Vérification que c'est bien mono
+    assert processed.shape == (processor.buffer_size,)  # Devrait être converti en mono
+    np.testing.assert_allclose(processed, stereo_data[-processor.buffer_size:].mean(axis=1), rtol=1e-6)
     
     # Test avec données courtes (padding)
     short_data = np.random.rand(8000)  # 0.5 seconde
     processed = processor.preprocess_audio(short_data)
-    assert isinstance(processed, containers.AudioData)
-    assert len(processed.buffer) == processor.buffer_size
+    assert len(processed) == processor.buffer_size
+    assert not processed[:processor.buffer_size - 8000].any()
     
     # Test avec données longues (troncature)
     long_data = np.random.rand(32000)  # 2 secondes
     processed = processor.preprocess_audio(long_data)
-    assert isinstance(processed, containers.AudioData)
-    assert len(processed.buffer) == processor.buffer_size
+    assert len(processed) == processor.buffer_size
 
-@patch('requests.post')
-def test_notify_clap(mock_post, processor, mock_socketio):
+def test_notify_clap(processor, mock_socketio):
     """Test les notifications de détection de clap."""
     processor.set_socketio(mock_socketio)
-    mock_post.return_value.status_code = 200
     
-    # Test notification websocket et webhook
-    processor.notify_clap(0.8, 1234567890.0)
+    # Test notification websocket et webhook (envoyé par le WebhookManager, avec reprises)
+    with patch.object(processor.webhook_manager, 'send_webhook') as mock_send:
+        mock_send.return_value.status_code = 200
+        processor.notify_clap(0.8, 1234567890.0)
     
     # Vérifier la notification websocket
     mock_socketio.emit.assert_called_once()
@@ -119,7 +104,10 @@ def test_notify_clap(mock_post, processor, mock_socketio):
     assert args[1]['score'] == 0.8
     
     # Vérifier la notification webhook
-    mock_post.assert_called_once_with('http://test.webhook')
+    mock_send.assert_called_once()
+    url, data = mock_send.call_args[0]
+    assert url == 'http://test.webhook'
+    assert data['event'] == 'clap_detected' and data['score'] == 0.8
 
 def test_audio_callback(processor, mock_vban_detector):
     """Test le callback de traitement audio."""
@@ -143,11 +131,8 @@ def test_classification_callback(processor, mock_socketio):
     """Test le callback de classification."""
     processor.set_socketio(mock_socketio)
     
-    # Créer un mock de résultat de classification
-    mock_category1 = Mock(category_name="Clapping", score=0.7)
-    mock_category2 = Mock(category_name="Finger snapping", score=0.1)
-    mock_classification = Mock(categories=[mock_category1, mock_category2])
-    mock_result = Mock(classifications=[mock_classification])
+    # Résultat de classification : paires (label, score)
+    mock_result = [("Clapping", 0.7), ("Finger snapping", 0.1)]
     
     # Test avec un clap détecté
     processor._classification_callback(mock_result, 1234567890)
@@ -161,3 +146,18 @@ def test_classification_callback(processor, mock_socketio):
     processor.last_clap_time = 0
     processor._classification_callback(mock_result, 1234567890)
     assert mock_socketio.emit.call_count == 2
+
+def test_audio_callback_detects_marked_clap(processor, mock_vban_detector, mock_socketio):
+    """Chaîne complète avec le classificateur factice : seul l'audio marqué comme clap est détecté."""
+    processor.set_socketio(mock_socketio)
+    processor.detector = mock_vban_detector
+    silence = np.zeros(4000, dtype=np.float32)
+    for _ in range(4):
+        processor.audio_callback(silence, 1234567890.0)
+    mock_socketio.emit.assert_not_called()
+
+    # Marqueur 1 du script par défaut : Clapping 0.9 + Hands 0.6
+    processor.audio_callback(embed_marker(silence.copy(), 1, 1000), 1234567891.0)
+    mock_socketio.emit.assert_called_once()
+    assert mock_socketio.emit.call_args[0][1]['source_id'] == 'vban-test_stream'
+    assert processor.classifier.calls == 5
@@ -0,0 +1,131 @@
+import socket
+import threading
+import time
+import pytest
+from vban_ingest import VBANIngest, parse_vban_header, VBAN_PROTOCOL_SERVICE
+from vban_service import (
+    VBANPinger, VBANPingInfo, VBANServiceResponder, build_ping_packet, parse_ping_packet,
+    VBAN_DEVTYPE_TRANSMITTER
+)
+
+class FakeVBANDevice:
+    """Équipement VBAN simulé : répond aux PING0 sur un port UDP local"""
+
+    def __init__(self, name):
+        self.info = VBANPingInfo(
+            ip='', port=0, device_type=VBAN_DEVTYPE_TRANSMITTER, preferred_rate=48000,
+            device_name=name, manufacturer_name='Test', application_name='FakeMic'
+        )
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self.requests = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while self.running:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            parsed = parse_ping_packet(data, addr)
+            if parsed and not parsed[0]:
+                self.requests += 1
+                self.sock.sendto(build_ping_packet(parsed[1], reply=True, info=self.info), addr)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+@pytest.fixture
+def device():
+    fake = FakeVBANDevice('Salon')
+    yield fake
+    fake.close()
+
+def test_ping_packet_roundtrip():
+    info = VBANPingInfo(ip='', port=0, device_type=VBAN_DEVTYPE_TRANSMITTER, preferred_rate=48000,
+                        device_name='ESP32Mic', host_name='esp32', version='1.2.3.4')
+    packet = build_ping_packet(42, reply=True, info=info)
+    header = parse_vban_header(packet, ('10.0.0.5', 6980))
+    assert header.sub_protocol == VBAN_PROTOCOL_SERVICE
+    assert not header.is_audio
+
+    is_reply, counter, parsed = parse_ping_packet(packet, ('10.0.0.5', 6980))
+    assert is_reply and counter == 42
+    assert parsed.ip == '10.0.0.5'
+    assert parsed.device_name == 'ESP32Mic'
+    assert parsed.host_name == 'esp32'
+    assert parsed.version == '1.2.3.4'
+    assert parsed.preferred_rate == 48000
+    assert parsed.is_transmitter
+
+def test_audio_packet_is_not_a_ping():
+    from vban_ingest import build_vban_packet
+    assert parse_ping_packet(build_vban_packet('Mic', bytes(1400)), ('10.0.0.5', 6980)) is None
+
+def test_ping_returns_after_one_round_trip(device):
+    pinger = VBANPinger(timeout=2.0)
+    started = time.perf_counter()
+    replies = pinger.ping([('127.0.0.1', device.port)])
+    elapsed = time.perf_counter() - started
+
+    assert [reply.device_name for reply in replies] == ['Salon']
+    assert replies[0].application_name == 'FakeMic'
+    assert replies[0].round_trip_ms is not None
+    # Tous les hôtes ont répondu : pas d'attente jusqu'au timeout
+    assert elapsed < 1.0
+
+def test_ping_times_out_on_silent_host():
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(('127.0.0.1', 0))
+    try:
+        started = time.perf_counter()
+        assert VBANPinger(timeout=0.2).ping([('127.0.0.1', silent.getsockname()[1])]) == []
+        assert time.perf_counter() - started >= 0.2
+    finally:
+        silent.close()
+
+def _foreign_ping(port, counter=7):
+    """PING0 émis par un autre équipement (socket brut, hors VBANPinger)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    try:
+        sock.sendto(build_ping_packet(counter), ('127.0.0.1', port))
+        return parse_ping_packet(*sock.recvfrom(2048))
+    finally:
+        sock.close()
+
+def test_ingest_answers_pings():
+    ingest = VBANIngest(bind_ip='127.0.0.1', port=0)
+    ingest.add_consumer(VBANServiceResponder(ingest))
+    ingest.start()
+    try:
+        is_reply, counter, info = _foreign_ping(ingest.port)
+        assert is_reply and counter == 7
+        assert info.application_name == 'ClapTrap'
+    finally:
+        ingest.stop()
+
+def test_ingest_ignores_own_pings():
+    ingest = VBANIngest(bind_ip='127.0.0.1', port=0)
+    ingest.add_consumer(VBANServiceResponder(ingest))
+    ingest.start()
+    try:
+        # La découverte de ClapTrap ne doit pas proposer ClapTrap comme source
+        assert VBANPinger(timeout=0.3).ping([('127.0.0.1', ingest.port)]) == []
+    finally:
+        ingest.stop()
+
+def test_ping_skips_unresolvable_hosts(device):
+    pinger = VBANPinger(timeout=2.0)
+    started = time.perf_counter()
+    replies = pinger.ping(['hote-inexistant.invalid', ('127.0.0.1', device.port)])
+    assert [reply.device_name for reply in replies] == ['Salon']
+    # Seuls les hôtes résolus sont attendus : retour après un aller-retour
+    assert time.perf_counter() - started < 1.0
+    assert pinger.ping(['hote-inexistant.invalid']) == []
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from scipy.stats import kurtosis, skew
+from vban_signal_processor import VBANSignalProcessor
+
+def test_temporal_features_match_per_frame_reference():
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(16000) * 0.1).astype(np.float32)
+    audio[3000:3100] += 0.8  # Transitoire dans la troisième trame
+    audio[5120:6144] = 0.25  # Trame constante
+    features = VBANSignalProcessor(16000).compute_temporal_features(audio)
+    frames = audio[:15 * 1024].astype(np.float64).reshape(15, 1024)
+
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    assert all(features[key].dtype == np.float32 and len(features[key]) == 15 for key in features)
+    np.testing.assert_allclose(features['rms'], rms, rtol=1e-5)
+    np.testing.assert_allclose(features['crest_factor'], np.abs(frames).max(axis=1) / rms, rtol=1e-5)
+    np.testing.assert_allclose(
+        features['zcr'], [np.sum(np.abs(np.diff(np.signbit(frame)))) / 2048 for frame in frames]
+    )
+    varying = np.arange(15) != 5
+    np.testing.assert_allclose(features['skewness'][varying], skew(frames[varying], axis=1), rtol=1e-3, atol=1e-4)
+    np.testing.assert_allclose(features['kurtosis'][varying], kurtosis(frames[varying], axis=1), rtol=1e-3, atol=1e-4)
+    assert np.isnan(features['skewness'][5]) and np.isnan(features['kurtosis'][5])
+
+def test_temporal_features_of_silence_and_short_input():
+    processor = VBANSignalProcessor(16000)
+    silence = processor.compute_temporal_features(np.zeros(2048, dtype=np.float32))
+    assert list(silence['rms']) == [0, 0] and list(silence['crest_factor']) == [0, 0]
+    assert all(len(values) == 0 for values in processor.compute_temporal_features(np.zeros(100)).values())
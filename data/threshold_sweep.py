@@ -0,0 +1,253 @@
+"""
+Réglage du seuil de détection sur des enregistrements annotés, sans relancer
+l'inférence à chaque essai.
+
+1. `scores` : une seule passe d'inférence sur les fichiers annotés ; les
+   scores de tous les labels de chaque fenêtre sont conservés (JSONL, même
+   format que batch_analysis.py).
+2. `sweep` : rejoue les règles de détection (poids des labels, seuil, délai
+   entre deux détections) sur ces scores pour chaque combinaison demandée et
+   calcule précision, rappel et latence par rapport aux annotations. Comme en
+   direct, seuls les `max_results` labels les plus probables et au-dessus de
+   `score_threshold` (options du classificateur, 5 et 0,3 par défaut) entrent
+   dans le score.
+
+    python threshold_sweep.py scores fixtures/ -o scores.jsonl
+    python threshold_sweep.py sweep scores.jsonl --labels claps.csv --thresholds 0.1:0.9:0.05 --delays 0.5,1,2
+
+Les annotations sont un CSV `file,time` (nom du fichier, position du clap en
+secondes), une ligne par clap ; un fichier sans ligne ne contient aucun clap.
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+from audio_detector import CLAP_WEIGHTS
+
+RESULT_FIELDS = (
+    'weights', 'max_results', 'score_threshold', 'threshold', 'delay',
+    'true_positives', 'false_positives', 'false_negatives', 'precision', 'recall', 'f1', 'latency_p50', 'latency_p95'
+)
+
+def load_scores(path):
+    """
+    Charge les scores par fenêtre d'une sortie de batch_analysis.py (JSONL ou CSV).
+
+    Returns:
+        dict: Par nom de fichier, (positions, [scores des labels par fenêtre]) triés par position
+    """
+    rows = {}
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            entries = ({**row, 'categories': json.loads(row['categories'])} for row in csv.DictReader(f))
+        else:
+            entries = (json.loads(line) for line in f if line.strip())
+        for row in entries:
+            rows.setdefault(os.path.basename(row['file']), []).append((float(row['offset']), row['categories']))
+    scores = {}
+    for name, windows in rows.items():
+        windows.sort(key=lambda window: window[0])
+        scores[name] = (np.array([offset for offset, _ in windows]), [categories for _, categories in windows])
+    return scores
+
+def load_labels(path):
+    """Positions des claps annotés par nom de fichier (CSV `file,time`)"""
+    labels = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            name = os.path.basename(row['file'])
+            labels.setdefault(name, [])
+            if row.get('time') not in (None, ''):
+                labels[name].append(float(row['time']))
+    return {name: sorted(times) for name, times in labels.items()}
+
+def parse_values(text):
+    """'0.1:0.9:0.05' (début:fin:pas, fin incluse) ou '0.2,0.3,0.5'"""
+    if ':' in text:
+        start, stop, step = (float(value) for value in text.split(':'))
+        return [round(value, 6) for value in np.arange(start, stop + step / 2, step)]
+    return [float(value) for value in text.split(',')]
+
+def parse_weights(text):
+    """'Clapping=1,Hands=0.5,Finger snapping=-1' → poids par label"""
+    weights = {}
+    for item in text.split(','):
+        label, _, weight = item.rpartition('=')
+        if not label:
+            raise argparse.ArgumentTypeError(f"Poids invalide: {item} (attendu label=poids)")
+        weights[label.strip()] = float(weight)
+    return weights
+
+def visible_labels(window, max_results=5, score_threshold=0.3):
+    """
+    Labels d'une fenêtre tels que les voit la détection en direct : au moins
+    `score_threshold`, puis les `max_results` plus probables (tous si négatif).
+    """
+    kept = sorted(
+        ((label, score) for label, score in window.items() if score >= score_threshold),
+        key=lambda category: category[1], reverse=True
+    )
+    return kept if max_results < 0 else kept[:max_results]
+
+def window_scores(categories, weights, max_results=5, score_threshold=0.3):
+    """Score de clap de chaque fenêtre pour un jeu de poids (même calcul que clap_score)"""
+    return np.array([
+        sum(weights.get(label, 0.0) * score for label, score in visible_labels(window, max_results, score_threshold))
+        for window in categories
+    ])
+
+def detect(offsets, scores, threshold, delay):
+    """Positions des détections : score au-dessus du seuil, au plus une par `delay` secondes"""
+    detections = []
+    for index in np.flatnonzero(scores > threshold):
+        if not detections or offsets[index] - detections[-1] > delay:
+            detections.append(float(offsets[index]))
+    return detections
+
+def match(detections, claps, tolerance):
+    """
+    Associe chaque clap annoté à la première détection qui le suit de moins
+    de `tolerance` secondes (fin de la fenêtre qui le contient).
+
+    Returns:
+        tuple: (vrais positifs, faux positifs, faux négatifs, latences)
+    """
+    latencies = []
+    used = set()
+    for clap in claps:
+        for index, detection in enumerate(detections):
+            if index not in used and 0 <= detection - clap <= tolerance:
+                used.add(index)
+                latencies.append(detection - clap)
+                break
+    return len(latencies), len(detections) - len(used), len(claps) - len(latencies), latencies
+
+def sweep(scores, labels, thresholds, delays, weight_sets=None, tolerance=1.5, max_results=(5,), score_thresholds=(0.3,)):
+    """
+    Évalue chaque combinaison (poids, labels retenus, seuil, délai) sur les scores enregistrés.
+
+    `max_results` et `score_thresholds` : valeurs des options du classificateur
+    à essayer (nombre de labels et score minimum d'un label vus en direct).
+
+    Returns:
+        list: Un dict par combinaison (voir RESULT_FIELDS)
+    """
+    weight_sets = weight_sets or [CLAP_WEIGHTS]
+    missing = sorted(set(labels) - set(scores))
+    if missing:
+        logging.warning(f"Fichiers annotés sans scores, ignorés: {', '.join(missing)}")
+    results = []
+    for weights, top, floor in itertools.product(weight_sets, max_results, score_thresholds):
+        # Scores calculés une fois par jeu de poids et de labels retenus, pour tous les seuils et délais
+        per_file = {
+            name: (offsets, window_scores(categories, weights, int(top), floor))
+            for name, (offsets, categories) in scores.items()
+        }
+        for threshold, delay in itertools.product(thresholds, delays):
+            true_positives = false_positives = false_negatives = 0
+            latencies = []
+            for name, (offsets, file_scores) in per_file.items():
+                tp, fp, fn, lat = match(detect(offsets, file_scores, threshold, delay), labels.get(name, []), tolerance)
+                true_positives += tp
+                false_positives += fp
+                false_negatives += fn
+                latencies.extend(lat)
+            precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 1.0
+            recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 1.0
+            results.append({
+                'weights': weights,
+                'max_results': int(top),
+                'score_threshold': floor,
+                'threshold': threshold,
+                'delay': delay,
+                'true_positives': true_positives,
+                'false_positives': false_positives,
+                'false_negatives': false_negatives,
+                'precision': round(precision, 4),
+                'recall': round(recall, 4),
+                'f1': round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+                'latency_p50': round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+                'latency_p95': round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+            })
+    return results
+
+def write_results(results, path):
+    """Écrit les courbes en CSV (poids en JSON) ou en JSON selon l'extension"""
+    output = open(path, 'w', newline='') if path != '-' else sys.stdout
+    try:
+        if path.endswith('.json'):
+            json.dump(results, output, indent=4)
+        else:
+            writer = csv.DictWriter(output, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            for result in results:
+                writer.writerow({**result, 'weights': json.dumps(result['weights'])})
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Réglage du seuil de détection sur des enregistrements annotés")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scores_parser = subparsers.add_parser('scores', help="Calcule et enregistre les scores de chaque fenêtre (inférence)")
+    scores_parser.add_argument('paths', nargs='+', help="Fichiers ou répertoires annotés (WAV, FLAC)")
+    scores_parser.add_argument('-o', '--output', required=True, help="Fichier de scores (.jsonl)")
+    scores_parser.add_argument('--model', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yamnet.tflite'))
+    scores_parser.add_argument('--workers', type=int, default=None)
+    scores_parser.add_argument('--hop', type=float, default=0.5, help="Pas entre deux fenêtres, en secondes")
+    scores_parser.add_argument('--min-score', type=float, default=0.01, help="Score minimum d'un label enregistré")
+
+    sweep_parser = subparsers.add_parser('sweep', help="Évalue seuils, délais et poids sur les scores enregistrés")
+    sweep_parser.add_argument('scores', help="Fichier de scores (sortie de la commande scores ou de batch_analysis.py)")
+    sweep_parser.add_argument('--labels', required=True, help="Annotations CSV file,time")
+    sweep_parser.add_argument('--thresholds', type=parse_values, default=parse_values('0.05:0.95:0.05'))
+    sweep_parser.add_argument('--delays', type=parse_values, default=[1.0])
+    sweep_parser.add_argument('--weights', type=parse_weights, action='append',
+                              help="Jeu de poids label=poids,... (répétable, CLAP_WEIGHTS par défaut)")
+    sweep_parser.add_argument('--max-results', type=parse_values, default=[5],
+                              help="Nombre de labels vus par la détection (max_results du classificateur)")
+    sweep_parser.add_argument('--score-thresholds', type=parse_values, default=[0.3],
+                              help="Score minimum d'un label vu par la détection (score_threshold du classificateur)")
+    sweep_parser.add_argument('--tolerance', type=float, default=1.5,
+                              help="Écart maximum entre un clap et sa détection, en secondes")
+    sweep_parser.add_argument('-o', '--output', default='-', help="Courbes (.csv ou .json), - pour la sortie standard")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+    if args.command == 'scores':
+        from batch_analysis import find_audio_files, run_batch
+        files = find_audio_files(args.paths)
+        if not files:
+            parser.error("aucun fichier audio trouvé")
+        # Tous les labels au-dessus de min_score : les poids de n'importe quel label peuvent être réglés ensuite
+        summary = run_batch(
+            files, args.output, args.model, workers=args.workers, output_format='jsonl', hop=args.hop,
+            max_results=-1, score_threshold=args.min_score
+        )
+        logging.info(f"{summary['windows']} fenêtres enregistrées en {summary['wall_seconds']:.1f}s")
+        return 1 if summary['errors'] else 0
+
+    results = sweep(
+        load_scores(args.scores), load_labels(args.labels), args.thresholds, args.delays, args.weights, args.tolerance,
+        args.max_results, args.score_thresholds
+    )
+    write_results(results, args.output)
+    best = max(results, key=lambda result: (result['f1'], -result['false_positives']))
+    logging.info(
+        f"Meilleur F1 {best['f1']} (précision {best['precision']}, rappel {best['recall']}, "
+        f"latence p95 {best['latency_p95']}s) : threshold={best['threshold']}, delay={best['delay']}, "
+        f"weights={json.dumps(best['weights'])}, max_results={best['max_results']}, "
+        f"score_threshold={best['score_threshold']}"
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
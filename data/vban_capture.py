@@ -0,0 +1,209 @@
+import argparse
+import logging
+import socket
+import struct
+import threading
+import time
+
+# Format de fichier de capture VBAN :
+#   en-tête : b'VBANCAP' + version (1 octet)
+#   puis pour chaque datagramme : horodatage d'arrivée (float64), IPv4 de
+#   l'émetteur (4 octets), port (uint16), longueur (uint16), datagramme brut.
+CAPTURE_MAGIC = b'VBANCAP'
+CAPTURE_VERSION = 1
+_FILE_HEADER = CAPTURE_MAGIC + bytes([CAPTURE_VERSION])
+_RECORD_STRUCT = struct.Struct('<d4sHH')
+
+class CaptureFormatError(Exception):
+    pass
+
+class VBANCaptureRecorder:
+    """
+    Consommateur d'ingestion qui ajoute les datagrammes VBAN bruts, avec leur
+    horodatage d'arrivée, à un fichier de capture binaire compact.
+
+    S'enregistre sur un `VBANIngest` via `add_consumer` ; aucune analyse
+    supplémentaire n'est faite, le datagramme est écrit tel quel.
+    """
+
+    def __init__(self, path, stream_filter=None):
+        """
+        Args:
+            path (str): Fichier de capture (créé ou complété)
+            stream_filter (set, optional): Clés (ip, nom du flux) à conserver, toutes par défaut
+        """
+        self.path = path
+        self.stream_filter = set(stream_filter) if stream_filter else None
+        self.packets = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(_FILE_HEADER)
+
+    def on_frame(self, frame):
+        if self.stream_filter is not None and frame.stream_key not in self.stream_filter:
+            return
+        self.write(frame.raw, frame.addr, frame.arrival_time)
+
+    def write(self, data, addr, arrival_time):
+        """Ajoute un datagramme brut à la capture"""
+        try:
+            packed_ip = socket.inet_aton(addr[0])
+        except OSError:
+            packed_ip = bytes(4)
+        record = _RECORD_STRUCT.pack(arrival_time, packed_ip, addr[1] & 0xFFFF, len(data))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(record)
+            self._file.write(data)
+            self.packets += 1
+            self.bytes += len(data)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logging.info(f"Capture VBAN fermée: {self.path} ({self.packets} paquets)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_capture(path):
+    """
+    Itère sur les datagrammes d'un fichier de capture.
+
+    Yields:
+        tuple: (arrival_time, (ip, port), datagramme)
+    """
+    with open(path, 'rb') as f:
+        header = f.read(len(_FILE_HEADER))
+        if header[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            raise CaptureFormatError(f"{path} n'est pas une capture VBAN")
+        if header[-1] != CAPTURE_VERSION:
+            raise CaptureFormatError(f"Version de capture non supportée: {header[-1]}")
+
+        while True:
+            record = f.read(_RECORD_STRUCT.size)
+            if len(record) < _RECORD_STRUCT.size:
+                return
+            arrival_time, packed_ip, port, length = _RECORD_STRUCT.unpack(record)
+            data = f.read(length)
+            if len(data) < length:
+                # Capture tronquée (arrêt brutal pendant l'écriture)
+                return
+            yield arrival_time, (socket.inet_ntoa(packed_ip), port), data
+
+class VBANReplayer:
+    """
+    Rejoue une capture VBAN vers un port UDP, en temps réel, N fois plus vite
+    ou aussi vite que possible (speed=None ou <= 0).
+    """
+
+    def __init__(self, path, host='127.0.0.1', port=6980, speed=1.0):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.speed = speed if speed and speed > 0 else None
+        self.running = False
+
+    def run(self, loops=1):
+        """
+        Rejoue la capture.
+
+        Args:
+            loops (int): Nombre de passes, 0 pour boucler jusqu'à stop()
+
+        Returns:
+            dict: Nombre de paquets envoyés et durée du rejeu en secondes
+        """
+        self.running = True
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sent = 0
+        started = time.perf_counter()
+        try:
+            loop = 0
+            while self.running and (loops == 0 or loop < loops):
+                sent += self._replay_once(sock)
+                loop += 1
+        finally:
+            sock.close()
+            self.running = False
+        return {'packets': sent, 'duration': time.perf_counter() - started}
+
+    def _replay_once(self, sock):
+        sent = 0
+        first_time = None
+        start = time.perf_counter()
+        target = (self.host, self.port)
+        for arrival_time, _, data in read_capture(self.path):
+            if not self.running:
+                break
+            if self.speed is not None:
+                if first_time is None:
+                    first_time = arrival_time
+                delay = start + (arrival_time - first_time) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sock.sendto(data, target)
+            sent += 1
+        return sent
+
+    def stop(self):
+        self.running = False
+
+def _parse_speed(value):
+    if value in ('max', '0'):
+        return None
+    return float(value.rstrip('x'))
+
+def main(argv=None):
+    from vban_ingest import VBANIngest
+
+    parser = argparse.ArgumentParser(description="Enregistrement et rejeu de captures VBAN")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help="Enregistre le trafic VBAN reçu")
+    record_parser.add_argument('path')
+    record_parser.add_argument('--port', type=int, default=6980)
+    record_parser.add_argument('--duration', type=float, default=0, help="Durée en secondes, 0 = jusqu'à Ctrl+C")
+
+    replay_parser = subparsers.add_parser('replay', help="Rejoue une capture vers un port UDP")
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--host', default='127.0.0.1')
+    replay_parser.add_argument('--port', type=int, default=6980)
+    replay_parser.add_argument('--speed', type=_parse_speed, default=1.0, help="1, N (ex: 4x) ou max")
+    replay_parser.add_argument('--loops', type=int, default=1, help="0 = boucle infinie")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'record':
+        ingest = VBANIngest(port=args.port)
+        recorder = VBANCaptureRecorder(args.path)
+        ingest.add_consumer(recorder)
+        ingest.start()
+        try:
+            deadline = time.time() + args.duration if args.duration else None
+            while deadline is None or time.time() < deadline:
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            ingest.stop()
+            recorder.close()
+    else:
+        replayer = VBANReplayer(args.path, args.host, args.port, args.speed)
+        try:
+            result = replayer.run(loops=args.loops)
+            logging.info(f"{result['packets']} paquets rejoués en {result['duration']:.2f}s")
+        except KeyboardInterrupt:
+            replayer.stop()
+
+if __name__ == "__main__":
+    main()
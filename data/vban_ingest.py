@@ -0,0 +1,474 @@
+import socket
+import struct
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Optional, Tuple, Dict
+
+import numpy as np
+
+# Constantes du protocole VBAN (voir la spécification VBAN de VB-Audio)
+VBAN_MAGIC = b'VBAN'
+VBAN_HEADER_SIZE = 28
+VBAN_STREAM_NAME_SIZE = 16
+VBAN_MAX_PACKET_SIZE = 1464  # En-tête inclus
+
+VBAN_PROTOCOL_MASK = 0xE0
+VBAN_PROTOCOL_AUDIO = 0x00
+VBAN_PROTOCOL_SERIAL = 0x20
+VBAN_PROTOCOL_TXT = 0x40
+VBAN_PROTOCOL_SERVICE = 0x60
+
+VBAN_SR_MASK = 0x1F
+VBAN_DATATYPE_MASK = 0x07
+VBAN_CODEC_MASK = 0xF0
+VBAN_CODEC_PCM = 0x00
+
+VBAN_DATATYPE_BYTE8 = 0
+VBAN_DATATYPE_INT16 = 1
+VBAN_DATATYPE_INT24 = 2
+VBAN_DATATYPE_INT32 = 3
+VBAN_DATATYPE_FLOAT32 = 4
+VBAN_DATATYPE_FLOAT64 = 5
+VBAN_DATATYPE_12BITS = 6
+VBAN_DATATYPE_10BITS = 7
+
+# Index de sample rate -> Hz
+VBAN_SAMPLE_RATES = (
+    6000, 12000, 24000, 48000, 96000, 192000, 384000,
+    8000, 16000, 32000, 64000, 128000, 256000, 512000,
+    11025, 22050, 44100, 88200, 176400, 352800,
+)
+
+# Taille en octets d'un échantillon pour chaque format de données
+VBAN_SAMPLE_SIZES = {
+    VBAN_DATATYPE_BYTE8: 1,
+    VBAN_DATATYPE_INT16: 2,
+    VBAN_DATATYPE_INT24: 3,
+    VBAN_DATATYPE_INT32: 4,
+    VBAN_DATATYPE_FLOAT32: 4,
+    VBAN_DATATYPE_FLOAT64: 8,
+}
+
+_HEADER_STRUCT = struct.Struct('<4sBBBB16sI')
+
+
+def clean_vban_name(raw_name):
+    """Nettoie le nom VBAN en retirant les caractères non désirés"""
+    if isinstance(raw_name, (bytes, bytearray, memoryview)):
+        raw_name = bytes(raw_name)
+        end_idx = len(raw_name)
+        for i, byte in enumerate(raw_name):
+            if byte == 0 or not (32 <= byte <= 126):
+                end_idx = i
+                break
+        name = raw_name[:end_idx].decode('ascii', errors='ignore')
+    else:
+        name = str(raw_name)
+
+    name = name.strip()
+    while name and not (name[-1].isalnum() or name[-1].isspace()):
+        name = name[:-1]
+
+    return name
+
+
+def sample_rate_index(sample_rate):
+    """Retourne l'index VBAN correspondant à un sample rate en Hz"""
+    try:
+        return VBAN_SAMPLE_RATES.index(int(sample_rate))
+    except ValueError:
+        raise ValueError(f"Sample rate non supporté par VBAN: {sample_rate}")
+
+
+@dataclass
+class VBANFrame:
+    """
+    Paquet VBAN reçu, dont l'en-tête a été analysé une seule fois.
+
+    Le décodage de la charge utile est paresseux et mis en cache : le premier
+    consommateur qui accède à `samples` ou `mono` paie le décodage, les suivants
+    réutilisent le même tableau.
+    """
+    raw: bytes
+    addr: Tuple[str, int]
+    arrival_time: float
+    sub_protocol: int
+    sr_index: int
+    samples_per_frame: int
+    channels: int
+    data_format: int
+    codec: int
+    stream_name: str
+    frame_counter: int
+
+    @property
+    def ip(self):
+        return self.addr[0]
+
+    @property
+    def port(self):
+        return self.addr[1]
+
+    @property
+    def is_audio(self):
+        return self.sub_protocol == VBAN_PROTOCOL_AUDIO
+
+    @property
+    def sample_rate(self):
+        if self.sr_index < len(VBAN_SAMPLE_RATES):
+            return VBAN_SAMPLE_RATES[self.sr_index]
+        return 0
+
+    @property
+    def stream_key(self):
+        """Identifiant d'un flux : (ip, nom du flux)"""
+        return (self.addr[0], self.stream_name)
+
+    @property
+    def payload(self):
+        return memoryview(self.raw)[VBAN_HEADER_SIZE:]
+
+    @cached_property
+    def samples(self):
+        """Échantillons décodés en float32, forme (n_samples, channels), ou None"""
+        if not self.is_audio or self.codec != VBAN_CODEC_PCM:
+            return None
+        return decode_pcm(self.payload, self.data_format, self.channels)
+
+    @cached_property
+    def mono(self):
+        """Échantillons décodés et mixés en mono (float32, 1-D), ou None"""
+        samples = self.samples
+        if samples is None:
+            return None
+        if samples.shape[1] == 1:
+            return samples[:, 0]
+        return samples.mean(axis=1, dtype=np.float32)
+
+
+def parse_vban_header(data, addr=('', 0), arrival_time=None):
+    """
+    Analyse l'en-tête d'un paquet VBAN.
+
+    Args:
+        data (bytes): Datagramme UDP brut
+        addr (tuple): Adresse (ip, port) de l'émetteur
+        arrival_time (float, optional): Horodatage de réception
+
+    Returns:
+        VBANFrame: Paquet analysé, ou None si le datagramme n'est pas un paquet VBAN valide
+    """
+    if len(data) < VBAN_HEADER_SIZE or data[:4] != VBAN_MAGIC:
+        return None
+
+    _, sr_byte, nb_samples, nb_channels, format_byte, raw_name, counter = \
+        _HEADER_STRUCT.unpack_from(data)
+
+    return VBANFrame(
+        raw=data,
+        addr=addr,
+        arrival_time=time.time() if arrival_time is None else arrival_time,
+        sub_protocol=sr_byte & VBAN_PROTOCOL_MASK,
+        sr_index=sr_byte & VBAN_SR_MASK,
+        samples_per_frame=nb_samples + 1,
+        channels=nb_channels + 1,
+        data_format=format_byte & VBAN_DATATYPE_MASK,
+        codec=format_byte & VBAN_CODEC_MASK,
+        stream_name=clean_vban_name(raw_name),
+        frame_counter=counter,
+    )
+
+
+def decode_pcm(payload, data_format, channels):
+    """
+    Décode une charge utile PCM VBAN en float32 normalisé entre -1 et 1.
+
+    Args:
+        payload (bytes | memoryview): Données audio entrelacées
+        data_format (int): Format VBAN des échantillons
+        channels (int): Nombre de canaux
+
+    Returns:
+        numpy.ndarray: Tableau (n_samples, channels), ou None si le format n'est pas supporté
+    """
+    sample_size = VBAN_SAMPLE_SIZES.get(data_format)
+    if sample_size is None or channels < 1:
+        return None
+
+    frame_size = sample_size * channels
+    usable = (len(payload) // frame_size) * frame_size
+    if usable == 0:
+        return np.zeros((0, channels), dtype=np.float32)
+    payload = payload[:usable]
+
+    if data_format == VBAN_DATATYPE_INT16:
+        audio = np.frombuffer(payload, dtype='<i2').astype(np.float32)
+        audio *= 1.0 / 32768.0
+    elif data_format == VBAN_DATATYPE_FLOAT32:
+        audio = np.frombuffer(payload, dtype='<f4').astype(np.float32)
+    elif data_format == VBAN_DATATYPE_INT24:
+        raw = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 3)
+        audio = (raw[:, 0].astype(np.int32)
+                 | (raw[:, 1].astype(np.int32) << 8)
+                 | (raw[:, 2].view(np.int8).astype(np.int32) << 16)).astype(np.float32)
+        audio *= 1.0 / 8388608.0
+    elif data_format == VBAN_DATATYPE_INT32:
+        audio = np.frombuffer(payload, dtype='<i4').astype(np.float32)
+        audio *= 1.0 / 2147483648.0
+    elif data_format == VBAN_DATATYPE_FLOAT64:
+        audio = np.frombuffer(payload, dtype='<f8').astype(np.float32)
+    else:  # VBAN_DATATYPE_BYTE8
+        audio = np.frombuffer(payload, dtype=np.int8).astype(np.float32)
+        audio *= 1.0 / 128.0
+
+    return audio.reshape(-1, channels)
+
+
+def encode_pcm(samples, data_format=VBAN_DATATYPE_INT16):
+    """
+    Encode des échantillons float32 (-1 à 1) en charge utile PCM VBAN.
+
+    Args:
+        samples (numpy.ndarray): Échantillons, 1-D (mono) ou (n_samples, channels)
+        data_format (int): Format VBAN de sortie
+
+    Returns:
+        bytes: Charge utile entrelacée
+    """
+    audio = np.clip(np.asarray(samples, dtype=np.float32).reshape(-1), -1.0, 1.0)
+    if data_format == VBAN_DATATYPE_INT16:
+        return (audio * 32767.0).astype('<i2').tobytes()
+    if data_format == VBAN_DATATYPE_FLOAT32:
+        return audio.astype('<f4').tobytes()
+    if data_format == VBAN_DATATYPE_INT24:
+        as_int = (audio * 8388607.0).astype('<i4')
+        return as_int.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    if data_format == VBAN_DATATYPE_INT32:
+        return (audio.astype(np.float64) * 2147483647.0).astype('<i4').tobytes()
+    if data_format == VBAN_DATATYPE_FLOAT64:
+        return audio.astype('<f8').tobytes()
+    if data_format == VBAN_DATATYPE_BYTE8:
+        return (audio * 127.0).astype(np.int8).tobytes()
+    raise ValueError(f"Format VBAN non supporté: {data_format}")
+
+
+def build_vban_packet(stream_name, payload, sample_rate=16000, channels=1,
+                      data_format=VBAN_DATATYPE_INT16, frame_counter=0,
+                      sub_protocol=VBAN_PROTOCOL_AUDIO, samples_per_frame=None):
+    """
+    Construit un paquet VBAN (en-tête + charge utile).
+
+    Args:
+        stream_name (str): Nom du flux (16 caractères ASCII maximum)
+        payload (bytes): Charge utile déjà encodée
+        sample_rate (int): Sample rate en Hz
+        channels (int): Nombre de canaux (1 à 256)
+        data_format (int): Format VBAN des échantillons
+        frame_counter (int): Compteur de trames
+        sub_protocol (int): Sous-protocole VBAN
+        samples_per_frame (int, optional): Nombre d'échantillons par canal, déduit de la charge utile par défaut
+
+    Returns:
+        bytes: Paquet VBAN prêt à être envoyé
+    """
+    if samples_per_frame is None:
+        sample_size = VBAN_SAMPLE_SIZES.get(data_format, 1)
+        samples_per_frame = max(1, len(payload) // (sample_size * channels))
+    header = _HEADER_STRUCT.pack(
+        VBAN_MAGIC,
+        (sub_protocol & VBAN_PROTOCOL_MASK) | sample_rate_index(sample_rate),
+        (samples_per_frame - 1) & 0xFF,
+        (channels - 1) & 0xFF,
+        data_format & VBAN_DATATYPE_MASK,
+        stream_name.encode('ascii', errors='ignore')[:VBAN_STREAM_NAME_SIZE],
+        frame_counter & 0xFFFFFFFF,
+    )
+    return header + bytes(payload)
+
+
+@dataclass
+class VBANStreamCounters:
+    packets: int = 0
+    bytes: int = 0
+    lost_frames: int = 0
+    last_counter: Optional[int] = None
+    last_seen: float = 0.0
+
+
+class VBANStreamStats:
+    """
+    Consommateur de métriques : compte paquets, octets et trames perdues par flux.
+
+    Les pertes sont déduites des trous dans le compteur de trames VBAN.
+    Seul le thread d'ingestion écrit, la lecture se fait par copie.
+    """
+
+    def __init__(self):
+        self.streams: Dict[Tuple[str, str], VBANStreamCounters] = {}
+
+    def on_frame(self, frame):
+        counters = self.streams.get(frame.stream_key)
+        if counters is None:
+            counters = self.streams[frame.stream_key] = VBANStreamCounters()
+        counters.packets += 1
+        counters.bytes += len(frame.raw)
+        counters.last_seen = frame.arrival_time
+        if counters.last_counter is not None:
+            gap = (frame.frame_counter - counters.last_counter - 1) & 0xFFFFFFFF
+            # Un grand écart signifie un redémarrage de l'émetteur, pas une perte
+            if 0 < gap < 0x10000:
+                counters.lost_frames += gap
+        counters.last_counter = frame.frame_counter
+
+    def snapshot(self):
+        """Retourne une copie des compteurs sous forme de dictionnaires"""
+        return {
+            key: {
+                'packets': c.packets,
+                'bytes': c.bytes,
+                'lost_frames': c.lost_frames,
+                'last_seen': c.last_seen,
+            }
+            for key, c in list(self.streams.items())
+        }
+
+
+class VBANIngest:
+    """
+    Cœur d'ingestion VBAN : un seul socket, une seule analyse d'en-tête par paquet.
+
+    Chaque paquet valide est transmis aux consommateurs enregistrés (découverte,
+    détection, enregistrement, métriques). Un consommateur est un objet exposant
+    `on_frame(frame)` et, optionnellement, `on_idle(now)` appelé périodiquement.
+    """
+
+    def __init__(self, bind_ip='0.0.0.0', port=6980, idle_interval=0.5, receive_buffer=1 << 20):
+        self.bind_ip = bind_ip
+        self.port = port
+        self.idle_interval = idle_interval
+        # Un tampon noyau large absorbe les rafales de plusieurs flux pendant
+        # que le thread de réception est occupé (GIL, consommateurs)
+        self.receive_buffer = receive_buffer
+        self.running = False
+        self._socket = None
+        self._thread = None
+        # Liste remplacée (copy-on-write) à chaque modification : la boucle de
+        # réception l'itère sans verrou
+        self._consumers = ()
+        self._consumers_lock = threading.Lock()
+        self.stats = {'packets': 0, 'bytes': 0, 'invalid': 0, 'consumer_errors': 0}
+
+    def add_consumer(self, consumer):
+        """Enregistre un consommateur de paquets"""
+        with self._consumers_lock:
+            if consumer not in self._consumers:
+                self._consumers = self._consumers + (consumer,)
+
+    def remove_consumer(self, consumer):
+        """Retire un consommateur de paquets"""
+        with self._consumers_lock:
+            self._consumers = tuple(c for c in self._consumers if c is not consumer)
+
+    @property
+    def consumers(self):
+        return list(self._consumers)
+
+    def start(self):
+        """Ouvre le socket et démarre le thread de réception"""
+        if self.running:
+            return
+        if self._socket:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.receive_buffer:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+            except OSError as e:
+                logging.warning(f"Impossible d'agrandir le tampon de réception VBAN: {e}")
+        sock.settimeout(self.idle_interval)
+        sock.bind((self.bind_ip, self.port))
+        # Le port réel peut différer si port=0 (tests)
+        self.port = sock.getsockname()[1]
+        self._socket = sock
+        logging.info(f"Démarrage de l'ingestion VBAN sur {self.bind_ip}:{self.port}")
+
+        self.running = True
+        self._thread = threading.Thread(target=self._receive_loop, name='vban-ingest')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Arrête la réception et ferme le socket"""
+        self.running = False
+        if self._socket:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _receive_loop(self):
+        sock = self._socket
+        last_idle = time.monotonic()
+        while self.running:
+            try:
+                data, addr = sock.recvfrom(2048)
+            except socket.timeout:
+                last_idle = time.monotonic()
+                self._dispatch_idle(time.time())
+                continue
+            except OSError:
+                # Socket fermé par stop()
+                break
+
+            self.dispatch(data, addr, time.time())
+
+            now = time.monotonic()
+            if now - last_idle >= self.idle_interval:
+                last_idle = now
+                self._dispatch_idle(time.time())
+
+        logging.info("Boucle d'ingestion VBAN arrêtée")
+
+    def dispatch(self, data, addr, arrival_time):
+        """
+        Analyse un datagramme et le transmet aux consommateurs.
+
+        Returns:
+            VBANFrame: Paquet analysé, ou None s'il a été rejeté
+        """
+        self.stats['packets'] += 1
+        self.stats['bytes'] += len(data)
+        frame = parse_vban_header(data, addr, arrival_time)
+        if frame is None:
+            self.stats['invalid'] += 1
+            return None
+
+        for consumer in self._consumers:
+            try:
+                consumer.on_frame(frame)
+            except Exception as e:
+                self.stats['consumer_errors'] += 1
+                logging.error(f"Erreur dans le consommateur VBAN {type(consumer).__name__}: {e}")
+        return frame
+
+    def _dispatch_idle(self, now):
+        for consumer in self._consumers:
+            on_idle = getattr(consumer, 'on_idle', None)
+            if on_idle is None:
+                continue
+            try:
+                on_idle(now)
+            except Exception as e:
+                logging.error(f"Erreur dans le consommateur VBAN {type(consumer).__name__}: {e}")
@@ -0,0 +1,248 @@
+import argparse
+import logging
+import socket
+import threading
+import time
+import wave
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy import signal
+
+from vban_ingest import (
+    build_vban_packet, encode_pcm, VBAN_DATATYPE_INT16, VBAN_SAMPLE_SIZES, VBAN_MAX_PACKET_SIZE,
+    VBAN_HEADER_SIZE
+)
+
+def load_wav(path):
+    """
+    Charge un fichier WAV PCM en float32 mono.
+
+    Returns:
+        tuple: (échantillons, sample rate)
+    """
+    with wave.open(path, 'rb') as wf:
+        sample_width = wf.getsampwidth()
+        channels = wf.getnchannels()
+        sample_rate = wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+
+    if sample_width == 1:
+        audio = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        audio = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        bytes_ = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        audio = (bytes_[:, 0].astype(np.int32) | (bytes_[:, 1].astype(np.int32) << 8)
+                 | (bytes_[:, 2].view(np.int8).astype(np.int32) << 16)).astype(np.float32) / 8388608.0
+    else:
+        audio = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return audio.astype(np.float32), sample_rate
+
+def synthetic_clap(sample_rate, duration=0.08, seed=0):
+    """Génère un clap synthétique : bruit large bande à décroissance rapide"""
+    rng = np.random.default_rng(seed)
+    n = int(duration * sample_rate)
+    envelope = np.exp(-np.linspace(0.0, 8.0, n))
+    return (rng.uniform(-1.0, 1.0, n) * envelope * 0.9).astype(np.float32)
+
+@dataclass
+class StreamSpec:
+    """Description d'un flux VBAN synthétique"""
+    name: str
+    sample_rate: int = 16000
+    channels: int = 1
+    data_format: int = VBAN_DATATYPE_INT16
+    samples_per_frame: int = 256
+    clap_times: Tuple[float, ...] = ()  # Secondes depuis le début du flux
+    clap_wav: Optional[str] = None
+    noise_level: float = 0.005
+
+    def __post_init__(self):
+        sample_size = VBAN_SAMPLE_SIZES[self.data_format]
+        max_samples = (VBAN_MAX_PACKET_SIZE - VBAN_HEADER_SIZE) // (sample_size * self.channels)
+        if not 1 <= self.samples_per_frame <= min(256, max_samples):
+            raise ValueError(f"samples_per_frame invalide pour {self.name}: {self.samples_per_frame}")
+
+@dataclass
+class _StreamState:
+    spec: StreamSpec
+    sock: socket.socket
+    clap: np.ndarray
+    rng: np.random.Generator
+    frame_counter: int = 0
+    position: int = 0  # En échantillons depuis le début du flux
+    sent_packets: int = 0
+    pending_claps: List[float] = field(default_factory=list)
+
+class VBANLoadGenerator:
+    """
+    Émet N flux VBAN synthétiques simultanés vers un port UDP local.
+
+    Tous les flux sont cadencés par un seul thread d'émission pour limiter la
+    charge du générateur lui-même ; chaque flux utilise son propre socket (donc
+    son propre port source). Les claps sont injectés aux instants demandés et
+    leurs heures d'émission sont consignées dans `clap_events`.
+    """
+
+    def __init__(self, streams, host='127.0.0.1', port=6980):
+        self.streams = list(streams)
+        self.host = host
+        self.port = port
+        self.running = False
+        self.clap_events = []  # (nom du flux, horodatage d'émission)
+        self._thread = None
+        self._states = []
+
+    def _prepare(self):
+        self._states = []
+        for index, spec in enumerate(self.streams):
+            if spec.clap_wav:
+                clap, wav_rate = load_wav(spec.clap_wav)
+                if wav_rate != spec.sample_rate:
+                    clap = signal.resample_poly(clap, spec.sample_rate, wav_rate).astype(np.float32)
+            else:
+                clap = synthetic_clap(spec.sample_rate, seed=index)
+            self._states.append(_StreamState(
+                spec=spec,
+                sock=socket.socket(socket.AF_INET, socket.SOCK_DGRAM),
+                clap=clap,
+                rng=np.random.default_rng(index),
+                pending_claps=sorted(spec.clap_times)
+            ))
+
+    def _next_packet(self, state, now):
+        spec = state.spec
+        n = spec.samples_per_frame
+        audio = state.rng.normal(0.0, spec.noise_level, n).astype(np.float32)
+
+        # Injecter les claps qui recouvrent cette trame
+        start = state.position
+        for clap_time in state.pending_claps:
+            clap_start = int(clap_time * spec.sample_rate)
+            clap_end = clap_start + len(state.clap)
+            if clap_start >= start + n:
+                break
+            if clap_end <= start:
+                continue
+            lo, hi = max(start, clap_start), min(start + n, clap_end)
+            audio[lo - start:hi - start] += state.clap[lo - clap_start:hi - clap_start]
+            if clap_start >= start:
+                self.clap_events.append((spec.name, now))
+        while state.pending_claps and \
+                int(state.pending_claps[0] * spec.sample_rate) + len(state.clap) <= start + n:
+            state.pending_claps.pop(0)
+
+        if spec.channels > 1:
+            audio = np.repeat(audio[:, None], spec.channels, axis=1)
+        packet = build_vban_packet(
+            spec.name, encode_pcm(audio, spec.data_format),
+            sample_rate=spec.sample_rate, channels=spec.channels,
+            data_format=spec.data_format, frame_counter=state.frame_counter,
+            samples_per_frame=n
+        )
+        state.frame_counter += 1
+        state.position += n
+        return packet
+
+    def run(self, duration):
+        """
+        Émet les flux pendant `duration` secondes (bloquant).
+
+        Returns:
+            dict: Paquets émis par flux et retard maximal d'émission observé
+        """
+        self._prepare()
+        self.running = True
+        target = (self.host, self.port)
+        start = time.perf_counter()
+        wall_start = time.time()
+        max_lag = 0.0
+        try:
+            while self.running:
+                now = time.perf_counter()
+                elapsed = now - start
+                if elapsed >= duration:
+                    break
+                next_due = None
+                for state in self._states:
+                    spec = state.spec
+                    due = state.position / spec.sample_rate
+                    while due <= elapsed:
+                        max_lag = max(max_lag, elapsed - due)
+                        state.sock.sendto(self._next_packet(state, wall_start + due), target)
+                        state.sent_packets += 1
+                        due = state.position / spec.sample_rate
+                    next_due = due if next_due is None else min(next_due, due)
+                sleep_for = next_due - (time.perf_counter() - start) if next_due is not None else 0.001
+                if sleep_for > 0:
+                    time.sleep(min(sleep_for, 0.01))
+        finally:
+            self.running = False
+            for state in self._states:
+                state.sock.close()
+
+        return {
+            'sent_packets': {state.spec.name: state.sent_packets for state in self._states},
+            'max_send_lag': max_lag,
+            'duration': time.perf_counter() - start
+        }
+
+    def start(self, duration):
+        """Émet les flux en arrière-plan"""
+        self._thread = threading.Thread(target=self.run, args=(duration,), name='vban-loadgen')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+def make_streams(count, sample_rate=16000, channels=1, data_format=VBAN_DATATYPE_INT16,
+                 samples_per_frame=256, clap_times=(), clap_wav=None, prefix='Load'):
+    """Construit `count` descriptions de flux identiques, nommées Load0, Load1, ..."""
+    return [
+        StreamSpec(
+            name=f"{prefix}{i}", sample_rate=sample_rate, channels=channels,
+            data_format=data_format, samples_per_frame=samples_per_frame,
+            clap_times=tuple(clap_times), clap_wav=clap_wav
+        )
+        for i in range(count)
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Générateur de charge VBAN multi-flux")
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6980)
+    parser.add_argument('--sample-rate', type=int, default=16000)
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--format', type=int, default=VBAN_DATATYPE_INT16, help="Format VBAN (1 = INT16, 4 = FLOAT32...)")
+    parser.add_argument('--samples-per-frame', type=int, default=256)
+    parser.add_argument('--clap-every', type=float, default=0, help="Intervalle entre claps injectés, 0 = aucun")
+    parser.add_argument('--clap-wav', default=None)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    clap_times = np.arange(1.0, args.duration, args.clap_every).tolist() if args.clap_every else ()
+    streams = make_streams(
+        args.streams, args.sample_rate, args.channels, args.format,
+        args.samples_per_frame, clap_times, args.clap_wav
+    )
+    generator = VBANLoadGenerator(streams, args.host, args.port)
+    try:
+        result = generator.run(args.duration)
+        logging.info(f"Paquets émis: {sum(result['sent_packets'].values())}, "
+                     f"retard max: {result['max_send_lag'] * 1000:.1f} ms")
+    except KeyboardInterrupt:
+        generator.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 from vban_detector_new import VBANDetector
+from vban_capture import VBANCaptureRecorder
 import time
 
 # Global VBAN detector instance
 vban_detector = None
+# Enregistreur de capture actif, branché sur l'ingestion du détecteur
+vban_recorder = None
 
 def init_vban_detector():
     """Initialize the VBAN detector"""
@@ -32,9 +35,38 @@ def get_vban_detector():
             return None
     return vban_detector
 
+def invalidate_vban_settings():
+    """Force the running VBAN detector, if any, to reload settings.json on the next packet"""
+    if vban_detector is not None:
+        vban_detector.invalidate_settings_cache()
+
+def start_vban_capture(path):
+    """Start recording raw VBAN datagrams received by the detector to a capture file"""
+    global vban_recorder
+    detector = get_vban_detector()
+    if detector is None:
+        return None
+    stop_vban_capture()
+    vban_recorder = VBANCaptureRecorder(path)
+    detector.ingest.add_consumer(vban_recorder)
+    return vban_recorder
+
+def stop_vban_capture():
+    """Stop the current VBAN capture, if any"""
+    global vban_recorder
+    recorder = vban_recorder
+    if recorder is None:
+        return None
+    if vban_detector:
+        vban_detector.ingest.remove_consumer(recorder)
+    recorder.close()
+    vban_recorder = None
+    return recorder
+
 def cleanup_vban_detector():
     """Clean up VBAN detector resources"""
     global vban_detector
+    stop_vban_capture()
     if vban_detector:
         try:
             vban_detector.stop_listening()
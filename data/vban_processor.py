@@ -1,9 +1,11 @@
 import time
 import logging
+import requests
 import numpy as np
-from mediapipe.tasks import python
-from mediapipe.tasks.python import audio
-from mediapipe.tasks.python.components import containers
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from audio_detector import clap_score
+from classifiers import create_classifier
 from vban_manager import get_vban_detector
 from circular_buffer import CircularAudioBuffer
 from vban_signal_processor import VBANSignalProcessor
@@ -36,7 +38,8 @@ class VBANAudioProcessor:
     dans les flux audio VBAN.
     """
     
-    def __init__(self, ip, port, stream_name, webhook_url=None, score_threshold=0.2, delay=1.0):
+    def __init__(self, ip, port, stream_name, webhook_url=None, score_threshold=0.2, delay=1.0,
+                 classifier_backend='mediapipe', classifier_options=None):
         """
         Initialise le processeur audio VBAN.
         
@@ -47,12 +50,16 @@ class VBANAudioProcessor:
             webhook_url (str, optional): URL du webhook à appeler lors de la détection d'un clap
             score_threshold (float, optional): Seuil de score pour la détection des claps
             delay (float, optional): Délai minimum entre deux détections de claps
+            classifier_backend (str, optional): Classificateur ('mediapipe' ou 'stub', voir `classifiers`)
+            classifier_options (dict, optional): Options propres au classificateur
         """
         # Configuration VBAN
         self.ip = ip
         self.port = port
         self.stream_name = stream_name
         self.webhook_url = webhook_url
+        self.classifier_backend = classifier_backend
+        self.classifier_options = classifier_options or {}
         
         # Configuration de la détection
         self.score_threshold = score_threshold
@@ -77,7 +84,6 @@ class VBANAudioProcessor:
         # Configuration audio
         self.sample_rate = 16000  # Taux d'échantillonnage standard pour YAMNet
         self.buffer_size = int(0.975 * self.sample_rate)  # ~975ms buffer
-        self.audio_format = containers.AudioDataFormat(1, self.sample_rate)  # Mono, 16kHz
         
         # Processeur de signal
         self.signal_processor = VBANSignalProcessor(sample_rate=self.sample_rate)
@@ -99,18 +105,13 @@ class VBANAudioProcessor:
         self.webhook_manager = WebhookManager()
         
     def initialize_classifier(self):
-        """Configure et initialise le classificateur audio YAMNet."""
+        """Configure et initialise le classificateur audio (YAMNet par défaut)."""
         try:
-            base_options = python.BaseOptions(model_asset_path="yamnet.tflite")
-            options = audio.AudioClassifierOptions(
-                base_options=base_options,
-                running_mode=audio.RunningMode.AUDIO_STREAM,
-                max_results=5,
-                score_threshold=0.2,
-                result_callback=self._classification_callback
+            self.classifier = create_classifier(
+                self.classifier_backend, "yamnet.tflite", max_results=5, score_threshold=0.2,
+                **self.classifier_options
             )
-            self.classifier = audio.AudioClassifier.create_from_options(options)
-            logging.info("Classificateur audio initialisé avec succès")
+            logging.info(f"Classificateur audio {self.classifier_backend} initialisé avec succès")
         except Exception as e:
             logging.error(f"Erreur lors de l'initialisation du classificateur: {str(e)}")
             raise
@@ -160,13 +161,13 @@ class VBANAudioProcessor:
         
         return min(score, 1.0)  # Normaliser le score entre 0 et 1
 
-    def _classification_callback(self, result: audio.AudioClassifierResult, timestamp_ms: int):
+    def _classification_callback(self, categories, timestamp_ms):
         """
-        Callback appelé par le classificateur pour chaque résultat.
+        Traite le résultat du classificateur pour une fenêtre : paires (label, score).
         """
         try:
             # Récupérer les données audio actuelles du buffer
-            current_audio = self.circular_buffer.get_buffer()
+            current_audio = self.circular_buffer.read(self.buffer_size)[:, 0]
             
             # Analyser le signal
             signal_features = self.signal_processor.analyze_signal(current_audio)
@@ -174,19 +175,8 @@ class VBANAudioProcessor:
             # Évaluer les caractéristiques pour la détection de claps
             feature_score = self.evaluate_clap_features(signal_features)
             
-            # Calcul du score pour les sons de claps (YAMNet)
-            yamnet_score = sum(
-                category.score
-                for category in result.classifications[0].categories
-                if category.category_name in ["Hands", "Clapping", "Cap gun"]
-            )
-            
-            # Soustraction du score des faux positifs
-            yamnet_score -= sum(
-                category.score
-                for category in result.classifications[0].categories
-                if category.category_name == "Finger snapping"
-            )
+            # Score des sons de claps (YAMNet), moins celui des faux positifs (claquements de doigts)
+            yamnet_score = clap_score(categories)
             
             # Combiner les scores (moyenne pondérée)
             combined_score = (yamnet_score * 0.4 + feature_score * 0.6)
@@ -201,6 +191,11 @@ class VBANAudioProcessor:
         except Exception as e:
             logging.error(f"Erreur dans le callback de classification: {str(e)}")
             
+    @property
+    def stream_key(self):
+        """Clé du flux sur le bus audio du détecteur VBAN"""
+        return (self.ip, self.stream_name)
+
     def set_socketio(self, socketio):
         """
         Configure l'instance SocketIO pour les notifications en temps réel.
@@ -222,8 +217,8 @@ class VBANAudioProcessor:
             if not self.detector:
                 raise RuntimeError("Impossible d'initialiser le détecteur VBAN")
                 
-            # Ajouter notre callback pour le traitement audio
-            self.detector.add_callback(self.audio_callback)
+            # S'abonner aux blocs audio de notre flux
+            self.detector.add_callback(self.audio_callback, stream=self.stream_key)
             
             self.is_running = True
             logging.info(f"Démarrage du traitement audio VBAN pour {self.stream_name} ({self.ip}:{self.port})")
@@ -241,7 +236,7 @@ class VBANAudioProcessor:
             
         try:
             if self.detector:
-                self.detector.remove_callback(self.audio_callback)
+                self.detector.remove_callback(self.audio_callback, stream=self.stream_key)
             self.is_running = False
             self.circular_buffer.clear()  # Vide le buffer à l'arrêt
             logging.info(f"Arrêt du traitement audio VBAN pour {self.stream_name}")
@@ -254,52 +249,36 @@ class VBANAudioProcessor:
     def preprocess_audio(self, audio_data):
         """
         Prépare les données audio pour le classificateur.
-        Garde le signal brut, fait uniquement la conversion de format nécessaire.
+        Garde le signal brut : conversion en mono, puis fenêtre de `buffer_size`
+        échantillons (les plus récents, complétés par des zéros au début si besoin).
         
         Args:
-            audio_data (numpy.ndarray): Données audio brutes
+            audio_data (numpy.ndarray): Données audio brutes, mono ou multicanal (échantillons, canaux)
             
         Returns:
-            containers.AudioData: Données audio formatées pour le classificateur
+            numpy.ndarray: Fenêtre mono float32 pour le classificateur
         """
-        # Convertir en format audio pour le classificateur sans aucun filtrage
-        return containers.AudioData.create_from_array(
-            audio_data,
-            self.audio_format
-        )
+        samples = np.asarray(audio_data, dtype=np.float32)
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+        window = np.zeros(self.buffer_size, dtype=np.float32)
+        samples = samples[-self.buffer_size:]
+        if len(samples):
+            window[-len(samples):] = samples
+        return window
             
     def detect_claps(self, audio_data, timestamp):
         """
-        Détecte les claps dans les données audio.
+        Détecte les claps dans les données audio : classification de la fenêtre,
+        puis score combiné (classificateur et caractéristiques du signal).
         
         Args:
-            audio_data (containers.AudioData): Données audio prétraitées
+            audio_data (numpy.ndarray): Fenêtre mono prétraitée
             timestamp (float): Timestamp des données audio
         """
         try:
-            # Classification du signal audio
-            result = self.classifier.classify(audio_data)
-            
-            # Calcul du score pour les sons de claps
-            score_sum = sum(
-                category.score
-                for category in result.classifications[0].categories
-                if category.category_name in ["Hands", "Clapping", "Cap gun"]
-            )
-            
-            # Soustraction du score des faux positifs
-            score_sum -= sum(
-                category.score
-                for category in result.classifications[0].categories
-                if category.category_name == "Finger snapping"
-            )
-            
-            # Détection et notification des claps
-            if score_sum > self.score_threshold:
-                current_time = time.time()
-                if current_time - self.last_clap_time > self.delay:
-                    self.notify_clap(score_sum, current_time)
-                    self.last_clap_time = current_time
+            categories = self.classifier.classify(audio_data, self.sample_rate)
+            self._classification_callback(categories, int(timestamp * 1000))
                     
         except Exception as e:
             logging.error(f"Erreur lors de la détection des claps: {str(e)}")
@@ -313,13 +292,12 @@ class VBANAudioProcessor:
             timestamp (float): Timestamp de la détection
         """
         try:
-            # Notification websocket
+            # Notification websocket : même événement que les autres sources (interface)
             if self._socketio:
-                self._socketio.emit('clap_detected', {
-                    'source': 'vban',
-                    'stream_name': self.stream_name,
-                    'score': score,
-                    'timestamp': timestamp
+                self._socketio.emit('clap', {
+                    'source_id': f"vban-{self.stream_name}",
+                    'timestamp': timestamp,
+                    'score': score
                 })
                 
             # Notification webhook
@@ -346,12 +324,16 @@ class VBANAudioProcessor:
         Traite les données brutes du flux VBAN.
         
         Args:
-            stream_data (bytes): Données brutes du flux VBAN
+            stream_data (bytes | numpy.ndarray): Données brutes du flux VBAN, ou bloc
+                déjà décodé en float32 par le détecteur (utilisé sans copie)
             
         Returns:
             numpy.ndarray: Données audio décodées
         """
         try:
+            if isinstance(stream_data, np.ndarray) and stream_data.dtype == np.float32:
+                return stream_data
+
             # Décodage des données VBAN
             # Le format attendu est PCM 16 bits, mono ou stéréo
             audio_data = np.frombuffer(stream_data, dtype=np.int16)
@@ -374,6 +356,10 @@ class VBANAudioProcessor:
             timestamp (float): Timestamp des données
         """
         try:
+            # Ignorer l'audio tant que la source n'est pas (ou plus) active
+            if self.detector and self.ip not in self.detector.get_active_sources():
+                return
+
             # Traitement des données VBAN
             audio_data = self._process_vban_stream(data)
             
@@ -385,14 +371,9 @@ class VBANAudioProcessor:
             # Lecture du buffer pour le traitement
             processed_data = self.circular_buffer.read(self.buffer_size)
             
-            # Prétraitement et classification
+            # Prétraitement, classification et détection de claps
             processed_audio = self.preprocess_audio(processed_data)
             if self.classifier:
-                timestamp_ms = int(timestamp * 1000)
-                self.classifier.classify_async(processed_audio, timestamp_ms)
-            
-            # Détection de claps si nécessaire
-            if self.detector:
                 self.detect_claps(processed_audio, timestamp)
             
         except Exception as e:
@@ -0,0 +1,266 @@
+import random
+import socket
+import struct
+import threading
+import time
+import logging
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+
+from vban_ingest import (
+    VBAN_MAGIC, VBAN_HEADER_SIZE, VBAN_PROTOCOL_MASK, VBAN_PROTOCOL_SERVICE, clean_vban_name
+)
+
+# Sous-protocole de service VBAN : identification des équipements (PING0)
+VBAN_SERVICE_IDENTIFICATION = 0x00
+VBAN_SERVICE_FNCT_PING0 = 0x00
+VBAN_SERVICE_FNCT_REPLY = 0x80
+VBAN_SERVICE_STREAM_NAME = 'VBAN Service'
+
+# Types d'équipement (bitType) et fonctionnalités (bitfeature) de la spécification
+VBAN_DEVTYPE_RECEPTOR = 0x00000001
+VBAN_DEVTYPE_TRANSMITTER = 0x00000002
+VBAN_FEATURE_AUDIO = 0x00000001
+
+_HEADER_STRUCT = struct.Struct('<4sBBBB16sI')
+# T_VBAN_PING0 : 676 octets
+_PING0_STRUCT = struct.Struct('<7I4s8s8s8s8s64s32sHH64s64s64s64s128s128s')
+
+# Compteurs des PING en cours émis par ce processus : le répondeur les ignore,
+# pour que ClapTrap ne réponde pas à sa propre découverte
+_local_ping_counters = set()
+_local_ping_lock = threading.Lock()
+
+def is_local_ping(counter):
+    """Indique si un PING0 a été émis par un VBANPinger de ce processus"""
+    with _local_ping_lock:
+        return counter in _local_ping_counters
+
+@dataclass
+class VBANPingInfo:
+    """Identification d'un équipement VBAN, telle que renvoyée par une réponse PING0"""
+    ip: str
+    port: int
+    device_type: int = 0
+    features: int = 0
+    features_ex: int = 0
+    preferred_rate: int = 0
+    min_rate: int = 0
+    max_rate: int = 0
+    color_rgb: int = 0
+    version: str = ''
+    lang_code: str = ''
+    distant_ip: str = ''
+    distant_port: int = 0
+    device_name: str = ''
+    manufacturer_name: str = ''
+    application_name: str = ''
+    host_name: str = ''
+    user_name: str = ''
+    user_comment: str = ''
+    round_trip_ms: Optional[float] = None
+
+    @property
+    def display_name(self):
+        return self.device_name or self.application_name or self.host_name or self.ip
+
+    @property
+    def is_transmitter(self):
+        return bool(self.device_type & VBAN_DEVTYPE_TRANSMITTER)
+
+    def to_dict(self):
+        data = asdict(self)
+        data['name'] = self.display_name
+        data['id'] = f'vban_{self.ip}_{self.port}'
+        return data
+
+def _text(raw, encoding='ascii'):
+    return raw.split(b'\x00', 1)[0].decode(encoding, errors='ignore').strip()
+
+def _field(value, size, encoding='ascii'):
+    return (value or '').encode(encoding, errors='ignore')[:size]
+
+def build_ping_packet(frame_counter=0, reply=False, info=None):
+    """
+    Construit une requête (ou une réponse) PING0 du sous-protocole de service.
+
+    Args:
+        frame_counter (int): Compteur permettant d'apparier requête et réponse
+        reply (bool): Construire une réponse plutôt qu'une requête
+        info (VBANPingInfo, optional): Identification à annoncer
+
+    Returns:
+        bytes: Paquet VBAN de service
+    """
+    info = info or VBANPingInfo(
+        ip='', port=0, device_type=VBAN_DEVTYPE_RECEPTOR, features=VBAN_FEATURE_AUDIO,
+        preferred_rate=16000, min_rate=6000, max_rate=48000,
+        application_name='ClapTrap', host_name=socket.gethostname()
+    )
+    version = bytes(int(part) & 0xFF for part in (info.version or '0.0.0.0').split('.')[:4]).ljust(4, b'\x00')
+    header = _HEADER_STRUCT.pack(
+        VBAN_MAGIC,
+        VBAN_PROTOCOL_SERVICE,
+        VBAN_SERVICE_FNCT_REPLY if reply else VBAN_SERVICE_FNCT_PING0,
+        VBAN_SERVICE_IDENTIFICATION,
+        0,
+        _field(VBAN_SERVICE_STREAM_NAME, 16),
+        frame_counter & 0xFFFFFFFF,
+    )
+    payload = _PING0_STRUCT.pack(
+        info.device_type, info.features, info.features_ex,
+        info.preferred_rate, info.min_rate, info.max_rate, info.color_rgb,
+        version, b'', b'', _field(info.lang_code, 8), b'', b'',
+        _field(info.distant_ip, 32), info.distant_port & 0xFFFF, 0,
+        _field(info.device_name, 64), _field(info.manufacturer_name, 64),
+        _field(info.application_name, 64), _field(info.host_name, 64),
+        _field(info.user_name, 128, 'utf-8'), _field(info.user_comment, 128, 'utf-8'),
+    )
+    return header + payload
+
+def parse_ping_packet(data, addr):
+    """
+    Analyse un paquet PING0 (requête ou réponse).
+
+    Returns:
+        tuple: (est_une_réponse, compteur, VBANPingInfo), ou None si ce n'est pas un PING0
+    """
+    if len(data) < VBAN_HEADER_SIZE + _PING0_STRUCT.size or data[:4] != VBAN_MAGIC:
+        return None
+    _, protocol, function, service, _, _, counter = _HEADER_STRUCT.unpack_from(data)
+    if (protocol & VBAN_PROTOCOL_MASK) != VBAN_PROTOCOL_SERVICE or service != VBAN_SERVICE_IDENTIFICATION:
+        return None
+    if function & 0x7F != VBAN_SERVICE_FNCT_PING0:
+        return None
+
+    fields = _PING0_STRUCT.unpack_from(data, VBAN_HEADER_SIZE)
+    info = VBANPingInfo(
+        ip=addr[0], port=addr[1],
+        device_type=fields[0], features=fields[1], features_ex=fields[2],
+        preferred_rate=fields[3], min_rate=fields[4], max_rate=fields[5], color_rgb=fields[6],
+        version='.'.join(str(b) for b in fields[7]),
+        lang_code=_text(fields[10]),
+        distant_ip=_text(fields[13]), distant_port=fields[14],
+        device_name=clean_vban_name(fields[16]) or _text(fields[16]),
+        manufacturer_name=_text(fields[17]),
+        application_name=_text(fields[18]),
+        host_name=_text(fields[19]),
+        user_name=_text(fields[20], 'utf-8'),
+        user_comment=_text(fields[21], 'utf-8'),
+    )
+    return bool(function & VBAN_SERVICE_FNCT_REPLY), counter, info
+
+class VBANPinger:
+    """
+    Découverte active : envoie des requêtes PING0 et collecte les réponses.
+
+    Les requêtes partent d'un socket éphémère, les réponses y reviennent
+    directement. Avec une liste d'hôtes, `ping` rend la main dès que tous ont
+    répondu, soit un aller-retour ; en diffusion, il attend `timeout`.
+    """
+
+    def __init__(self, port=6980, timeout=0.3):
+        self.port = port
+        self.timeout = timeout
+        # Départ aléatoire : un compteur d'un autre équipement ne se confond pas avec les nôtres
+        self._counter = random.getrandbits(32)
+        self._lock = threading.Lock()
+
+    def ping(self, hosts=None, broadcast='255.255.255.255', timeout=None):
+        """
+        Interroge les équipements VBAN.
+
+        Args:
+            hosts (list, optional): Adresses à interroger ; diffusion sur le sous-réseau sinon
+            broadcast (str): Adresse de diffusion utilisée sans liste d'hôtes
+            timeout (float, optional): Attente maximale des réponses en secondes
+
+        Returns:
+            list: Liste de VBANPingInfo, une par équipement ayant répondu
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._counter = (self._counter + 1) & 0xFFFFFFFF
+            counter = self._counter
+
+        targets = []
+        for host in hosts or [broadcast]:
+            if isinstance(host, (tuple, list)):
+                targets.append((host[0], int(host[1])))
+            else:
+                targets.append((host, self.port))
+        # Adresses dont on attend la réponse : seulement celles des hôtes auxquels le PING est parti
+        expected = None if not hosts else set()
+
+        replies = {}
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        with _local_ping_lock:
+            _local_ping_counters.add(counter)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.bind(('0.0.0.0', 0))
+            request = build_ping_packet(counter)
+            sent_at = time.perf_counter()
+            for host, port in targets:
+                try:
+                    ip = socket.gethostbyname(host)
+                    sock.sendto(request, (ip, port))
+                except OSError as e:
+                    # socket.gaierror (hôte inconnu) dérive d'OSError : l'hôte est ignoré
+                    logging.warning(f"Impossible d'envoyer un PING VBAN à {host}: {e}")
+                    continue
+                if expected is not None:
+                    expected.add(ip)
+            if expected is not None and not expected:
+                return []
+
+            deadline = sent_at + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, addr = sock.recvfrom(2048)
+                except socket.timeout:
+                    break
+                parsed = parse_ping_packet(data, addr)
+                if not parsed:
+                    continue
+                is_reply, reply_counter, info = parsed
+                if not is_reply or reply_counter != counter:
+                    continue
+                info.round_trip_ms = round((time.perf_counter() - sent_at) * 1000, 2)
+                replies[addr] = info
+                if expected is not None and expected <= {ip for ip, _ in replies}:
+                    break
+        finally:
+            sock.close()
+            with _local_ping_lock:
+                _local_ping_counters.discard(counter)
+
+        return list(replies.values())
+
+class VBANServiceResponder:
+    """
+    Consommateur d'ingestion qui répond aux PING0 reçus sur le port VBAN,
+    pour que ClapTrap soit lui-même visible des autres équipements VBAN.
+    """
+
+    def __init__(self, ingest, info=None):
+        self.ingest = ingest
+        self.info = info
+
+    def on_frame(self, frame):
+        if frame.sub_protocol != VBAN_PROTOCOL_SERVICE:
+            return
+        parsed = parse_ping_packet(frame.raw, frame.addr)
+        if not parsed or parsed[0] or is_local_ping(parsed[1]):
+            return
+        sock = self.ingest._socket
+        if sock is not None:
+            sock.sendto(build_ping_packet(parsed[1], reply=True, info=self.info), frame.addr)
+
+def ping_vban_hosts(hosts: Optional[List[str]] = None, port: int = 6980, timeout: float = 0.3):
+    """Raccourci : interroge les hôtes donnés, ou le sous-réseau, et renvoie les réponses"""
+    return VBANPinger(port=port, timeout=timeout).ping(hosts)
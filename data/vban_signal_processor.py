@@ -1,7 +1,6 @@
 import numpy as np
 from scipy import signal
 from scipy.fft import fft, fftfreq
-from scipy.stats import skew, kurtosis
 
 class VBANSignalProcessor:
     def __init__(self, sample_rate=48000):
@@ -163,46 +162,43 @@ class VBANSignalProcessor:
         Returns:
             dict: Caractéristiques temporelles du signal
         """
-        # Découper le signal en trames
+        # Matrice des trames (n_frames, frame_length) : une vue sur le signal, sans copie par trame
+        audio_data = np.asarray(audio_data, dtype=np.float32).reshape(-1)
         n_frames = len(audio_data) // frame_length
-        frames = np.array_split(audio_data[:n_frames * frame_length], n_frames)
+        frames = audio_data[:n_frames * frame_length].reshape(n_frames, frame_length)
         
-        # Calculer les caractéristiques pour chaque trame
-        features = {
-            'rms': [],           # Root Mean Square (énergie)
-            'zcr': [],           # Zero Crossing Rate
-            'skewness': [],      # Asymétrie
-            'kurtosis': [],      # Aplatissement
-            'crest_factor': []   # Facteur de crête
-        }
+        # Moments centrés d'ordre 2 à 4, pour l'asymétrie et l'aplatissement
+        mean = frames.mean(axis=1, keepdims=True)
+        centered = frames - mean
+        squared = centered * centered
+        m2 = squared.mean(axis=1)
+        m3 = (squared * centered).mean(axis=1)
+        m4 = (squared * squared).mean(axis=1)
+        # Trame constante : asymétrie et aplatissement indéfinis (NaN), comme scipy.stats
+        constant = m2 <= (np.finfo(np.float32).resolution * mean[:, 0]) ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            skewness = np.where(constant, np.nan, m3 / m2 ** 1.5).astype(np.float32)
+            kurt = np.where(constant, np.nan, m4 / (m2 * m2) - 3.0).astype(np.float32)
         
-        for frame in frames:
-            # RMS (Root Mean Square)
-            rms = np.sqrt(np.mean(frame**2))
-            
-            # Zero Crossing Rate
-            zcr = np.sum(np.abs(np.diff(np.signbit(frame)))) / (2 * len(frame))
-            
-            # Skewness (asymétrie)
-            sk = skew(frame)
-            
-            # Kurtosis (aplatissement)
-            kurt = kurtosis(frame)
-            
-            # Crest Factor (facteur de crête)
-            crest = np.max(np.abs(frame)) / rms if rms > 0 else 0
-            
-            features['rms'].append(rms)
-            features['zcr'].append(zcr)
-            features['skewness'].append(sk)
-            features['kurtosis'].append(kurt)
-            features['crest_factor'].append(crest)
+        # RMS (Root Mean Square)
+        rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / np.float32(frame_length))
         
-        # Convertir en arrays numpy
-        for key in features:
-            features[key] = np.array(features[key])
+        # Zero Crossing Rate : changements de signe entre échantillons consécutifs
+        signs = np.signbit(frames)
+        zcr = (np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (2 * frame_length)).astype(np.float32)
         
-        return features
+        # Crest Factor (facteur de crête), nul pour une trame silencieuse
+        peak = np.abs(frames).max(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crest = np.where(rms > 0, peak / rms, 0).astype(np.float32)
+        
+        return {
+            'rms': rms,                  # Root Mean Square (énergie)
+            'zcr': zcr,                  # Zero Crossing Rate
+            'skewness': skewness,        # Asymétrie
+            'kurtosis': kurt,            # Aplatissement
+            'crest_factor': crest        # Facteur de crête
+        }
     
     def compute_spectral_features(self, audio_data, frame_length=1024):
         """